@@ -0,0 +1,41 @@
+"""
+Фильтр устаревших callback-запросов
+"""
+
+import time
+
+from aiogram.filters import BaseFilter
+from aiogram.types import CallbackQuery
+
+# Максимальный возраст меню (секунды), после которого нажатия не обрабатываются
+FRESH_CALLBACK_MAX_AGE = 30
+
+
+class FreshCallback(BaseFilter):
+    """
+    Пропускает только нажатия на свежие меню
+
+    Возраст меню считается от последнего редактирования сообщения (или от
+    его отправки). Нажатие на устаревшее меню сразу получает ответ-подсказку
+    и не запускает обработчик, поэтому старые кнопки не расходуют запросы к
+    БД и CoC API.
+    """
+
+    def __init__(self, max_age: float = FRESH_CALLBACK_MAX_AGE,
+                 stale_text: str = "⌛ Меню устарело, вызовите команду заново"):
+        self.max_age = max_age
+        self.stale_text = stale_text
+
+    async def __call__(self, callback: CallbackQuery) -> bool:
+        message = callback.message
+        # Inline-сообщения и недоступные сообщения не содержат даты
+        if message is None or not getattr(message, "date", None):
+            return True
+
+        # edit_date - Unix-время (int), date - datetime
+        shown_at = getattr(message, "edit_date", None) or message.date.timestamp()
+        if time.time() - shown_at < self.max_age:
+            return True
+
+        await callback.answer(self.stale_text)
+        return False
@@ -84,8 +84,7 @@ async def register_clan_command(message: Message, command: CommandObject):
         
         # Получаем данные клана из CoC API
         try:
-            async with coc_api:
-                clan_data = await coc_api.get_clan(clan_tag)
+            clan_data = await coc_api.get_clan(clan_tag)
         except ClanNotFound:
             await status_msg.edit_text(
                 f"❌ **Клан {clan_tag} не найден!**\n\n"
@@ -533,8 +532,7 @@ async def clan_members_command(message: Message, command: CommandObject):
         
         try:
             # Получаем участников из CoC API
-            async with coc_api:
-                members = await coc_api.get_clan_members(clan.clan_tag)
+            members = await coc_api.get_clan_members(clan.clan_tag)
             
             if not members:
                 await status_msg.edit_text(
@@ -690,8 +688,7 @@ async def update_clan_command(message: Message, command: CommandObject):
         
         try:
             # Получаем свежие данные из CoC API
-            async with coc_api:
-                fresh_clan_data = await coc_api.get_clan(clan.clan_tag)
+            fresh_clan_data = await coc_api.get_clan(clan.clan_tag)
             
             # Сохраняем старые данные для сравнения
             old_level = clan.clan_level
@@ -987,9 +984,8 @@ async def clan_stats_command(message: Message, command: CommandObject):
         
         try:
             # Получаем свежие данные и участников
-            async with coc_api:
-                clan_data = await coc_api.get_clan(clan.clan_tag)
-                members = await coc_api.get_clan_members(clan.clan_tag)
+            clan_data = await coc_api.get_clan(clan.clan_tag)
+            members = await coc_api.get_clan_members(clan.clan_tag)
             
             # Анализируем участников
             total_donations = sum(member.get('donations', 0) for member in members)
@@ -1104,35 +1100,34 @@ async def update_all_clans_command(message: Message):
         failed_count = 0
         failed_clans = []
         
-        async with coc_api:
-            for i, clan in enumerate(clans, 1):
-                try:
-                    # Обновляем статус
-                    await status_msg.edit_text(
-                        f"🔄 **Обновляю данные кланов...**\n\n"
-                        f"📊 Прогресс: {i}/{len(clans)}\n"
-                        f"🏰 Обновляю: {clan.clan_name}\n"
-                        f"✅ Обновлено: {updated_count}\n"
-                        f"❌ Ошибок: {failed_count}",
-                        parse_mode="Markdown"
-                    )
-                    
-                    # Получаем свежие данные
-                    fresh_data = await coc_api.get_clan(clan.clan_tag)
-                    
-                    # Обновляем в БД
-                    success = await db_service.update_clan_data(clan.id, fresh_data)
-                    
-                    if success:
-                        updated_count += 1
-                    else:
-                        failed_count += 1
-                        failed_clans.append(clan.clan_name)
-                        
-                except Exception as e:
+        for i, clan in enumerate(clans, 1):
+            try:
+                # Обновляем статус
+                await status_msg.edit_text(
+                    f"🔄 **Обновляю данные кланов...**\n\n"
+                    f"📊 Прогресс: {i}/{len(clans)}\n"
+                    f"🏰 Обновляю: {clan.clan_name}\n"
+                    f"✅ Обновлено: {updated_count}\n"
+                    f"❌ Ошибок: {failed_count}",
+                    parse_mode="Markdown"
+                )
+                
+                # Получаем свежие данные
+                fresh_data = await coc_api.get_clan(clan.clan_tag)
+                
+                # Обновляем в БД
+                success = await db_service.update_clan_data(clan.id, fresh_data)
+                
+                if success:
+                    updated_count += 1
+                else:
                     failed_count += 1
-                    failed_clans.append(f"{clan.clan_name}: {str(e)}")
-                    logger.error(f"Failed to update clan {clan.clan_tag}: {e}")
+                    failed_clans.append(clan.clan_name)
+                    
+            except Exception as e:
+                failed_count += 1
+                failed_clans.append(f"{clan.clan_name}: {str(e)}")
+                logger.error(f"Failed to update clan {clan.clan_tag}: {e}")
         
         # Финальный результат
         result_text = f"✅ **Обновление завершено!**\n\n"
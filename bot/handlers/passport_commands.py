@@ -1,26 +1,264 @@
 """
 Хандлеры команд для работы с паспортами игроков
 """
+from __future__ import annotations
+
+import asyncio
+import functools
+import hashlib
+import heapq
 import logging
+import secrets
+import time
 from datetime import datetime
-from aiogram import Router, F
+from typing import TYPE_CHECKING, Dict, Optional, Set, Tuple
+from aiogram import Router
 from aiogram.types import Message, InlineKeyboardMarkup, InlineKeyboardButton, CallbackQuery
 from aiogram.filters import Command, CommandObject
 from aiogram.exceptions import TelegramBadRequest
 
-from ..models.passport_models import (
-    PassportInfo, PassportOperationLog, PassportStatus, PassportAlreadyExists,
-    PassportNotFound, PassportValidationError, PassportTheme, PassportSettings
-)
+from ..models.passport_models import PassportOperationLog, PassportStatus, PassportAlreadyExists
 from ..services.passport_database_service import get_passport_db_service
+from ..middleware.passport_middleware import PassportMiddleware, requires_passport
+from ..services.passport_cache import get_passport_cache
 from ..services.clan_database_service import get_clan_db_service
-from ..utils.validators import format_number, format_date, format_role_emoji, format_role_name
+from ..utils.validators import format_number, format_date
+
+if TYPE_CHECKING:
+    from ..models.passport_models import PassportInfo, PassportSettings
 
 logger = logging.getLogger(__name__)
 
 # Создаем роутер для команд паспортов
 passport_router = Router(name="passport_router")
 
+_MD = "Markdown"
+_DT_MIN = datetime.min  # ключ сортировки для паспортов без даты создания
+
+# Типовые сообщения об ошибках
+_ERR_CREATE = (
+    "❌ **Ошибка создания паспорта**\n\n"
+    "Попробуйте позже или обратитесь к администратору."
+)
+_ERR_GET = (
+    "❌ **Ошибка получения паспорта**\n\n"
+    "Попробуйте позже или обратитесь к администратору."
+)
+_ERR_EDIT = (
+    "❌ **Ошибка редактирования паспорта**\n\n"
+    "Попробуйте позже или обратитесь к администратору."
+)
+_ERR_LIST = (
+    "❌ **Ошибка получения списка паспортов**\n\n"
+    "Попробуйте позже или обратитесь к администратору."
+)
+_ERR_DELETE = (
+    "❌ **Ошибка при удалении паспорта**\n\n"
+    "Попробуйте позже или обратитесь к администратору."
+)
+
+# Статические ответы
+_MSG_ALREADY_EXISTS = (
+    "📋 **У вас уже есть паспорт!**\n\n"
+    "Используйте `/passport` для просмотра или `/edit_passport` для редактирования."
+)
+_MSG_ALREADY_EXISTS_SHORT = (
+    "📋 **У вас уже есть паспорт!**\n\n"
+    "Используйте `/passport` для просмотра."
+)
+_MSG_CREATE_CANCELLED = "🚫 **Создание паспорта отменено.**"
+_MSG_USERNAME_UNSUPPORTED = (
+    "❌ **Поиск по username пока не поддерживается**\n\n"
+    "Используйте `/passport` без аргументов для просмотра своего паспорта."
+)
+_MSG_PASSPORT_FMT_ERROR = (
+    "❌ **Неверный формат!**\n\n"
+    "Используйте `/passport` для своего паспорта или `/passport @username`"
+)
+_MSG_NO_PASSPORT_SELF = (
+    "📋 **У вас пока нет паспорта**\n\n"
+    "Создайте его командой `/create_passport`"
+)
+_MSG_NO_PASSPORT_OTHER = (
+    "📋 **Паспорт не найден**\n\n"
+    "У пользователя нет паспорта или он скрыт владельцем."
+)
+_MSG_NO_PASSPORT = (
+    "📋 **У вас нет паспорта**\n\n"
+    "Создайте его командой `/create_passport`"
+)
+_MSG_EDIT_FMT_ERROR = (
+    "❌ **Неверный формат!**\n\n"
+    "**Использование:** `/edit_passport <поле> <значение>`\n\n"
+    "**Поля:** name, bio, clan\n"
+    "**Пример:** `/edit_passport name Новое Имя`"
+)
+_MSG_NO_CHAT_PASSPORTS = (
+    "📋 **В этом чате пока нет паспортов**\n\n"
+    "Создайте первый паспорт командой `/create_passport`"
+)
+_MSG_NO_PASSPORT_TO_DELETE = "📋 **У вас нет паспорта для удаления**"
+_MSG_DELETE_CANCELLED = "🚫 **Удаление паспорта отменено.**"
+_DELETE_CONFIRM_TMPL = (
+    "⚠️ **Подтвердите удаление паспорта**\n\n"
+    "👤 **Имя:** {name}\n"
+    "📅 **Создан:** {date}\n\n"
+    "**⚠️ Внимание!** Это действие нельзя отменить.\n"
+    "Все данные паспорта будут безвозвратно удалены.\n\n"
+    "Вы уверены?"
+)
+
+# Клавиатура управления паспортом (одинакова для всех владельцев)
+_PASSPORT_CONTROL_KB = InlineKeyboardMarkup(inline_keyboard=[
+    [
+        InlineKeyboardButton(text="✏️ Редактировать", callback_data="passport_edit"),
+        InlineKeyboardButton(text="⚙️ Настройки", callback_data="passport_settings")
+    ],
+    [
+        InlineKeyboardButton(text="🔄 Обновить", callback_data="passport_refresh")
+    ]
+])
+_CONFIRM_DELETE_PREFIX = "confirm_delete_passport:"
+_CANCEL_DELETE_BUTTON = InlineKeyboardButton(
+    text="❌ Отменить", callback_data="cancel_delete_passport"
+)
+
+
+def _delete_confirm_keyboard(ref: str) -> InlineKeyboardMarkup:
+    """
+    Клавиатура подтверждения удаления (меняется только кнопка подтверждения)
+    
+    Args:
+        ref: Токен подтверждения из кэша или ID паспорта, если кэш отключен
+    """
+    return InlineKeyboardMarkup(inline_keyboard=[
+        [InlineKeyboardButton(
+            text="✅ Да, удалить",
+            callback_data=_CONFIRM_DELETE_PREFIX + ref
+        )],
+        [_CANCEL_DELETE_BUTTON]
+    ])
+
+
+async def _reply_md(target: Message, text: str, **kwargs):
+    """Ответ на сообщение с разметкой Markdown"""
+    return await target.reply(text, parse_mode=_MD, **kwargs)
+
+
+async def _notify_after_answer(callback: CallbackQuery, text: str):
+    """
+    Сообщение об ошибке для callback'а, на который уже ответили.
+    Повторный answerCallbackQuery Telegram отклоняет, поэтому пишем в чат.
+    """
+    try:
+        await callback.message.answer(text)
+    except Exception as e:
+        logger.error("Error notifying about callback failure: %s", e)
+
+
+async def _edit_and_answer(callback: CallbackQuery, text: str, answer_text: str, **kwargs):
+    """
+    Редактирование сообщения и ответ на callback одновременно.
+    Это два независимых запроса к API, ошибка одного не отменяет другой.
+    """
+    results = await asyncio.gather(
+        callback.message.edit_text(text, **kwargs),
+        callback.answer(answer_text),
+        return_exceptions=True
+    )
+    for result in results:
+        if isinstance(result, Exception):
+            logger.error("Error finishing callback %s: %s", callback.data, result)
+
+
+async def _edit_view(callback: CallbackQuery, text: str, keyboard: InlineKeyboardMarkup) -> bool:
+    """
+    Редактирование сообщения с паспортом/меню, если текст действительно изменился
+    
+    Хэш последнего отправленного текста хранится в кэше по (chat_id, message_id).
+    Все экраны паспорта редактируются через эту функцию, поэтому хэш всегда
+    соответствует текущему содержимому сообщения.
+    
+    Returns:
+        bool: True если сообщение было отредактировано
+    """
+    message = callback.message
+    digest = hashlib.blake2b(text.encode(), digest_size=8).hexdigest()
+    cache = get_passport_cache()
+    
+    if await cache.swap_message_hash(message.chat.id, message.message_id, digest) == digest:
+        return False
+    
+    try:
+        await message.edit_text(text, reply_markup=keyboard, parse_mode=_MD)
+    except TelegramBadRequest as e:
+        # Текст уже такой же (например, кэш отключен) - это не ошибка
+        if _is_not_modified(e):
+            return False
+        await cache.forget_message_hash(message.chat.id, message.message_id)
+        raise
+    except Exception:
+        await cache.forget_message_hash(message.chat.id, message.message_id)
+        raise
+    return True
+
+
+def _is_not_modified(error: TelegramBadRequest) -> bool:
+    """Ошибка Telegram "message is not modified" при редактировании без изменений"""
+    return "message is not modified" in str(error)
+
+
+# Фоновые задачи обработчиков (храним ссылки, чтобы задачи не собрал GC)
+_background_tasks: Set[asyncio.Task] = set()
+
+
+def _run_in_background(coro) -> asyncio.Task:
+    """Запуск работы обработчика в фоне, чтобы сразу освободить апдейт"""
+    task = asyncio.create_task(coro)
+    _background_tasks.add(task)
+    task.add_done_callback(_background_tasks.discard)
+    return task
+
+
+# Блокировки повторных нажатий: (user_id, chat_id) -> Lock
+_click_locks: Dict[Tuple[int, int], asyncio.Lock] = {}
+
+
+def _drop_repeated_clicks(handler):
+    """
+    Декоратор для callback'ов с записью в БД: пока предыдущее нажатие
+    того же пользователя в чате не обработано, повторные отбрасываются
+    """
+    @functools.wraps(handler)
+    async def wrapper(callback: CallbackQuery, *args):
+        key = (callback.from_user.id, callback.message.chat.id)
+        lock = _click_locks.setdefault(key, asyncio.Lock())
+        if lock.locked():
+            await callback.answer("⏳", cache_time=1)
+            return
+        try:
+            async with lock:
+                await handler(callback, *args)
+        finally:
+            # Ожидающих нет (повторы отбрасываются), блокировку можно убрать
+            if not lock.locked():
+                _click_locks.pop(key, None)
+    return wrapper
+
+
+# Справочники для отображения настроек
+_PRIVACY_EMOJI = ("🌍", "👥", "🔒")
+_FIELD_LABEL = {"name": "Имя", "bio": "Био"}
+_FIELD_COLUMNS = {"name": "display_name", "bio": "bio"}
+_FIELD_LIMITS = {"name": 50, "bio": 200}
+_THEME_EMOJI = {
+    "default": "🎨",
+    "dark": "🌙",
+    "clan": "🏰",
+    "achievements": "🏆",
+    "minimalist": "⚪"
+}
+
 
 @passport_router.message(Command("create_passport"))
 async def create_passport_command(message: Message, command: CommandObject):
@@ -38,11 +276,7 @@ async def create_passport_command(message: Message, command: CommandObject):
         )
         
         if existing_passport:
-            await message.reply(
-                f"📋 **У вас уже есть паспорт!**\n\n"
-                f"Используйте `/passport` для просмотра или `/edit_passport` для редактирования.",
-                parse_mode="Markdown"
-            )
+            await _reply_md(message, _MSG_ALREADY_EXISTS)
             return
         
         # Получаем отображаемое имя
@@ -81,37 +315,27 @@ async def create_passport_command(message: Message, command: CommandObject):
                 f"💡 **Совет:** В этом чате пока нет зарегистрированных кланов. "
                 f"Администраторы могут добавить кланы через `/register_clan`.\n\n"
                 f"Используйте `/passport` для просмотра своего паспорта.",
-                parse_mode="Markdown"
+                parse_mode=_MD
             )
             return
         
-        # Показываем выбор клана
-        keyboard = InlineKeyboardMarkup(inline_keyboard=[])
-        
-        # Кнопки для выбора клана
-        for i, clan in enumerate(available_clans, 1):
-            keyboard.inline_keyboard.append([
-                InlineKeyboardButton(
-                    text=f"🏰 {i}. {clan.clan_name} ({clan.member_count}/50)",
-                    callback_data=f"create_passport_clan:{clan.id}:{display_name}"
-                )
-            ])
-        
-        # Кнопка "без клана"
-        keyboard.inline_keyboard.append([
-            InlineKeyboardButton(
-                text="❌ Создать без клана",
-                callback_data=f"create_passport_clan:0:{display_name}"
-            )
-        ])
-        
-        # Кнопка отмены
-        keyboard.inline_keyboard.append([
-            InlineKeyboardButton(
-                text="🚫 Отменить",
-                callback_data="create_passport_cancel"
-            )
-        ])
+        # Показываем выбор клана: кнопки кланов, "без клана" и отмена
+        rows = [
+            [InlineKeyboardButton(
+                text=f"🏰 {i}. {clan.clan_name} ({clan.member_count}/50)",
+                callback_data=f"create_passport_clan:{clan.id}:{display_name}"
+            )]
+            for i, clan in enumerate(available_clans, 1)
+        ]
+        rows.append([InlineKeyboardButton(
+            text="❌ Создать без клана",
+            callback_data=f"create_passport_clan:0:{display_name}"
+        )])
+        rows.append([InlineKeyboardButton(
+            text="🚫 Отменить",
+            callback_data="create_passport_cancel"
+        )])
+        keyboard = InlineKeyboardMarkup(inline_keyboard=rows)
         
         await message.reply(
             f"📋 **Создание паспорта**\n\n"
@@ -120,29 +344,23 @@ async def create_passport_command(message: Message, command: CommandObject):
             f"(Вы сможете изменить его позже)\n\n"
             f"📝 **Доступные кланы в чате:**",
             reply_markup=keyboard,
-            parse_mode="Markdown"
+            parse_mode=_MD
         )
         
     except PassportAlreadyExists:
-        await message.reply(
-            "📋 **У вас уже есть паспорт!**\n\n"
-            "Используйте `/passport` для просмотра."
-        )
-    except Exception as e:
-        logger.error(f"Error in create_passport_command: {e}")
-        await message.reply(
-            "❌ **Ошибка создания паспорта**\n\n"
-            "Попробуйте позже или обратитесь к администратору."
-        )
+        await message.reply(_MSG_ALREADY_EXISTS_SHORT)
+    except Exception:
+        logger.exception("Error in create_passport_command")
+        await _reply_md(message, _ERR_CREATE)
 
 
-@passport_router.callback_query(F.data.startswith("create_passport_clan:"))
 async def create_passport_with_clan_callback(callback: CallbackQuery):
     """Обработка выбора клана при создании паспорта"""
     try:
-        data_parts = callback.data.split(":")
-        clan_id = int(data_parts[1])
-        display_name = data_parts[2] if len(data_parts) > 2 else callback.from_user.full_name
+        # maxsplit=2: имя может содержать ":" и не должно обрезаться
+        _, clan_id_str, *rest = callback.data.split(":", maxsplit=2)
+        clan_id = int(clan_id_str)
+        display_name = rest[0] if rest else callback.from_user.full_name
         
         passport_service = get_passport_db_service()
         
@@ -189,23 +407,16 @@ async def create_passport_with_clan_callback(callback: CallbackQuery):
             f"• `/edit_passport` - редактировать информацию"
         )
         
-        await callback.message.edit_text(
-            response_text,
-            parse_mode="Markdown"
-        )
+        await _edit_and_answer(callback, response_text, "✅ Паспорт создан!", parse_mode=_MD)
         
-        await callback.answer("✅ Паспорт создан!")
-        
-    except Exception as e:
-        logger.error(f"Error in create_passport_with_clan_callback: {e}")
+    except Exception:
+        logger.exception("Error in create_passport_with_clan_callback")
         await callback.answer("❌ Ошибка создания паспорта", show_alert=True)
 
 
-@passport_router.callback_query(F.data == "create_passport_cancel")
 async def create_passport_cancel_callback(callback: CallbackQuery):
     """Отмена создания паспорта"""
-    await callback.message.edit_text("🚫 **Создание паспорта отменено.**")
-    await callback.answer("Отменено")
+    await _edit_and_answer(callback, _MSG_CREATE_CANCELLED, "Отменено")
 
 
 @passport_router.message(Command("passport"))
@@ -229,78 +440,39 @@ async def passport_command(message: Message, command: CommandObject):
                 target_username = arg[1:]
                 # В реальной реализации нужно получить user_id по username
                 # Здесь упрощенная версия
-                await message.reply(
-                    "❌ **Поиск по username пока не поддерживается**\n\n"
-                    "Используйте `/passport` без аргументов для просмотра своего паспорта."
-                )
+                await message.reply(_MSG_USERNAME_UNSUPPORTED)
                 return
             
             # Если указан ID
             try:
                 target_user_id = int(arg)
             except ValueError:
-                await message.reply(
-                    "❌ **Неверный формат!**\n\n"
-                    "Используйте `/passport` для своего паспорта или `/passport @username`"
-                )
+                await message.reply(_MSG_PASSPORT_FMT_ERROR)
                 return
         
-        # Получаем паспорт
-        passport = await passport_service.get_passport_by_user(target_user_id, message.chat.id)
+        # Получаем паспорт (приватные чужие паспорта отсекаются на стороне БД)
+        passport = await passport_service.get_visible_passport_by_user(
+            target_user_id, message.chat.id, message.from_user.id
+        )
         
         if not passport:
             if target_user_id == message.from_user.id:
-                await message.reply(
-                    "📋 **У вас пока нет паспорта**\n\n"
-                    "Создайте его командой `/create_passport`"
-                )
+                await message.reply(_MSG_NO_PASSPORT_SELF)
             else:
-                await message.reply(
-                    "📋 **У этого пользователя нет паспорта**"
-                )
-            return
-        
-        # Проверяем приватность (если не свой паспорт)
-        if target_user_id != message.from_user.id and passport.settings.privacy_level >= 3:
-            await message.reply(
-                "🔒 **Этот паспорт приватный**\n\n"
-                "Владелец скрыл свой паспорт от посторонних."
-            )
+                await message.reply(_MSG_NO_PASSPORT_OTHER)
             return
         
         # Формируем отображение паспорта
         passport_text = await _format_passport_display(passport, is_owner=(target_user_id == message.from_user.id))
         
         # Создаем клавиатуру управления (только для владельца)
-        keyboard = None
-        if target_user_id == message.from_user.id:
-            keyboard = InlineKeyboardMarkup(inline_keyboard=[
-                [
-                    InlineKeyboardButton(
-                        text="✏️ Редактировать",
-                        callback_data="passport_edit"
-                    ),
-                    InlineKeyboardButton(
-                        text="⚙️ Настройки",
-                        callback_data="passport_settings"
-                    )
-                ],
-                [
-                    InlineKeyboardButton(
-                        text="🔄 Обновить",
-                        callback_data="passport_refresh"
-                    )
-                ]
-            ])
+        keyboard = _PASSPORT_CONTROL_KB if target_user_id == message.from_user.id else None
         
-        await message.reply(passport_text, reply_markup=keyboard, parse_mode="Markdown")
+        await _reply_md(message, passport_text, reply_markup=keyboard)
         
-    except Exception as e:
-        logger.error(f"Error in passport_command: {e}")
-        await message.reply(
-            "❌ **Ошибка получения паспорта**\n\n"
-            "Попробуйте позже или обратитесь к администратору."
-        )
+    except Exception:
+        logger.exception("Error in passport_command")
+        await _reply_md(message, _ERR_GET)
 
 
 @passport_router.message(Command("edit_passport"))
@@ -318,10 +490,7 @@ async def edit_passport_command(message: Message, command: CommandObject):
         )
         
         if not passport:
-            await message.reply(
-                "📋 **У вас нет паспорта**\n\n"
-                "Создайте его командой `/create_passport`"
-            )
+            await message.reply(_MSG_NO_PASSPORT)
             return
         
         if not command.args:
@@ -365,52 +534,39 @@ async def edit_passport_command(message: Message, command: CommandObject):
                 f"🔒 **Приватность:** уровень {passport.settings.privacy_level}\n\n"
                 f"Выберите что хотите изменить:",
                 reply_markup=keyboard,
-                parse_mode="Markdown"
+                parse_mode=_MD
             )
             return
         
         # Парсим аргументы для быстрого редактирования
         args = command.args.split(maxsplit=1)
         if len(args) < 2:
-            await message.reply(
-                "❌ **Неверный формат!**\n\n"
-                "**Использование:** `/edit_passport <поле> <значение>`\n\n"
-                "**Поля:** name, bio, clan\n"
-                "**Пример:** `/edit_passport name Новое Имя`"
-            )
+            await message.reply(_MSG_EDIT_FMT_ERROR)
             return
         
         field, value = args
         field = field.lower()
         
-        # Обновляем поле
-        update_success = False
-        
-        if field == "name":
-            if len(value) > 50:
-                await message.reply("❌ **Имя слишком длинное (максимум 50 символов)**")
-                return
-            
-            update_success = await passport_service.update_passport(
-                passport.id, display_name=value
-            )
-            
-        elif field == "bio":
-            if len(value) > 200:
-                await message.reply("❌ **Био слишком длинное (максимум 200 символов)**")
-                return
-            
-            update_success = await passport_service.update_passport(
-                passport.id, bio=value
-            )
-            
-        else:
+        limit = _FIELD_LIMITS.get(field)
+        if limit is None:
             await message.reply(
                 f"❌ **Неизвестное поле '{field}'**\n\n"
                 "Доступные поля: name, bio"
             )
             return
         
+        value = _validate_field(value, limit)
+        if value is None:
+            await message.reply(
+                f"❌ **{_FIELD_LABEL[field]} слишком длинное (максимум {limit} символов)**"
+            )
+            return
+        
+        # Обновляем поле
+        update_success = await passport_service.update_passport(
+            passport.id, **{_FIELD_COLUMNS[field]: value}
+        )
+        
         if update_success:
             # Логируем изменение
             log_entry = PassportOperationLog.create_log(
@@ -424,17 +580,14 @@ async def edit_passport_command(message: Message, command: CommandObject):
             
             await message.reply(
                 f"✅ **Паспорт обновлен!**\n\n"
-                f"**{field.title()}** изменено на: {value}"
+                f"**{_FIELD_LABEL[field]}** изменено на: {value}"
             )
         else:
             await message.reply("❌ **Ошибка обновления паспорта**")
             
-    except Exception as e:
-        logger.error(f"Error in edit_passport_command: {e}")
-        await message.reply(
-            "❌ **Ошибка редактирования паспорта**\n\n"
-            "Попробуйте позже или обратитесь к администратору."
-        )
+    except Exception:
+        logger.exception("Error in edit_passport_command")
+        await _reply_md(message, _ERR_EDIT)
 
 
 @passport_router.message(Command("passport_list"))
@@ -451,10 +604,7 @@ async def passport_list_command(message: Message):
         )
         
         if not passports:
-            await message.reply(
-                "📋 **В этом чате пока нет паспортов**\n\n"
-                "Создайте первый паспорт командой `/create_passport`"
-            )
+            await message.reply(_MSG_NO_CHAT_PASSPORTS)
             return
         
         # Получаем статистику
@@ -471,10 +621,10 @@ async def passport_list_command(message: Message):
             f"👥 **Список участников:**\n"
         )
         
-        # Сортируем по времени создания (новые сначала)
-        passports.sort(key=lambda p: p.created_at or datetime.min, reverse=True)
+        # Берем 20 самых новых паспортов (полная сортировка не нужна)
+        newest = heapq.nlargest(20, passports, key=lambda p: p.created_at or _DT_MIN)
         
-        for i, passport in enumerate(passports[:20], 1):  # Показываем максимум 20
+        for i, passport in enumerate(newest, 1):  # Показываем максимум 20
             # Формируем информацию об участнике
             name = passport.display_name or passport.username or f"User {passport.user_id}"
             
@@ -489,14 +639,73 @@ async def passport_list_command(message: Message):
         
         text += f"\n\n💡 **Легенда:** ✅ - игрок привязан, ⏳ - игрок не привязан"
         
-        await message.reply(text, parse_mode="Markdown")
+        await _reply_md(message, text)
         
-    except Exception as e:
-        logger.error(f"Error in passport_list_command: {e}")
-        await message.reply(
-            "❌ **Ошибка получения списка паспортов**\n\n"
-            "Попробуйте позже или обратитесь к администратору."
-        )
+    except Exception:
+        logger.exception("Error in passport_list_command")
+        await _reply_md(message, _ERR_LIST)
+
+
+def _validate_field(value: str, limit: int) -> Optional[str]:
+    """Обрезка пробелов и проверка длины за один проход; None - если значение слишком длинное"""
+    value = value.strip()
+    return value if len(value) <= limit else None
+
+
+# Отображение паспорта: шаблон собирается одним format_map, опциональные блоки
+# подставляются готовыми строками (пустыми, если блока нет)
+_PASSPORT_TMPL = (
+    "📋 **Паспорт игрока**\n\n"
+    "👤 **{name}**{username}\n"
+    "📊 **Статус:** {status}\n"
+    "{bio}"
+    "\n🏰 **Клан:**\n"
+    "{clan}"
+    "\n🎮 **Игрок Clash of Clans:**\n"
+    "{binding}"
+    "{stats}"
+    "{owner}"
+    "\n📅 **Создан:** {created}\n"
+    "{updated}"
+)
+_STATS_TMPL = (
+    "\n📊 **Статистика:**\n"
+    "• 💬 Сообщений: {messages}\n"
+    "• 🤖 Команд использовано: {commands}\n"
+    "• 📅 Дней активности: {days}\n"
+    "{last_activity}"
+)
+_OWNER_TMPL = (
+    "\n🔧 **Настройки:**\n"
+    "• 🎨 Тема: {theme}\n"
+    "• 🔒 Приватность: уровень {privacy}\n"
+)
+_NO_BINDING = (
+    "• Не привязан\n"
+    "• Используйте `/bind_player <тег>` для привязки\n"
+)
+_STATUS_LABELS = {
+    PassportStatus.ACTIVE: "✅ Активный",
+    PassportStatus.INACTIVE: "⏸️ Неактивный",
+    PassportStatus.PENDING: "⏳ Ожидание",
+    PassportStatus.BLOCKED: "🚫 Заблокирован"
+}
+
+
+@functools.lru_cache(maxsize=4096)
+def _fmt_ts(ts: float, minute: int) -> str:
+    """
+    Кэшированное форматирование даты по epoch-секундам.
+    format_date выводит относительное время, поэтому в ключ входит текущая минута.
+    """
+    return format_date(datetime.fromtimestamp(ts))
+
+
+def _fmt_date(value: Optional[datetime]) -> str:
+    """Форматирование даты с кэшированием для datetime"""
+    if isinstance(value, datetime):
+        return _fmt_ts(value.timestamp(), int(time.time()) // 60)
+    return format_date(value)
 
 
 async def _format_passport_display(passport: PassportInfo, is_owner: bool = False) -> str:
@@ -510,86 +719,71 @@ async def _format_passport_display(passport: PassportInfo, is_owner: bool = Fals
     Returns:
         str: Отформатированный текст паспорта
     """
-    # Заголовок
-    text = f"📋 **Паспорт игрока**\n\n"
-    
-    # Основная информация
-    text += f"👤 **{passport.display_name}**"
-    if passport.username:
-        text += f" (@{passport.username})"
-    text += "\n"
-    
-    # Статус
-    status_emojis = {
-        PassportStatus.ACTIVE: "✅ Активный",
-        PassportStatus.INACTIVE: "⏸️ Неактивный", 
-        PassportStatus.PENDING: "⏳ Ожидание",
-        PassportStatus.BLOCKED: "🚫 Заблокирован"
-    }
-    text += f"📊 **Статус:** {status_emojis.get(passport.status, passport.status.value)}\n"
-    
-    # Био
-    if passport.bio:
-        text += f"📝 **О себе:** {passport.bio}\n"
-    
-    text += "\n"
+    settings = passport.settings
     
     # Информация о клане
-    text += "🏰 **Клан:**\n"
     if passport.preferred_clan_name:
-        text += f"• Предпочитаемый: {passport.preferred_clan_name}\n"
+        clan = f"• Предпочитаемый: {passport.preferred_clan_name}\n"
         if passport.preferred_clan_tag:
-            text += f"• Тег: `{passport.preferred_clan_tag}`\n"
+            clan += f"• Тег: `{passport.preferred_clan_tag}`\n"
     else:
-        text += "• Не выбран\n"
+        clan = "• Не выбран\n"
     
     # Привязка игрока
-    text += "\n🎮 **Игрок Clash of Clans:**\n"
-    if passport.player_binding:
-        binding = passport.player_binding
-        text += f"• **{binding.player_name}** `{binding.player_tag}`\n"
-        
+    binding = passport.player_binding
+    if binding:
+        binding_text = f"• **{binding.player_name}** `{binding.player_tag}`\n"
         if binding.verified:
-            text += "• ✅ Верифицирован"
-            if binding.verified_at:
-                text += f" {format_date(binding.verified_at)}"
-            text += "\n"
+            verified_at = f" {_fmt_date(binding.verified_at)}" if binding.verified_at else ""
+            binding_text += f"• ✅ Верифицирован{verified_at}\n"
         else:
-            text += "• ⏳ Ожидает верификации\n"
-            
+            binding_text += "• ⏳ Ожидает верификации\n"
         if binding.clan_name and binding.clan_name != passport.preferred_clan_name:
-            text += f"• 🏰 Текущий клан: {binding.clan_name}\n"
+            binding_text += f"• 🏰 Текущий клан: {binding.clan_name}\n"
     else:
-        text += "• Не привязан\n"
-        text += "• Используйте `/bind_player <тег>` для привязки\n"
+        binding_text = _NO_BINDING
     
     # Статистика (если разрешено настройками)
-    if passport.settings.show_stats:
-        text += f"\n📊 **Статистика:**\n"
-        text += f"• 💬 Сообщений: {format_number(passport.stats.messages_count)}\n"
-        text += f"• 🤖 Команд использовано: {passport.stats.commands_used}\n"
-        text += f"• 📅 Дней активности: {passport.stats.days_active}\n"
-        
-        if passport.stats.last_activity:
-            text += f"• 🕐 Последняя активность: {format_date(passport.stats.last_activity)}\n"
+    stats = ""
+    if settings.show_stats:
+        last_activity = passport.stats.last_activity
+        stats = _STATS_TMPL.format_map({
+            "messages": format_number(passport.stats.messages_count),
+            "commands": passport.stats.commands_used,
+            "days": passport.stats.days_active,
+            "last_activity": (
+                f"• 🕐 Последняя активность: {_fmt_date(last_activity)}\n" if last_activity else ""
+            ),
+        })
     
     # Дополнительная информация для владельца
+    owner = ""
     if is_owner:
-        text += f"\n🔧 **Настройки:**\n"
-        text += f"• 🎨 Тема: {passport.settings.theme.value}\n"
-        text += f"• 🔒 Приватность: уровень {passport.settings.privacy_level}\n"
+        owner = _OWNER_TMPL.format_map({
+            "theme": settings.theme.value,
+            "privacy": settings.privacy_level,
+        })
     
-    # Информация о создании
-    text += f"\n📅 **Создан:** {format_date(passport.created_at)}\n"
+    updated = ""
     if passport.updated_at and passport.updated_at != passport.created_at:
-        text += f"🔄 **Обновлен:** {format_date(passport.updated_at)}"
+        updated = f"🔄 **Обновлен:** {_fmt_date(passport.updated_at)}"
     
-    return text
-
+    return _PASSPORT_TMPL.format_map({
+        "name": passport.display_name,
+        "username": f" (@{passport.username})" if passport.username else "",
+        "status": _STATUS_LABELS.get(passport.status, passport.status.value),
+        "bio": f"📝 **О себе:** {passport.bio}\n" if passport.bio else "",
+        "clan": clan,
+        "binding": binding_text,
+        "stats": stats,
+        "owner": owner,
+        "created": passport.created_at_formatted,
+        "updated": updated,
+    })
 
-@passport_router.callback_query(F.data == "passport_edit")
 async def passport_edit_callback(callback: CallbackQuery):
     """Меню редактирования паспорта"""
+    await callback.answer()
     keyboard = InlineKeyboardMarkup(inline_keyboard=[
         [
             InlineKeyboardButton(
@@ -619,95 +813,97 @@ async def passport_edit_callback(callback: CallbackQuery):
         ]
     ])
     
-    await callback.message.edit_text(
+    await _edit_view(
+        callback,
         "✏️ **Редактирование паспорта**\n\n"
         "Выберите что хотите изменить:",
-        reply_markup=keyboard,
-        parse_mode="Markdown"
+        keyboard
     )
-    await callback.answer()
 
 
-@passport_router.callback_query(F.data == "passport_settings")
-async def passport_settings_callback(callback: CallbackQuery):
+@requires_passport
+async def passport_settings_callback(callback: CallbackQuery, passport: PassportInfo):
     """Настройки паспорта"""
+    await callback.answer()
     try:
-        passport_service = get_passport_db_service()
-        passport = await passport_service.get_passport_by_user(
-            callback.from_user.id, callback.message.chat.id
-        )
-        
-        if not passport:
-            await callback.answer("❌ Паспорт не найден", show_alert=True)
-            return
-        
-        # Эмодзи для настроек
-        privacy_emoji = ["🌍", "👥", "🔒"][passport.settings.privacy_level - 1]
-        theme_emoji = {
-            "default": "🎨",
-            "dark": "🌙", 
-            "clan": "🏰",
-            "achievements": "🏆",
-            "minimalist": "⚪"
-        }.get(passport.settings.theme.value, "🎨")
-        
-        keyboard = InlineKeyboardMarkup(inline_keyboard=[
-            [
-                InlineKeyboardButton(
-                    text=f"{privacy_emoji} Приватность (ур. {passport.settings.privacy_level})",
-                    callback_data="settings_privacy"
-                )
-            ],
-            [
-                InlineKeyboardButton(
-                    text=f"{theme_emoji} Тема ({passport.settings.theme.value})",
-                    callback_data="settings_theme"
-                )
-            ],
-            [
-                InlineKeyboardButton(
-                    text="📊 Показывать статистику" if passport.settings.show_stats else "📊 Скрыть статистику",
-                    callback_data="settings_toggle_stats"
-                )
-            ],
-            [
-                InlineKeyboardButton(
-                    text="🏰 Показывать клан" if passport.settings.show_clan_info else "🏰 Скрыть клан",
-                    callback_data="settings_toggle_clan"
-                )
-            ],
-            [
-                InlineKeyboardButton(
-                    text="🔙 Назад к паспорту",
-                    callback_data="passport_refresh"
-                )
-            ]
-        ])
-        
-        await callback.message.edit_text(
-            f"⚙️ **Настройки паспорта**\n\n"
-            f"**Текущие настройки:**\n"
-            f"• {privacy_emoji} **Приватность:** уровень {passport.settings.privacy_level}\n"
-            f"• {theme_emoji} **Тема:** {passport.settings.theme.value}\n"
-            f"• 📊 **Статистика:** {'показывать' if passport.settings.show_stats else 'скрыть'}\n"
-            f"• 🏰 **Информация о клане:** {'показывать' if passport.settings.show_clan_info else 'скрыть'}\n\n"
-            f"**Уровни приватности:**\n"
-            f"🌍 1 - Публичный (все видят)\n"
-            f"👥 2 - Участники чата\n"
-            f"🔒 3 - Только я",
-            reply_markup=keyboard,
-            parse_mode="Markdown"
-        )
-        await callback.answer()
+        await _edit_settings_view(callback, passport)
+    except Exception:
+        logger.exception("Error in passport_settings_callback")
+        await _notify_after_answer(callback, "❌ Ошибка загрузки настроек")
+
+
+async def _edit_settings_view(callback: CallbackQuery, passport: PassportInfo):
+    """Перерисовка меню настроек по уже загруженному паспорту (без чтения из БД)"""
+    _apply_pending_settings(passport)
+    text, keyboard = _render_settings(passport.settings)
+    await _edit_view(callback, text, keyboard)
+
+
+def _render_settings(settings: PassportSettings) -> Tuple[str, InlineKeyboardMarkup]:
+    """
+    Формирование текста и клавиатуры меню настроек
+    
+    Args:
+        settings: Настройки паспорта
         
-    except Exception as e:
-        logger.error(f"Error in passport_settings_callback: {e}")
-        await callback.answer("❌ Ошибка загрузки настроек", show_alert=True)
+    Returns:
+        Tuple[str, InlineKeyboardMarkup]: Текст и клавиатура
+    """
+    # Эмодзи для настроек
+    privacy_emoji = _PRIVACY_EMOJI[settings.privacy_level - 1]
+    theme_emoji = _THEME_EMOJI.get(settings.theme.value, "🎨")
+    
+    keyboard = InlineKeyboardMarkup(inline_keyboard=[
+        [
+            InlineKeyboardButton(
+                text=f"{privacy_emoji} Приватность (ур. {settings.privacy_level})",
+                callback_data="settings_privacy"
+            )
+        ],
+        [
+            InlineKeyboardButton(
+                text=f"{theme_emoji} Тема ({settings.theme.value})",
+                callback_data="settings_theme"
+            )
+        ],
+        [
+            InlineKeyboardButton(
+                text="📊 Показывать статистику" if settings.show_stats else "📊 Скрыть статистику",
+                callback_data="settings_toggle_stats"
+            )
+        ],
+        [
+            InlineKeyboardButton(
+                text="🏰 Показывать клан" if settings.show_clan_info else "🏰 Скрыть клан",
+                callback_data="settings_toggle_clan"
+            )
+        ],
+        [
+            InlineKeyboardButton(
+                text="🔙 Назад к паспорту",
+                callback_data="passport_refresh"
+            )
+        ]
+    ])
+    
+    text = (
+        f"⚙️ **Настройки паспорта**\n\n"
+        f"**Текущие настройки:**\n"
+        f"• {privacy_emoji} **Приватность:** уровень {settings.privacy_level}\n"
+        f"• {theme_emoji} **Тема:** {settings.theme.value}\n"
+        f"• 📊 **Статистика:** {'показывать' if settings.show_stats else 'скрыть'}\n"
+        f"• 🏰 **Информация о клане:** {'показывать' if settings.show_clan_info else 'скрыть'}\n\n"
+        f"**Уровни приватности:**\n"
+        f"🌍 1 - Публичный (все видят)\n"
+        f"👥 2 - Участники чата\n"
+        f"🔒 3 - Только я"
+    )
+    return text, keyboard
 
 
-@passport_router.callback_query(F.data == "settings_privacy")
 async def settings_privacy_callback(callback: CallbackQuery):
     """Настройка приватности"""
+    await callback.answer()
     keyboard = InlineKeyboardMarkup(inline_keyboard=[
         [
             InlineKeyboardButton(
@@ -735,7 +931,8 @@ async def settings_privacy_callback(callback: CallbackQuery):
         ]
     ])
     
-    await callback.message.edit_text(
+    await _edit_view(
+        callback,
         "🔒 **Настройка приватности**\n\n"
         "**Выберите уровень приватности:**\n\n"
         "🌍 **Уровень 1 - Публичный**\n"
@@ -744,122 +941,127 @@ async def settings_privacy_callback(callback: CallbackQuery):
         "Паспорт видят только участники этого чата\n\n"
         "🔒 **Уровень 3 - Только я**\n"
         "Паспорт видите только вы",
-        reply_markup=keyboard,
-        parse_mode="Markdown"
+        keyboard
     )
-    await callback.answer()
 
 
-@passport_router.callback_query(F.data.startswith("privacy_set:"))
-async def privacy_set_callback(callback: CallbackQuery):
+@_drop_repeated_clicks
+@requires_passport
+async def privacy_set_callback(callback: CallbackQuery, passport: PassportInfo):
     """Установка уровня приватности"""
+    await callback.answer()
     try:
-        privacy_level = int(callback.data.split(":")[1])
-        
+        _, _, level_str = callback.data.partition(":")
+        privacy_level = int(level_str)
         passport_service = get_passport_db_service()
-        passport = await passport_service.get_passport_by_user(
-            callback.from_user.id, callback.message.chat.id
-        )
-        
-        if not passport:
-            await callback.answer("❌ Паспорт не найден", show_alert=True)
-            return
         
-        # Обновляем настройки
-        new_settings = passport.settings
-        new_settings.privacy_level = privacy_level
-        
-        success = await passport_service.update_passport(
-            passport.id, settings=new_settings
-        )
-        
-        if success:
-            privacy_names = {1: "Публичный", 2: "Участники чата", 3: "Только я"}
-            await callback.answer(f"✅ Приватность: {privacy_names[privacy_level]}")
-            
-            # Возвращаемся к настройкам
-            await passport_settings_callback(callback)
+        # Обновляем настройку и перерисовываем меню по уже загруженному паспорту
+        if await passport_service.set_setting(passport.id, "privacy_level", privacy_level):
+            passport.settings.privacy_level = privacy_level
+            await _edit_settings_view(callback, passport)
         else:
-            await callback.answer("❌ Ошибка сохранения", show_alert=True)
+            await _notify_after_answer(callback, "❌ Ошибка сохранения")
             
-    except Exception as e:
-        logger.error(f"Error in privacy_set_callback: {e}")
-        await callback.answer("❌ Ошибка", show_alert=True)
+    except Exception:
+        logger.exception("Error in privacy_set_callback")
+        await _notify_after_answer(callback, "❌ Ошибка")
 
 
-@passport_router.callback_query(F.data == "settings_toggle_stats")
-async def settings_toggle_stats_callback(callback: CallbackQuery):
+@_drop_repeated_clicks
+@requires_passport
+async def settings_toggle_stats_callback(callback: CallbackQuery, passport: PassportInfo):
     """Переключение отображения статистики"""
+    await callback.answer()
     try:
         passport_service = get_passport_db_service()
-        passport = await passport_service.get_passport_by_user(
-            callback.from_user.id, callback.message.chat.id
-        )
         
-        if not passport:
-            await callback.answer("❌ Паспорт не найден", show_alert=True)
-            return
+        # Переключаем настройку одним UPDATE на стороне БД
+        show_stats = await passport_service.toggle_setting(passport.id, "show_stats")
         
-        # Переключаем настройку
-        new_settings = passport.settings
-        new_settings.show_stats = not new_settings.show_stats
-        
-        success = await passport_service.update_passport(
-            passport.id, settings=new_settings
-        )
-        
-        if success:
-            status = "показывать" if new_settings.show_stats else "скрывать"
-            await callback.answer(f"✅ Статистика: {status}")
-            
-            # Возвращаемся к настройкам
-            await passport_settings_callback(callback)
+        if show_stats is not None:
+            passport.settings.show_stats = show_stats
+            await _edit_settings_view(callback, passport)
         else:
-            await callback.answer("❌ Ошибка сохранения", show_alert=True)
+            await _notify_after_answer(callback, "❌ Ошибка сохранения")
             
-    except Exception as e:
-        logger.error(f"Error in settings_toggle_stats_callback: {e}")
-        await callback.answer("❌ Ошибка", show_alert=True)
+    except Exception:
+        logger.exception("Error in settings_toggle_stats_callback")
+        await _notify_after_answer(callback, "❌ Ошибка")
 
 
-@passport_router.callback_query(F.data == "settings_toggle_clan")
-async def settings_toggle_clan_callback(callback: CallbackQuery):
+@requires_passport
+async def settings_toggle_clan_callback(callback: CallbackQuery, passport: PassportInfo):
     """Переключение отображения информации о клане"""
+    await callback.answer()
     try:
-        passport_service = get_passport_db_service()
-        passport = await passport_service.get_passport_by_user(
-            callback.from_user.id, callback.message.chat.id
-        )
+        # Переключаем настройку сразу в памяти, запись в БД - после серии нажатий
+        _apply_pending_settings(passport)
+        passport.settings.show_clan_info = not passport.settings.show_clan_info
+        _schedule_clan_info_flush(passport.id, passport.settings.show_clan_info)
         
-        if not passport:
-            await callback.answer("❌ Паспорт не найден", show_alert=True)
-            return
-        
-        # Переключаем настройку
-        new_settings = passport.settings
-        new_settings.show_clan_info = not new_settings.show_clan_info
-        
-        success = await passport_service.update_passport(
-            passport.id, settings=new_settings
-        )
-        
-        if success:
-            status = "показывать" if new_settings.show_clan_info else "скрывать"
-            await callback.answer(f"✅ Информация о клане: {status}")
-            
-            # Возвращаемся к настройкам
-            await passport_settings_callback(callback)
-        else:
-            await callback.answer("❌ Ошибка сохранения", show_alert=True)
+        await _edit_settings_view(callback, passport)
             
-    except Exception as e:
-        logger.error(f"Error in settings_toggle_clan_callback: {e}")
-        await callback.answer("❌ Ошибка", show_alert=True)
+    except Exception:
+        logger.exception("Error in settings_toggle_clan_callback")
+        await _notify_after_answer(callback, "❌ Ошибка")
+
+
+# Отложенная запись переключателя "информация о клане": серия быстрых
+# нажатий сводится к одному UPDATE после паузы _TOGGLE_DEBOUNCE секунд
+_TOGGLE_DEBOUNCE = 0.3
+_pending_clan_info: Dict[int, bool] = {}
+_pending_flushes: Dict[int, asyncio.TimerHandle] = {}
+
+
+def _apply_pending_settings(passport: PassportInfo):
+    """Наложение еще не записанных в БД значений переключателей"""
+    value = _pending_clan_info.get(passport.id)
+    if value is not None:
+        passport.settings.show_clan_info = value
+
+
+def _schedule_clan_info_flush(passport_id: int, value: bool):
+    """Перезапуск таймера отложенной записи"""
+    _pending_clan_info[passport_id] = value
+    
+    handle = _pending_flushes.pop(passport_id, None)
+    if handle is not None:
+        handle.cancel()
+    
+    _pending_flushes[passport_id] = asyncio.get_running_loop().call_later(
+        _TOGGLE_DEBOUNCE, lambda: _run_in_background(_flush_clan_info(passport_id))
+    )
+
+
+async def _flush_clan_info(passport_id: int):
+    """Запись итогового значения переключателя в БД"""
+    _pending_flushes.pop(passport_id, None)
+    value = _pending_clan_info.get(passport_id)
+    if value is None:
+        return
+    
+    try:
+        # Пишем только итоговое значение ключа, без чтения и перезаписи всех настроек
+        passport_service = get_passport_db_service()
+        if not await passport_service.set_setting(passport_id, "show_clan_info", value):
+            logger.error("Failed to save show_clan_info for passport %s", passport_id)
+                
+    except Exception:
+        logger.exception("Error in _flush_clan_info")
+    finally:
+        # Пока шла запись, могли нажать еще раз - тогда значение остается до следующей записи
+        if passport_id not in _pending_flushes and _pending_clan_info.get(passport_id) == value:
+            del _pending_clan_info[passport_id]
 
 
-@passport_router.callback_query(F.data == "passport_refresh")
 async def passport_refresh_callback(callback: CallbackQuery):
     """Обновление отображения паспорта"""
+    await callback.answer("⏳")
+    _run_in_background(_refresh_passport(callback))
+
+
+async def _refresh_passport(callback: CallbackQuery):
+    """Перерисовка паспорта (выполняется в фоне, на callback уже ответили)"""
     try:
         passport_service = get_passport_db_service()
         passport = await passport_service.get_passport_by_user(
@@ -867,42 +1069,21 @@ async def passport_refresh_callback(callback: CallbackQuery):
         )
         
         if not passport:
-            await callback.answer("❌ Паспорт не найден", show_alert=True)
+            await _notify_after_answer(callback, "❌ Паспорт не найден")
             return
         
         # Формируем обновленное отображение
         passport_text = await _format_passport_display(passport, is_owner=True)
         
-        # Клавиатура управления
-        keyboard = InlineKeyboardMarkup(inline_keyboard=[
-            [
-                InlineKeyboardButton(
-                    text="✏️ Редактировать",
-                    callback_data="passport_edit"
-                ),
-                InlineKeyboardButton(
-                    text="⚙️ Настройки",
-                    callback_data="passport_settings"
-                )
-            ],
-            [
-                InlineKeyboardButton(
-                    text="🔄 Обновить",
-                    callback_data="passport_refresh"
-                )
-            ]
-        ])
-        
-        await callback.message.edit_text(
-            passport_text,
-            reply_markup=keyboard,
-            parse_mode="Markdown"
-        )
-        await callback.answer("🔄 Обновлено")
+        await _edit_view(callback, passport_text, _PASSPORT_CONTROL_KB)
         
-    except Exception as e:
-        logger.error(f"Error in passport_refresh_callback: {e}")
-        await callback.answer("❌ Ошибка обновления", show_alert=True)
+    except TelegramBadRequest as e:
+        # Ожидаемая ошибка API (сообщение удалено, слишком старое и т.п.) - без трейсбека
+        logger.warning("Telegram rejected passport refresh: %s", e)
+        await _notify_after_answer(callback, "❌ Ошибка обновления")
+    except Exception:
+        logger.exception("Unexpected error in _refresh_passport")
+        await _notify_after_answer(callback, "❌ Ошибка обновления")
 
 
 @passport_router.message(Command("delete_passport"))
@@ -919,58 +1100,60 @@ async def delete_passport_command(message: Message):
         )
         
         if not passport:
-            await message.reply(
-                "📋 **У вас нет паспорта для удаления**"
-            )
+            await message.reply(_MSG_NO_PASSPORT_TO_DELETE)
             return
         
-        # Запрашиваем подтверждение
-        keyboard = InlineKeyboardMarkup(inline_keyboard=[
-            [
-                InlineKeyboardButton(
-                    text="✅ Да, удалить",
-                    callback_data=f"confirm_delete_passport:{passport.id}"
-                )
-            ],
-            [
-                InlineKeyboardButton(
-                    text="❌ Отменить",
-                    callback_data="cancel_delete_passport"
-                )
-            ]
-        ])
+        # Запрашиваем подтверждение. Если кэш доступен, в callback_data кладем
+        # случайный токен вместо ID, и при подтверждении паспорт не перечитывается
+        token = secrets.token_urlsafe(8)
+        saved = await get_passport_cache().put_delete_token(
+            token, passport.user_id, passport.id, passport.display_name
+        )
+        keyboard = _delete_confirm_keyboard(token if saved else str(passport.id))
         
         await message.reply(
-            f"⚠️ **Подтвердите удаление паспорта**\n\n"
-            f"👤 **Имя:** {passport.display_name}\n"
-            f"📅 **Создан:** {format_date(passport.created_at)}\n\n"
-            f"**⚠️ Внимание!** Это действие нельзя отменить.\n"
-            f"Все данные паспорта будут безвозвратно удалены.\n\n"
-            f"Вы уверены?",
+            _DELETE_CONFIRM_TMPL.format(
+                name=passport.display_name, date=passport.created_at_formatted
+            ),
             reply_markup=keyboard,
-            parse_mode="Markdown"
+            parse_mode=_MD
         )
         
-    except Exception as e:
-        logger.error(f"Error in delete_passport_command: {e}")
-        await message.reply(
-            "❌ **Ошибка при удалении паспорта**\n\n"
-            "Попробуйте позже или обратитесь к администратору."
-        )
+    except Exception:
+        logger.exception("Error in delete_passport_command")
+        await _reply_md(message, _ERR_DELETE)
 
 
-@passport_router.callback_query(F.data.startswith("confirm_delete_passport:"))
 async def confirm_delete_passport_callback(callback: CallbackQuery):
     """Подтверждение удаления паспорта"""
+    await callback.answer("⏳")
+    _run_in_background(_delete_passport(callback))
+
+
+async def _delete_passport(callback: CallbackQuery):
+    """Удаление паспорта (выполняется в фоне, на callback уже ответили)"""
     try:
-        passport_id = int(callback.data.split(":")[1])
-        
+        # Префикс гарантирован фильтром диспетчера
+        ref = callback.data[len(_CONFIRM_DELETE_PREFIX):]
         passport_service = get_passport_db_service()
         
-        # Получаем паспорт для логирования
-        passport = await passport_service.get_passport_by_id(passport_id)
-        if not passport or passport.user_id != callback.from_user.id:
-            await callback.answer("❌ Паспорт не найден или не принадлежит вам", show_alert=True)
+        entry = await get_passport_cache().pop_delete_token(ref, callback.from_user.id)
+        if entry is not None:
+            # Токен выдан владельцу при /delete_passport - БД читать не нужно
+            if entry["uid"] != callback.from_user.id:
+                await _notify_after_answer(callback, "❌ Паспорт не найден или не принадлежит вам")
+                return
+            passport_id, display_name = entry["pid"], entry["name"]
+        elif ref.isdigit():
+            # Кэш отключен - в callback_data лежит ID паспорта
+            passport_id = int(ref)
+            passport = await passport_service.get_passport_by_id(passport_id)
+            if not passport or passport.user_id != callback.from_user.id:
+                await _notify_after_answer(callback, "❌ Паспорт не найден или не принадлежит вам")
+                return
+            display_name = passport.display_name
+        else:
+            await _notify_after_answer(callback, "⌛ Подтверждение устарело, повторите /delete_passport")
             return
         
         # Логируем удаление
@@ -979,31 +1162,70 @@ async def confirm_delete_passport_callback(callback: CallbackQuery):
             passport_id=passport_id,
             user_id=callback.from_user.id,
             username=callback.from_user.username,
-            operation_details={'display_name': passport.display_name}
+            operation_details={'display_name': display_name}
         )
-        await passport_service.log_operation(log_entry)
         
-        # Удаляем паспорт
-        success = await passport_service.delete_passport(passport_id)
+        # Логируем и удаляем паспорт одной транзакцией
+        success = await passport_service.delete_passport_with_log(passport_id, log_entry)
         
         if success:
             await callback.message.edit_text(
                 f"✅ **Паспорт удален**\n\n"
-                f"Паспорт **{passport.display_name}** был успешно удален.\n\n"
+                f"Паспорт **{display_name}** был успешно удален.\n\n"
                 f"Вы можете создать новый паспорт командой `/create_passport`",
-                parse_mode="Markdown"
+                parse_mode=_MD
             )
-            await callback.answer("✅ Паспорт удален")
         else:
-            await callback.answer("❌ Ошибка удаления паспорта", show_alert=True)
+            await _notify_after_answer(callback, "❌ Ошибка удаления паспорта")
             
-    except Exception as e:
-        logger.error(f"Error in confirm_delete_passport_callback: {e}")
-        await callback.answer("❌ Ошибка", show_alert=True)
+    except Exception:
+        logger.exception("Error in _delete_passport")
+        await _notify_after_answer(callback, "❌ Ошибка")
 
 
-@passport_router.callback_query(F.data == "cancel_delete_passport")
 async def cancel_delete_passport_callback(callback: CallbackQuery):
     """Отмена удаления паспорта"""
-    await callback.message.edit_text("🚫 **Удаление паспорта отменено.**")
-    await callback.answer("Отменено")
\ No newline at end of file
+    await _edit_and_answer(callback, _MSG_DELETE_CANCELLED, "Отменено")
+
+
+# Таблица маршрутизации callback'ов: префикс -> обработчик.
+# Ключ - это часть callback_data до первого ":" включительно (или вся строка, если ":" нет)
+_CB_PREFIX_MAP = {
+    "create_passport_clan:": create_passport_with_clan_callback,
+    "create_passport_cancel": create_passport_cancel_callback,
+    "passport_edit": passport_edit_callback,
+    "passport_settings": passport_settings_callback,
+    "settings_privacy": settings_privacy_callback,
+    "privacy_set:": privacy_set_callback,
+    "settings_toggle_stats": settings_toggle_stats_callback,
+    "settings_toggle_clan": settings_toggle_clan_callback,
+    "passport_refresh": passport_refresh_callback,
+    _CONFIRM_DELETE_PREFIX: confirm_delete_passport_callback,
+    "cancel_delete_passport": cancel_delete_passport_callback,
+}
+
+
+def _resolve_passport_callback(callback: CallbackQuery):
+    """
+    Фильтр: находит обработчик по префиксу callback_data одним поиском в словаре.
+    Неизвестные callback'и пропускаются дальше по цепочке роутеров.
+    """
+    prefix, sep, _ = (callback.data or "").partition(":")
+    handler = _CB_PREFIX_MAP.get(prefix + sep)
+    if handler is None:
+        return False
+    return {"passport_handler": handler}
+
+
+# Паспорт для обработчиков с @requires_passport загружается один раз в middleware
+passport_router.callback_query.middleware(PassportMiddleware())
+
+
+@passport_router.callback_query(_resolve_passport_callback)
+async def passport_callback_dispatcher(callback: CallbackQuery, passport_handler,
+                                       passport: Optional[PassportInfo] = None):
+    """Единая точка входа для всех callback'ов паспортов"""
+    if passport is not None:
+        await passport_handler(callback, passport)
+    else:
+        await passport_handler(callback)
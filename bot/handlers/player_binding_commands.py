@@ -6,281 +6,474 @@
 from aiogram import Router, F
 from aiogram.types import Message, CallbackQuery, InlineKeyboardMarkup, InlineKeyboardButton
 from aiogram.filters import Command
+import asyncio
+import contextlib
+import functools
+import html
 import logging
-import re
-from typing import Optional, List, Dict, Any
+import time
+from string import Template
+from typing import Optional, List, Dict, Any, Tuple
 
 from ..services.player_binding_service import PlayerBindingService
-from ..services.passport_database_service import PassportDatabaseService
-from ..services.passport_system_manager import PassportSystemManager
-from ..services.clan_database_service import ClanDatabaseService
-from ..services.coc_api_service import CoCAPIService
-from ..models.passport_models import PlayerBinding, PassportOperationLog
-from ..utils.permissions import check_admin_permission, get_user_permissions
-from ..utils.formatting import format_player_info, format_clan_info
+from ..services.passport_database_service import PassportDatabaseService, get_passport_db_service
+from ..services.clan_database_service import ClanDatabaseService, get_clan_db_service
+from ..services.passport_cache import get_passport_cache
+from ..services.permission_service import get_permission_service
+from ..middleware.callback_data_middleware import CallbackDataMiddleware
+from ..filters.fresh_callback import FreshCallback
+from ..models.clan_models import ApiError
 from ..utils.validators import validate_player_tag
+from ..utils.formatters import escape_markdown
+from ..utils.coc_cache import fetch_player
 
 router = Router()
+# callback_data разбирается один раз в middleware, обработчики получают cb_args
+router.callback_query.middleware(CallbackDataMiddleware())
 logger = logging.getLogger(__name__)
 
-# Инициализация сервисов
-player_binding_service = PlayerBindingService()
-passport_service = PassportDatabaseService()
-passport_manager = PassportSystemManager()
-clan_service = ClanDatabaseService()
-coc_api = CoCAPIService()
+# Сервисы создаются при первом обращении, а не при импорте модуля
+@functools.cache
+def _binding() -> PlayerBindingService:
+    """Сервис привязки игроков"""
+    return PlayerBindingService()
+
+
+@functools.cache
+def _passport() -> PassportDatabaseService:
+    """Сервис БД паспортов (общий с остальными модулями)"""
+    return get_passport_db_service()
+
+
+@functools.cache
+def _clan() -> ClanDatabaseService:
+    """Сервис БД кланов"""
+    return get_clan_db_service()
+
+# Ограничение одновременных операций с обращением к CoC API из обработчиков:
+# при всплеске нажатий они ждут очереди, а не создают шторм 429 и повторов
+_COC_SEM = asyncio.Semaphore(64)
+
+
+async def _coc(coro):
+    """Выполнение операции с обращением к CoC API под общим семафором"""
+    async with _COC_SEM:
+        return await coro
+
+
+async def _reply_error(event, text: str):
+    """Сообщение об ошибке: alert для callback, ответ для сообщения"""
+    if isinstance(event, CallbackQuery):
+        await event.answer(text, show_alert=True)
+    else:
+        await event.reply(text)
+
+
+def _first_arg(text: Optional[str]) -> str:
+    """Первый аргумент команды ("" если аргументов нет); остаток строки не разбивается"""
+    parts = (text or "").split(maxsplit=2)
+    return parts[1] if len(parts) > 1 else ""
+
+
+def _safe_handler(error_text: str):
+    """
+    Общая обработка исключений в обработчиках роутера
+    
+    Args:
+        error_text: Текст, который получит пользователь при ошибке
+    """
+    def decorator(handler):
+        @functools.wraps(handler)
+        async def wrapper(event, *args, **kwargs):
+            try:
+                return await handler(event, *args, **kwargs)
+            except Exception:
+                logger.exception("Ошибка в %s", handler.__name__)
+                await _reply_error(event, error_text)
+        return wrapper
+    return decorator
+
+
+async def _is_admin(user_id: int, chat_id: int) -> bool:
+    """Проверка прав администратора (кэширование - в PermissionService)"""
+    return await get_permission_service().is_chat_admin(user_id, chat_id)
+
+
+# Блокировки на администратора для сериализации нажатий кнопок верификации:
+# admin_id -> (блокировка, число ожидающих и удерживающих её обработчиков)
+_admin_locks: Dict[int, Tuple[asyncio.Lock, int]] = {}
+
+
+@contextlib.asynccontextmanager
+async def _admin_lock(admin_id: int):
+    """Блокировка администратора; удаляется, когда её больше никто не ждет"""
+    lock, users = _admin_locks.get(admin_id, (None, 0))
+    if lock is None:
+        lock = asyncio.Lock()
+    _admin_locks[admin_id] = (lock, users + 1)
+    try:
+        async with lock:
+            yield
+    finally:
+        lock, users = _admin_locks[admin_id]
+        if users > 1:
+            _admin_locks[admin_id] = (lock, users - 1)
+        else:
+            del _admin_locks[admin_id]
+
+
+# Эмодзи ролей в клане (в API старейшина - 'admin')
+_ROLE_EMOJI = {
+    'leader': '👑',
+    'coLeader': '🔥',
+    'admin': '⭐',
+    'elder': '⭐',
+    'member': '👤'
+}
+# Участников клана на одной странице выбора (2 колонки)
+_PICKER_PAGE_SIZE = 8
+
+# Нормализация тега за один проход: верхний регистр и O -> 0 (в тегах CoC нет буквы O)
+_TAG_TRANS = str.maketrans(
+    "abcdefghijklmnopqrstuvwxyzO",
+    "ABCDEFGHIJKLMN0PQRSTUVWXYZ0"
+)
+
+# Меню выбора способа привязки. callback_data не содержит user_id (обработчики
+# работают с callback.from_user.id), поэтому клавиатуры общие для всех
+# пользователей и создаются один раз при импорте
+_BINDING_METHOD_ROWS = (
+    (InlineKeyboardButton(text="🏰 Выбрать из клана", callback_data="select_from_clan"),),
+    (InlineKeyboardButton(text="🔍 Найти по тегу", callback_data="search_by_tag"),),
+    (InlineKeyboardButton(text="📝 Ввести тег вручную", callback_data="manual_tag_input"),),
+)
+_BINDING_MENU_KB = InlineKeyboardMarkup(inline_keyboard=[
+    *map(list, _BINDING_METHOD_ROWS),
+    [InlineKeyboardButton(text="❌ Отмена", callback_data="cancel_binding")]
+])
+_BINDING_MENU_TEXT = (
+    "🎮 **Выберите способ привязки игрока:**\n\n"
+    "🏰 **Из клана** - выберите игрока из участников клана\n"
+    "🔍 **По тегу** - найдите игрока по его тегу\n"
+    "📝 **Вручную** - введите тег игрока самостоятельно\n\n"
+    "💡 Рекомендуется выбирать из клана для автоматической верификации"
+)
+_SEARCH_BY_TAG_KB = InlineKeyboardMarkup(inline_keyboard=[
+    [InlineKeyboardButton(text="🔙 Назад к выбору", callback_data="back_to_binding_options")]
+])
+
+# Статические тексты ответов
+_MSG_NOT_YOUR_MENU = "❌ Это не ваше меню!"
+_MSG_NO_VERIFY_RIGHTS = "❌ У вас нет прав для верификации!"
+_MSG_SEARCH_BY_TAG = (
+    "🔍 **Поиск игрока по тегу**\n\n"
+    "Введите тег игрока в формате: `#2PP`\n"
+    "Или отправьте сообщение: `/bind_player #тег_игрока`\n\n"
+    "💡 Тег можно найти в профиле игрока в Clash of Clans"
+)
+_MSG_BAD_PLAYER_TAG = (
+    "❌ Неверный формат тега игрока!\n"
+    "Тег должен начинаться с # и содержать от 3 до 12 символов\n"
+    "Пример: #2PP"
+)
+_MSG_CLAN_MEMBERS_ERROR = (
+    "❌ Ошибка при получении списка участников клана\n"
+    "Попробуйте привязать игрока по тегу."
+)
+_MSG_BAD_USER_ID = (
+    "❌ Неверный формат ID пользователя!\n"
+    "Используйте числовой ID или ответьте на сообщение пользователя"
+)
+_MSG_STATS_EMPTY = (
+    "📊 **Статистика привязок не найдена**\n\n"
+    "В чате еще нет привязанных игроков."
+)
+
+# Шаблоны сообщений (MarkdownV2): статический текст экранирован заранее,
+# подставляемые значения экранируются через escape_markdown
+_TPL_BIND_SUCCESS = Template(
+    "🎉 *Игрок успешно привязан\\!*\n\n"
+    "🎮 *Игрок:* `$name`\n"
+    "🏷️ *Тег:* `$tag`\n"
+    "🏰 *Клан:* $clan\n"
+    "💎 *Кубки:* $trophies\n"
+    "📅 *Дата привязки:* $date\n\n"
+    "$status\n"
+    "💡 $reason"
+)
+_TPL_BINDING_STATS = Template(
+    "📊 *Статистика привязок игроков*\n\n"
+    "👥 *Всего привязок:* $total\n"
+    "✅ *Верифицировано:* $verified \\($rate%\\)\n"
+    "⏳ *Ожидает верификации:* $unverified\n\n"
+)
+# Строка списка последних привязок в статистике (MarkdownV2)
+_RECENT_BINDING_FMT = "   {emoji} {name} \\- {date}\n"
+_TPL_UNBIND_CONFIRM = Template(
+    "⚠️ *Подтверждение отвязки игрока*\n\n"
+    "🎮 *Игрок:* `$name` \\($tag\\)\n"
+    "🏰 *Клан:* $clan\n"
+    "📅 *Привязан:* $date\n\n"
+    "❗ *Внимание:* После отвязки вам потребуется заново привязать игрока "
+    "и пройти верификацию у администратора\\.\n\n"
+    "Вы уверены, что хотите отвязать игрока?"
+)
+
+# Подписи кнопок выбора участника: clan_tag -> (список участников, [(текст, тег)]).
+# Список участников берется из кэша составов, поэтому пока он тот же объект,
+# подписи пересчитывать не нужно
+_member_buttons_cache: Dict[str, tuple] = {}
+
+
+def _member_button_specs(clan_tag: str, members: List[Dict[str, Any]]) -> tuple:
+    """Подписи и теги кнопок выбора участника клана"""
+    cached = _member_buttons_cache.get(clan_tag)
+    if cached is not None and cached[0] is members:
+        return cached[1]
+    
+    specs = tuple(
+        (f"{_ROLE_EMOJI.get(member.get('role', 'member'), '👤')} {member['name']} "
+         f"(💎{member.get('trophies', 0)})", member['tag'])
+        for member in members
+    )
+    _member_buttons_cache[clan_tag] = (members, specs)
+    return specs
 
 
 @router.message(Command("bind_player"))
+@_safe_handler("❌ Произошла ошибка при привязке игрока. Попробуйте позже.")
 async def bind_player_command(message: Message):
     """
     Интерактивная команда для привязки игрока к паспорту
     Usage: /bind_player [player_tag]
     """
-    try:
-        # Проверяем наличие паспорта
-        passport = await passport_service.get_passport_by_user(
-            user_id=message.from_user.id,
-            chat_id=message.chat.id
+    # Проверяем наличие паспорта
+    passport = await _passport().get_passport_by_user(
+        user_id=message.from_user.id,
+        chat_id=message.chat.id
+    )
+    
+    if not passport:
+        await message.reply(
+            "❌ У вас нет паспорта!\n"
+            "Создайте его командой /create_passport"
         )
+        return
+    
+    # Проверяем, есть ли уже привязанный игрок
+    if passport.player_binding and passport.player_binding.player_tag:
+        current_player = passport.player_binding
+        keyboard = InlineKeyboardMarkup(inline_keyboard=[
+            [InlineKeyboardButton(
+                text="🔄 Сменить игрока", 
+                callback_data="change_player"
+            )],
+            [InlineKeyboardButton(
+                text="👀 Просмотреть привязку", 
+                callback_data="view_binding"
+            )],
+            [InlineKeyboardButton(
+                text="❌ Отвязать игрока", 
+                callback_data=f"unbind_player:{message.from_user.id}"
+            )]
+        ])
         
-        if not passport:
-            await message.reply(
-                "❌ У вас нет паспорта!\n"
-                "Создайте его командой /create_passport"
-            )
-            return
-        
-        # Проверяем, есть ли уже привязанный игрок
-        if passport.player_binding and passport.player_binding.player_tag:
-            current_player = passport.player_binding
-            keyboard = InlineKeyboardMarkup(inline_keyboard=[
-                [InlineKeyboardButton(
-                    text="🔄 Сменить игрока", 
-                    callback_data=f"change_player:{message.from_user.id}"
-                )],
-                [InlineKeyboardButton(
-                    text="👀 Просмотреть привязку", 
-                    callback_data=f"view_binding:{message.from_user.id}"
-                )],
-                [InlineKeyboardButton(
-                    text="❌ Отвязать игрока", 
-                    callback_data=f"unbind_player:{message.from_user.id}"
-                )]
-            ])
-            
-            status_emoji = "✅" if current_player.is_verified else "⏳"
-            await message.reply(
-                f"🎮 **Текущая привязка:**\n"
-                f"{status_emoji} Игрок: `{current_player.player_name}` ({current_player.player_tag})\n"
-                f"🏰 Клан: {current_player.player_clan_name or 'Не в клане'}\n"
-                f"📅 Привязан: {current_player.binding_date.strftime('%d.%m.%Y')}\n\n"
-                f"Выберите действие:",
-                reply_markup=keyboard,
-                parse_mode="Markdown"
-            )
-            return
-        
-        # Получаем аргументы команды
-        args = message.text.split()[1:] if len(message.text.split()) > 1 else []
-        
-        if args:
-            # Прямая привязка по тегу
-            player_tag = args[0].upper().replace('O', '0')
-            if not validate_player_tag(player_tag):
-                await message.reply(
-                    "❌ Неверный формат тега игрока!\n"
-                    "Тег должен начинаться с # и содержать 8-9 символов\n"
-                    "Пример: #2PP"
-                )
-                return
-            
-            await _bind_player_by_tag(message, player_tag)
-        else:
-            # Показываем интерактивное меню выбора
-            await _show_binding_options(message)
-            
-    except Exception as e:
-        logger.error(f"Ошибка в bind_player_command: {e}")
+        status_emoji = "✅" if current_player.is_verified else "⏳"
         await message.reply(
-            "❌ Произошла ошибка при привязке игрока. Попробуйте позже."
+            f"🎮 **Текущая привязка:**\n"
+            f"{status_emoji} Игрок: `{current_player.player_name}` ({current_player.player_tag})\n"
+            f"🏰 Клан: {current_player.player_clan_name or 'Не в клане'}\n"
+            f"📅 Привязан: {current_player.binding_date.strftime('%d.%m.%Y')}\n\n"
+            f"Выберите действие:",
+            reply_markup=keyboard,
+            parse_mode="Markdown"
         )
+        return
+    
+    # Получаем аргументы команды
+    arg = _first_arg(message.text)
+    
+    if arg:
+        # Прямая привязка по тегу
+        player_tag = arg.translate(_TAG_TRANS)
+        if not validate_player_tag(player_tag):
+            await message.reply(_MSG_BAD_PLAYER_TAG)
+            return
+        
+        await _bind_player_by_tag(message, player_tag)
+    else:
+        # Показываем интерактивное меню выбора
+        await _show_binding_options(message)
 
 
 async def _show_binding_options(message: Message):
     """Показать опции привязки игрока"""
-    keyboard = InlineKeyboardMarkup(inline_keyboard=[
-        [InlineKeyboardButton(
-            text="🏰 Выбрать из клана", 
-            callback_data=f"select_from_clan:{message.from_user.id}"
-        )],
-        [InlineKeyboardButton(
-            text="🔍 Найти по тегу", 
-            callback_data=f"search_by_tag:{message.from_user.id}"
-        )],
-        [InlineKeyboardButton(
-            text="📝 Ввести тег вручную", 
-            callback_data=f"manual_tag_input:{message.from_user.id}"
-        )],
-        [InlineKeyboardButton(
-            text="❌ Отмена", 
-            callback_data=f"cancel_binding:{message.from_user.id}"
-        )]
-    ])
-    
     await message.reply(
-        "🎮 **Выберите способ привязки игрока:**\n\n"
-        "🏰 **Из клана** - выберите игрока из участников клана\n"
-        "🔍 **По тегу** - найдите игрока по его тегу\n"
-        "📝 **Вручную** - введите тег игрока самостоятельно\n\n"
-        "💡 Рекомендуется выбирать из клана для автоматической верификации",
-        reply_markup=keyboard,
+        _BINDING_MENU_TEXT,
+        reply_markup=_BINDING_MENU_KB,
         parse_mode="Markdown"
     )
 
 
-@router.callback_query(F.data.startswith("select_from_clan:"))
-async def select_from_clan_callback(callback: CallbackQuery):
-    """Выбор игрока из списка участников клана"""
-    try:
-        user_id = int(callback.data.split(":")[1])
-        
-        if callback.from_user.id != user_id:
-            await callback.answer("❌ Это не ваше меню!", show_alert=True)
+@router.callback_query((F.data == "select_from_clan") | F.data.startswith("select_from_clan:"))
+@_safe_handler("❌ Произошла ошибка")
+async def select_from_clan_callback(callback: CallbackQuery, cb_args: Tuple[str, ...]):
+    """Выбор игрока из списка участников клана (select_from_clan[:page])"""
+    user_id = callback.from_user.id
+    page = int(cb_args[0]) if cb_args else 0
+    
+    # Получаем паспорт пользователя
+    passport = await _passport().get_passport_by_user(
+        user_id=user_id,
+        chat_id=callback.message.chat.id
+    )
+    
+    if not passport or not passport.preferred_clan_id:
+        await callback.message.edit_text(
+            "❌ У вас не выбран предпочитаемый клан!\n"
+            "Сначала установите клан в настройках паспорта.",
+            reply_markup=InlineKeyboardMarkup(inline_keyboard=[
+                [InlineKeyboardButton(
+                    text="⚙️ Настроить клан", 
+                    callback_data=f"edit_passport_clan:{user_id}"
+                )]
+            ])
+        )
+        return
+    
+    # Тег клана сохранен в паспорте, поэтому состав клана можно запрашивать
+    # параллельно с чтением клана из БД
+    roster = None
+    if passport.preferred_clan_tag:
+        try:
+            async with asyncio.TaskGroup() as tg:
+                clan_task = tg.create_task(_clan().get_clan_by_id(passport.preferred_clan_id))
+                roster_task = tg.create_task(
+                    _coc(_binding().get_clan_members_for_binding(passport.preferred_clan_tag))
+                )
+        except ExceptionGroup as eg:
+            # TaskGroup оборачивает ошибки задач в ExceptionGroup
+            logger.error("Ошибка получения участников клана: %s", eg.exceptions[0])
+            await callback.message.edit_text(_MSG_CLAN_MEMBERS_ERROR)
             return
-        
-        # Получаем паспорт пользователя
-        passport = await passport_service.get_passport_by_user(
-            user_id=user_id,
-            chat_id=callback.message.chat.id
+        clan = clan_task.result()
+        roster = roster_task.result()
+    else:
+        clan = await _clan().get_clan_by_id(passport.preferred_clan_id)
+    
+    if not clan:
+        await callback.message.edit_text(
+            "❌ Клан не найден в базе данных!"
         )
-        
-        if not passport or not passport.preferred_clan_id:
-            await callback.message.edit_text(
-                "❌ У вас не выбран предпочитаемый клан!\n"
-                "Сначала установите клан в настройках паспорта.",
-                reply_markup=InlineKeyboardMarkup(inline_keyboard=[
-                    [InlineKeyboardButton(
-                        text="⚙️ Настроить клан", 
-                        callback_data=f"edit_passport_clan:{user_id}"
-                    )]
-                ])
+        return
+    
+    # Получаем участников клана через CoC API (если не получили выше или тег в паспорте устарел)
+    try:
+        if roster is None or passport.preferred_clan_tag != clan.clan_tag:
+            roster = await _coc(
+                _binding().get_clan_members_for_binding(clan.clan_tag)
             )
-            return
+        clan_members = roster.get('members') if roster.get('success') else None
         
-        # Получаем информацию о клане
-        clan = await clan_service.get_clan_by_id(passport.preferred_clan_id)
-        if not clan:
+        if not clan_members:
             await callback.message.edit_text(
-                "❌ Клан не найден в базе данных!"
+                f"❌ Не удалось получить список участников клана {clan.clan_name}\n"
+                "Попробуйте привязать игрока по тегу."
             )
             return
         
-        # Получаем участников клана через CoC API
-        try:
-            clan_members = await player_binding_service.get_clan_members_for_binding(clan.clan_tag)
-            
-            if not clan_members:
-                await callback.message.edit_text(
-                    f"❌ Не удалось получить список участников клана {clan.clan_name}\n"
-                    "Попробуйте привязать игрока по тегу."
-                )
-                return
-            
-            # Создаем клавиатуру с участниками (по 1 в ряду для лучшей читаемости)
-            keyboard_buttons = []
-            
-            for member in clan_members[:20]:  # Ограничиваем 20 участниками
-                role_emoji = {
-                    'leader': '👑',
-                    'coLeader': '🔥', 
-                    'elder': '⭐',
-                    'member': '👤'
-                }.get(member.get('role', 'member'), '👤')
-                
-                keyboard_buttons.append([InlineKeyboardButton(
-                    text=f"{role_emoji} {member['name']} (💎{member.get('trophies', 0)})",
-                    callback_data=f"bind_clan_member:{user_id}:{member['tag']}"
-                )])
-            
-            # Добавляем кнопки управления
-            keyboard_buttons.extend([
-                [InlineKeyboardButton(
-                    text="🔍 Поиск по имени", 
-                    callback_data=f"search_clan_member:{user_id}:{clan.clan_tag}"
-                )],
-                [InlineKeyboardButton(
-                    text="🔙 Назад", 
-                    callback_data=f"select_from_clan_back:{user_id}"
-                )]
-            ])
-            
-            keyboard = InlineKeyboardMarkup(inline_keyboard=keyboard_buttons)
-            
-            await callback.message.edit_text(
-                f"🏰 **Участники клана {clan.clan_name}:**\n"
-                f"📊 Всего: {len(clan_members)} игроков\n\n"
-                f"Выберите игрока для привязки:",
-                reply_markup=keyboard,
-                parse_mode="Markdown"
-            )
-            
-        except Exception as e:
-            logger.error(f"Ошибка получения участников клана: {e}")
-            await callback.message.edit_text(
-                "❌ Ошибка при получении списка участников клана\n"
-                "Попробуйте привязать игрока по тегу."
-            )
-            
+        # Подписи кнопок считаются один раз на состав клана; состав лежит
+        # в кэше сервиса, поэтому листание страниц не обращается к CoC API
+        specs = _member_button_specs(clan.clan_tag, clan_members)
+        pages = (len(specs) + _PICKER_PAGE_SIZE - 1) // _PICKER_PAGE_SIZE
+        page = min(max(page, 0), pages - 1)
+        page_specs = specs[page * _PICKER_PAGE_SIZE:(page + 1) * _PICKER_PAGE_SIZE]
+        
+        # Участники текущей страницы по 2 в ряду
+        member_buttons = [
+            InlineKeyboardButton(text=text, callback_data=f"bind_clan_member:{tag}")
+            for text, tag in page_specs
+        ]
+        keyboard_buttons = [member_buttons[i:i + 2] for i in range(0, len(member_buttons), 2)]
+        
+        # Навигация по страницам
+        nav_buttons = []
+        if page > 0:
+            nav_buttons.append(InlineKeyboardButton(
+                text="◀ Назад",
+                callback_data=f"select_from_clan:{page - 1}"
+            ))
+        if page < pages - 1:
+            nav_buttons.append(InlineKeyboardButton(
+                text="Вперед ▶",
+                callback_data=f"select_from_clan:{page + 1}"
+            ))
+        if nav_buttons:
+            keyboard_buttons.append(nav_buttons)
+        
+        # Добавляем кнопки управления
+        keyboard_buttons.extend([
+            [InlineKeyboardButton(
+                text="🔍 Поиск по имени", 
+                callback_data=f"search_clan_member:{user_id}:{clan.clan_tag}"
+            )],
+            [InlineKeyboardButton(
+                text="🔙 Назад", 
+                callback_data="back_to_binding_options"
+            )]
+        ])
+        
+        keyboard = InlineKeyboardMarkup(inline_keyboard=keyboard_buttons)
+        
+        await callback.message.edit_text(
+            f"🏰 **Участники клана {clan.clan_name}:**\n"
+            f"📊 Всего: {len(clan_members)} игроков\n"
+            f"📄 Страница {page + 1} из {pages}\n\n"
+            f"Выберите игрока для привязки:",
+            reply_markup=keyboard,
+            parse_mode="Markdown"
+        )
+        
     except Exception as e:
-        logger.error(f"Ошибка в select_from_clan_callback: {e}")
-        await callback.answer("❌ Произошла ошибка", show_alert=True)
+        logger.error("Ошибка получения участников клана: %s", e)
+        await callback.message.edit_text(_MSG_CLAN_MEMBERS_ERROR)
 
 
 @router.callback_query(F.data.startswith("bind_clan_member:"))
-async def bind_clan_member_callback(callback: CallbackQuery):
+@_safe_handler("❌ Произошла ошибка при привязке")
+async def bind_clan_member_callback(callback: CallbackQuery, cb_args: Tuple[str, ...]):
     """Привязка выбранного участника клана"""
-    try:
-        _, user_id_str, player_tag = callback.data.split(":", 2)
-        user_id = int(user_id_str)
-        
-        if callback.from_user.id != user_id:
-            await callback.answer("❌ Это не ваше меню!", show_alert=True)
-            return
-        
-        # Привязываем игрока
-        await _bind_player_by_tag(callback.message, player_tag, edit_message=True)
-        
-    except Exception as e:
-        logger.error(f"Ошибка в bind_clan_member_callback: {e}")
-        await callback.answer("❌ Произошла ошибка при привязке", show_alert=True)
+    # Тег - последний аргумент (в старых кнопках перед ним стоял user_id)
+    player_tag = cb_args[-1]
+    
+    # Привязываем игрока к нажавшему пользователю
+    await _bind_player_by_tag(callback, player_tag, edit_message=True)
 
 
 async def _bind_player_by_tag(message_or_callback, player_tag: str, edit_message: bool = False):
     """Привязка игрока по тегу"""
     try:
-        if hasattr(message_or_callback, 'from_user'):
+        if isinstance(message_or_callback, CallbackQuery):
+            user_id = message_or_callback.from_user.id
+            chat_id = message_or_callback.message.chat.id
+            send_func = message_or_callback.message.edit_text if edit_message else message_or_callback.message.reply
+        else:
             # Это Message
             user_id = message_or_callback.from_user.id
             chat_id = message_or_callback.chat.id
             send_func = message_or_callback.reply
-        else:
-            # Это CallbackQuery
-            user_id = message_or_callback.from_user.id
-            chat_id = message_or_callback.message.chat.id
-            send_func = message_or_callback.message.edit_text if edit_message else message_or_callback.message.reply
         
         # Нормализуем тег
         if not player_tag.startswith('#'):
             player_tag = f"#{player_tag}"
         
         # Привязываем игрока через сервис
-        result = await player_binding_service.bind_player_to_passport(
+        result = await _coc(_binding().bind_player_to_passport(
             user_id=user_id,
             chat_id=chat_id,
             player_tag=player_tag,
             requester_id=user_id
-        )
+        ))
         
         if result['success']:
             binding = result['binding']
@@ -299,27 +492,26 @@ async def _bind_player_by_tag(message_or_callback, player_tag: str, edit_message
             
             # Определяем статус верификации
             if binding.is_verified:
-                status_text = "✅ **Автоматически верифицирован**"
+                status_text = "✅ *Автоматически верифицирован*"
                 status_reason = "Игрок состоит в зарегистрированном клане"
             else:
-                status_text = "⏳ **Ожидает верификации администратором**"
+                status_text = "⏳ *Ожидает верификации администратором*"
                 status_reason = "Игрок не состоит в зарегистрированном клане или клан не найден"
             
-            success_message = (
-                f"🎉 **Игрок успешно привязан!**\n\n"
-                f"🎮 **Игрок:** `{binding.player_name}`\n"
-                f"🏷️ **Тег:** `{binding.player_tag}`\n"
-                f"🏰 **Клан:** {binding.player_clan_name or 'Не в клане'}\n"
-                f"💎 **Кубки:** {binding.player_trophies:,}\n"
-                f"📅 **Дата привязки:** {binding.binding_date.strftime('%d.%m.%Y %H:%M')}\n\n"
-                f"{status_text}\n"
-                f"💡 {status_reason}"
+            success_message = _TPL_BIND_SUCCESS.substitute(
+                name=escape_markdown(binding.player_name),
+                tag=escape_markdown(binding.player_tag),
+                clan=escape_markdown(binding.player_clan_name or 'Не в клане'),
+                trophies=f"{binding.player_trophies:,}",
+                date=escape_markdown(binding.binding_date.strftime('%d.%m.%Y %H:%M')),
+                status=status_text,
+                reason=status_reason
             )
             
             await send_func(
                 success_message,
                 reply_markup=keyboard,
-                parse_mode="Markdown"
+                parse_mode="MarkdownV2"
             )
             
         else:
@@ -327,7 +519,7 @@ async def _bind_player_by_tag(message_or_callback, player_tag: str, edit_message
             await send_func(error_message, parse_mode="Markdown")
             
     except Exception as e:
-        logger.error(f"Ошибка в _bind_player_by_tag: {e}")
+        logger.error("Ошибка в _bind_player_by_tag: %s", e)
         error_message = "❌ Произошла ошибка при привязке игрока"
         if hasattr(message_or_callback, 'from_user'):
             await message_or_callback.reply(error_message)
@@ -335,204 +527,189 @@ async def _bind_player_by_tag(message_or_callback, player_tag: str, edit_message
             await message_or_callback.message.reply(error_message)
 
 
-@router.callback_query(F.data.startswith("search_by_tag:"))
+@router.callback_query(F.data == "search_by_tag")
+@_safe_handler("❌ Произошла ошибка")
 async def search_by_tag_callback(callback: CallbackQuery):
     """Поиск игрока по тегу"""
-    try:
-        user_id = int(callback.data.split(":")[1])
-        
-        if callback.from_user.id != user_id:
-            await callback.answer("❌ Это не ваше меню!", show_alert=True)
-            return
-        
-        await callback.message.edit_text(
-            "🔍 **Поиск игрока по тегу**\n\n"
-            "Введите тег игрока в формате: `#2PP`\n"
-            "Или отправьте сообщение: `/bind_player #тег_игрока`\n\n"
-            "💡 Тег можно найти в профиле игрока в Clash of Clans",
-            reply_markup=InlineKeyboardMarkup(inline_keyboard=[
-                [InlineKeyboardButton(
-                    text="🔙 Назад к выбору", 
-                    callback_data=f"back_to_binding_options:{user_id}"
-                )]
-            ]),
-            parse_mode="Markdown"
-        )
-        
-    except Exception as e:
-        logger.error(f"Ошибка в search_by_tag_callback: {e}")
-        await callback.answer("❌ Произошла ошибка", show_alert=True)
+    await callback.message.edit_text(
+        _MSG_SEARCH_BY_TAG,
+        reply_markup=_SEARCH_BY_TAG_KB,
+        parse_mode="Markdown"
+    )
 
 
 @router.message(Command("verify_player"))
+@_safe_handler("❌ Произошла ошибка при верификации. Попробуйте позже.")
 async def verify_player_command(message: Message):
     """
     Команда для верификации привязанного игрока (только для администраторов)
     Usage: /verify_player [@user|user_id]
     """
-    try:
-        # Проверяем права администратора
-        is_admin = await check_admin_permission(
-            user_id=message.from_user.id,
-            chat_id=message.chat.id
+    # Проверяем права администратора
+    is_admin = await _is_admin(message.from_user.id, message.chat.id)
+    
+    if not is_admin:
+        await message.reply(
+            "❌ Эта команда доступна только администраторам чата!"
         )
-        
-        if not is_admin:
-            await message.reply(
-                "❌ Эта команда доступна только администраторам чата!"
-            )
-            return
-        
-        # Получаем аргументы команды
-        args = message.text.split()[1:] if len(message.text.split()) > 1 else []
-        target_user_id = None
-        
-        if args:
-            # Парсим упоминание или ID пользователя
-            if message.reply_to_message:
-                target_user_id = message.reply_to_message.from_user.id
-            elif args[0].startswith('@'):
-                # Обработка упоминания (нужно найти пользователя по username)
-                await message.reply(
-                    "❌ Упоминания пользователей не поддерживаются\n"
-                    "Используйте ID пользователя или ответьте на сообщение"
-                )
-                return
-            else:
-                try:
-                    target_user_id = int(args[0])
-                except ValueError:
-                    await message.reply(
-                        "❌ Неверный формат ID пользователя!\n"
-                        "Используйте числовой ID или ответьте на сообщение пользователя"
-                    )
-                    return
-        elif message.reply_to_message:
+        return
+    
+    # Получаем аргументы команды
+    arg = _first_arg(message.text)
+    target_user_id = None
+    
+    if arg:
+        # Парсим упоминание или ID пользователя
+        if message.reply_to_message:
             target_user_id = message.reply_to_message.from_user.id
-        else:
-            # Показываем список неверифицированных привязок
-            await _show_unverified_bindings(message)
-            return
-        
-        # Получаем паспорт пользователя
-        passport = await passport_service.get_passport_by_user(
-            user_id=target_user_id,
-            chat_id=message.chat.id
-        )
-        
-        if not passport or not passport.player_binding:
+        elif arg.startswith('@'):
+            # Обработка упоминания (нужно найти пользователя по username)
             await message.reply(
-                "❌ У указанного пользователя нет привязанного игрока!"
+                "❌ Упоминания пользователей не поддерживаются\n"
+                "Используйте ID пользователя или ответьте на сообщение"
             )
             return
-        
-        # Верифицируем привязку
-        result = await player_binding_service.verify_player_binding(
-            user_id=target_user_id,
-            chat_id=message.chat.id,
-            admin_id=message.from_user.id,
-            admin_username=message.from_user.username
-        )
-        
-        if result['success']:
-            binding = passport.player_binding
-            await message.reply(
-                f"✅ **Привязка верифицирована!**\n\n"
-                f"👤 **Пользователь:** {passport.display_name}\n"
-                f"🎮 **Игрок:** `{binding.player_name}` ({binding.player_tag})\n"
-                f"🏰 **Клан:** {binding.player_clan_name or 'Не в клане'}\n"
-                f"👨‍💼 **Верифицировал:** {message.from_user.full_name}",
-                parse_mode="Markdown"
-            )
         else:
-            await message.reply(f"❌ **Ошибка верификации:** {result['error']}")
-            
-    except Exception as e:
-        logger.error(f"Ошибка в verify_player_command: {e}")
+            try:
+                target_user_id = int(arg)
+            except ValueError:
+                await message.reply(_MSG_BAD_USER_ID)
+                return
+    elif message.reply_to_message:
+        target_user_id = message.reply_to_message.from_user.id
+    else:
+        # Показываем список неверифицированных привязок
+        await _show_unverified_bindings(message)
+        return
+    
+    # Получаем паспорт пользователя
+    passport = await _passport().get_passport_by_user(
+        user_id=target_user_id,
+        chat_id=message.chat.id
+    )
+    
+    if not passport or not passport.player_binding:
+        await message.reply(
+            "❌ У указанного пользователя нет привязанного игрока!"
+        )
+        return
+    
+    # Верифицируем привязку
+    result = await _binding().verify_player_binding(
+        user_id=target_user_id,
+        chat_id=message.chat.id,
+        admin_id=message.from_user.id,
+        admin_username=message.from_user.username
+    )
+    
+    if result['success']:
+        binding = passport.player_binding
         await message.reply(
-            "❌ Произошла ошибка при верификации. Попробуйте позже."
+            f"✅ **Привязка верифицирована!**\n\n"
+            f"👤 **Пользователь:** {passport.display_name}\n"
+            f"🎮 **Игрок:** `{binding.player_name}` ({binding.player_tag})\n"
+            f"🏰 **Клан:** {binding.player_clan_name or 'Не в клане'}\n"
+            f"👨‍💼 **Верифицировал:** {message.from_user.full_name}",
+            parse_mode="Markdown"
         )
+    else:
+        await message.reply(f"❌ **Ошибка верификации:** {result['error']}")
+
+
+_MSG_ALL_VERIFIED = (
+    "✅ **Все привязки в чате верифицированы!**\n\n"
+    "Нет ожидающих верификации привязок игроков."
+)
+
+
+def _render_unverified(unverified: List, total: int,
+                       admin_id: int) -> Tuple[str, Optional[InlineKeyboardMarkup]]:
+    """
+    Текст и клавиатура списка неверифицированных привязок
+    
+    Args:
+        unverified: Паспорта с неверифицированной привязкой
+        total: Общее количество таких паспортов в чате
+        admin_id: ID администратора, для которого строится меню
+        
+    Returns:
+        Tuple[str, Optional[InlineKeyboardMarkup]]: Текст и клавиатура (None, если список пуст)
+    """
+    if not unverified:
+        return _MSG_ALL_VERIFIED, None
+    
+    keyboard_buttons = [
+        [InlineKeyboardButton(
+            text=f"✅ {passport.display_name} → {passport.player_binding.player_name}",
+            callback_data=f"vb:{passport.user_id}"
+        )]
+        for passport in unverified
+    ]
+    keyboard_buttons.append([InlineKeyboardButton(
+        text="🔄 Обновить список",
+        callback_data=f"refresh_unverified:{admin_id}"
+    )])
+    
+    text = (
+        f"⏳ **Неверифицированные привязки ({total}):**\n\n"
+        f"Нажмите на кнопку с именем пользователя для верификации его привязки:"
+    )
+    return text, InlineKeyboardMarkup(inline_keyboard=keyboard_buttons)
+
+
+# Версия паспортов чата, по которой построено сообщение со списком:
+# (chat_id, message_id) -> версия из PassportCache.chat_version
+_RENDERED_MAX_SIZE = 10_000
+_rendered_versions: Dict[Tuple[int, int], int] = {}
+
+
+def _remember_rendered(chat_id: int, message_id: int, version: int):
+    """Запомнить версию показанного списка; при переполнении вытесняется самая старая запись"""
+    key = (chat_id, message_id)
+    _rendered_versions.pop(key, None)
+    if len(_rendered_versions) >= _RENDERED_MAX_SIZE:
+        _rendered_versions.pop(next(iter(_rendered_versions)))
+    _rendered_versions[key] = version
 
 
 async def _show_unverified_bindings(message: Message):
     """Показать список неверифицированных привязок в чате"""
     try:
-        # Получаем все паспорта чата
-        passports = await passport_service.get_chat_passports(
-            chat_id=message.chat.id,
-            include_stats=True
-        )
+        # Версию берем до запроса: изменение во время запроса не будет пропущено
+        version = get_passport_cache().chat_version(message.chat.id)
+        # Неверифицированные привязки (фильтр и лимит - на стороне БД)
+        unverified, total = await _passport().get_unverified_bindings(message.chat.id, limit=10)
         
-        # Фильтруем неверифицированные привязки
-        unverified = [
-            p for p in passports 
-            if p.player_binding and not p.player_binding.is_verified
-        ]
-        
-        if not unverified:
-            await message.reply(
-                "✅ **Все привязки в чате верифицированы!**\n\n"
-                "Нет ожидающих верификации привязок игроков."
-            )
-            return
-        
-        # Создаем клавиатуру с неверифицированными привязками
-        keyboard_buttons = []
-        
-        for passport in unverified[:10]:  # Ограничиваем 10 записями
-            binding = passport.player_binding
-            keyboard_buttons.append([InlineKeyboardButton(
-                text=f"✅ {passport.display_name} → {binding.player_name}",
-                callback_data=f"verify_binding:{passport.user_id}:{message.from_user.id}"
-            )])
-        
-        # Добавляем кнопку обновления
-        keyboard_buttons.append([InlineKeyboardButton(
-            text="🔄 Обновить список",
-            callback_data=f"refresh_unverified:{message.from_user.id}"
-        )])
-        
-        keyboard = InlineKeyboardMarkup(inline_keyboard=keyboard_buttons)
-        
-        await message.reply(
-            f"⏳ **Неверифицированные привязки ({len(unverified)}):**\n\n"
-            f"Нажмите на кнопку с именем пользователя для верификации его привязки:",
-            reply_markup=keyboard,
-            parse_mode="Markdown"
-        )
+        text, keyboard = _render_unverified(unverified, total, message.from_user.id)
+        sent = await message.reply(text, reply_markup=keyboard, parse_mode="Markdown")
+        _remember_rendered(sent.chat.id, sent.message_id, version)
         
     except Exception as e:
-        logger.error(f"Ошибка в _show_unverified_bindings: {e}")
+        logger.error("Ошибка в _show_unverified_bindings: %s", e)
         await message.reply("❌ Ошибка при получении списка привязок")
 
 
-@router.callback_query(F.data.startswith("verify_binding:"))
-async def verify_binding_callback(callback: CallbackQuery):
-    """Верификация привязки через callback"""
-    try:
-        _, target_user_id_str, admin_id_str = callback.data.split(":")
-        target_user_id = int(target_user_id_str)
-        admin_id = int(admin_id_str)
-        
-        if callback.from_user.id != admin_id:
-            await callback.answer("❌ Это не ваше меню!", show_alert=True)
-            return
-        
-        # Проверяем права администратора
-        is_admin = await check_admin_permission(
-            user_id=admin_id,
-            chat_id=callback.message.chat.id
-        )
-        
-        if not is_admin:
-            await callback.answer(
-                "❌ У вас нет прав для верификации!", 
-                show_alert=True
-            )
-            return
-        
+# "verify_binding:" - формат кнопок в сообщениях, отправленных до перехода на "vb:"
+@router.callback_query(F.data.startswith(("vb:", "verify_binding:")))
+@_safe_handler("❌ Произошла ошибка")
+async def verify_binding_callback(callback: CallbackQuery, cb_args: Tuple[str, ...]):
+    """Верификация привязки через callback (vb:{user_id})"""
+    target_user_id = int(cb_args[0])
+    # Верифицирует тот, кто нажал кнопку; права проверяются ниже
+    admin_id = callback.from_user.id
+    
+    # Проверяем права администратора
+    is_admin = await _is_admin(admin_id, callback.message.chat.id)
+    
+    if not is_admin:
+        await callback.answer(_MSG_NO_VERIFY_RIGHTS, show_alert=True)
+        return
+    
+    # Нажатия одного администратора выполняются по очереди: быстрые клики
+    # не запускают параллельные верификации и одинаковые обновления списка
+    async with _admin_lock(admin_id):
         # Верифицируем привязку
-        result = await player_binding_service.verify_player_binding(
+        result = await _binding().verify_player_binding(
             user_id=target_user_id,
             chat_id=callback.message.chat.id,
             admin_id=admin_id,
@@ -545,233 +722,214 @@ async def verify_binding_callback(callback: CallbackQuery):
             await _refresh_unverified_list(callback)
         else:
             await callback.answer(f"❌ Ошибка: {result['error']}", show_alert=True)
-            
-    except Exception as e:
-        logger.error(f"Ошибка в verify_binding_callback: {e}")
-        await callback.answer("❌ Произошла ошибка", show_alert=True)
 
 
 async def _refresh_unverified_list(callback: CallbackQuery):
     """Обновить список неверифицированных привязок"""
     try:
-        # Получаем все паспорта чата
-        passports = await passport_service.get_chat_passports(
-            chat_id=callback.message.chat.id,
-            include_stats=True
-        )
+        chat_id = callback.message.chat.id
+        version = get_passport_cache().chat_version(chat_id)
+        # Неверифицированные привязки (фильтр и лимит - на стороне БД)
+        unverified, total = await _passport().get_unverified_bindings(chat_id, limit=10)
         
-        # Фильтруем неверифицированные привязки
-        unverified = [
-            p for p in passports 
-            if p.player_binding and not p.player_binding.is_verified
-        ]
-        
-        if not unverified:
-            await callback.message.edit_text(
-                "✅ **Все привязки в чате верифицированы!**\n\n"
-                "Нет ожидающих верификации привязок игроков."
-            )
-            return
-        
-        # Создаем обновленную клавиатуру
-        keyboard_buttons = []
-        
-        for passport in unverified[:10]:
-            binding = passport.player_binding
-            keyboard_buttons.append([InlineKeyboardButton(
-                text=f"✅ {passport.display_name} → {binding.player_name}",
-                callback_data=f"verify_binding:{passport.user_id}:{callback.from_user.id}"
-            )])
-        
-        keyboard_buttons.append([InlineKeyboardButton(
-            text="🔄 Обновить список",
-            callback_data=f"refresh_unverified:{callback.from_user.id}"
-        )])
-        
-        keyboard = InlineKeyboardMarkup(inline_keyboard=keyboard_buttons)
-        
-        await callback.message.edit_text(
-            f"⏳ **Неверифицированные привязки ({len(unverified)}):**\n\n"
-            f"Нажмите на кнопку с именем пользователя для верификации его привязки:",
-            reply_markup=keyboard,
-            parse_mode="Markdown"
-        )
+        text, keyboard = _render_unverified(unverified, total, callback.from_user.id)
+        await callback.message.edit_text(text, reply_markup=keyboard, parse_mode="Markdown")
+        _remember_rendered(chat_id, callback.message.message_id, version)
         
     except Exception as e:
-        logger.error(f"Ошибка в _refresh_unverified_list: {e}")
+        logger.error("Ошибка в _refresh_unverified_list: %s", e)
+
+
+# Защита от частых нажатий "🔄 Обновить список": (chat_id, user_id) -> момент последнего обновления
+_REFRESH_DEBOUNCE = 1.0
+_REFRESH_MAX_SIZE = 10_000
+_last_refresh: Dict[Tuple[int, int], float] = {}
+
+
+@router.callback_query(F.data.startswith("refresh_unverified:"), FreshCallback())
+@_safe_handler("❌ Произошла ошибка")
+async def refresh_unverified_callback(callback: CallbackQuery):
+    """Обновление списка неверифицированных привязок (не чаще раза в секунду)"""
+    key = (callback.message.chat.id, callback.from_user.id)
+    now = time.monotonic()
+    if now - _last_refresh.get(key, 0.0) < _REFRESH_DEBOUNCE:
+        await callback.answer("⏳ Подождите")
+        return
+    
+    if not await _is_admin(callback.from_user.id, callback.message.chat.id):
+        await callback.answer(_MSG_NO_VERIFY_RIGHTS, show_alert=True)
+        return
+    
+    # Переставляем ключ в конец, чтобы при переполнении вытеснялась самая старая запись
+    _last_refresh.pop(key, None)
+    if len(_last_refresh) >= _REFRESH_MAX_SIZE:
+        _last_refresh.pop(next(iter(_last_refresh)))
+    _last_refresh[key] = now
+    
+    # Паспорта чата не менялись с момента построения списка - сообщение
+    # актуально, а повторный edit_text Telegram все равно отклонил бы
+    chat_id = callback.message.chat.id
+    rendered = _rendered_versions.get((chat_id, callback.message.message_id))
+    if rendered is not None and rendered == get_passport_cache().chat_version(chat_id):
+        await callback.answer("Без изменений")
+        return
+    
+    await _refresh_unverified_list(callback)
+    await callback.answer()
 
 
 @router.message(Command("unbind_player"))
+@_safe_handler("❌ Произошла ошибка при отвязке игрока. Попробуйте позже.")
 async def unbind_player_command(message: Message):
     """
     Команда для отвязки игрока от паспорта
     Usage: /unbind_player
     """
-    try:
-        # Получаем паспорт пользователя
-        passport = await passport_service.get_passport_by_user(
-            user_id=message.from_user.id,
-            chat_id=message.chat.id
-        )
-        
-        if not passport or not passport.player_binding:
-            await message.reply(
-                "❌ У вас нет привязанного игрока!"
-            )
-            return
-        
-        binding = passport.player_binding
-        
-        # Создаем клавиатуру подтверждения
-        keyboard = InlineKeyboardMarkup(inline_keyboard=[
-            [InlineKeyboardButton(
-                text="✅ Да, отвязать", 
-                callback_data=f"confirm_unbind:{message.from_user.id}"
-            )],
-            [InlineKeyboardButton(
-                text="❌ Отмена", 
-                callback_data=f"cancel_unbind:{message.from_user.id}"
-            )]
-        ])
-        
-        await message.reply(
-            f"⚠️ **Подтверждение отвязки игрока**\n\n"
-            f"🎮 **Игрок:** `{binding.player_name}` ({binding.player_tag})\n"
-            f"🏰 **Клан:** {binding.player_clan_name or 'Не в клане'}\n"
-            f"📅 **Привязан:** {binding.binding_date.strftime('%d.%m.%Y')}\n\n"
-            f"❗ **Внимание:** После отвязки вам потребуется заново привязать игрока "
-            f"и пройти верификацию у администратора.\n\n"
-            f"Вы уверены, что хотите отвязать игрока?",
-            reply_markup=keyboard,
-            parse_mode="Markdown"
-        )
-        
-    except Exception as e:
-        logger.error(f"Ошибка в unbind_player_command: {e}")
+    # Получаем паспорт пользователя
+    passport = await _passport().get_passport_by_user(
+        user_id=message.from_user.id,
+        chat_id=message.chat.id
+    )
+    
+    if not passport or not passport.player_binding:
         await message.reply(
-            "❌ Произошла ошибка при отвязке игрока. Попробуйте позже."
+            "❌ У вас нет привязанного игрока!"
         )
+        return
+    
+    binding = passport.player_binding
+    
+    # Создаем клавиатуру подтверждения
+    keyboard = InlineKeyboardMarkup(inline_keyboard=[
+        [InlineKeyboardButton(
+            text="✅ Да, отвязать", 
+            callback_data=f"confirm_unbind:{message.from_user.id}"
+        )],
+        [InlineKeyboardButton(
+            text="❌ Отмена", 
+            callback_data=f"cancel_unbind:{message.from_user.id}"
+        )]
+    ])
+    
+    await message.reply(
+        _TPL_UNBIND_CONFIRM.substitute(
+            name=escape_markdown(binding.player_name),
+            tag=escape_markdown(binding.player_tag),
+            clan=escape_markdown(binding.player_clan_name or 'Не в клане'),
+            date=escape_markdown(binding.binding_date.strftime('%d.%m.%Y'))
+        ),
+        reply_markup=keyboard,
+        parse_mode="MarkdownV2"
+    )
 
 
 @router.callback_query(F.data.startswith("confirm_unbind:"))
-async def confirm_unbind_callback(callback: CallbackQuery):
+@_safe_handler("❌ Произошла ошибка")
+async def confirm_unbind_callback(callback: CallbackQuery, cb_args: Tuple[str, ...]):
     """Подтверждение отвязки игрока"""
-    try:
-        user_id = int(callback.data.split(":")[1])
-        
-        if callback.from_user.id != user_id:
-            await callback.answer("❌ Это не ваше меню!", show_alert=True)
-            return
-        
-        # Отвязываем игрока
-        result = await player_binding_service.unbind_player_from_passport(
-            user_id=user_id,
-            chat_id=callback.message.chat.id,
-            requester_id=user_id
+    # Диалог отвязки виден всему чату, поэтому владелец остается в callback_data:
+    # чужое нажатие не должно отвязывать игрока нажавшего без его подтверждения
+    user_id = int(cb_args[0])
+    
+    if callback.from_user.id != user_id:
+        await callback.answer(_MSG_NOT_YOUR_MENU, show_alert=True)
+        return
+    
+    # Отвязываем игрока
+    result = await _binding().unbind_player_from_passport(
+        user_id=user_id,
+        chat_id=callback.message.chat.id,
+        requester_id=user_id
+    )
+    
+    if result['success']:
+        await callback.message.edit_text(
+            "✅ **Игрок успешно отвязан от паспорта!**\n\n"
+            "🎮 Теперь вы можете привязать нового игрока командой `/bind_player`\n"
+            "💡 При привязке нового игрока потребуется верификация администратором",
+            parse_mode="Markdown"
+        )
+    else:
+        await callback.message.edit_text(
+            f"❌ **Ошибка отвязки игрока:**\n{result['error']}"
         )
-        
-        if result['success']:
-            await callback.message.edit_text(
-                "✅ **Игрок успешно отвязан от паспорта!**\n\n"
-                "🎮 Теперь вы можете привязать нового игрока командой `/bind_player`\n"
-                "💡 При привязке нового игрока потребуется верификация администратором",
-                parse_mode="Markdown"
-            )
-        else:
-            await callback.message.edit_text(
-                f"❌ **Ошибка отвязки игрока:**\n{result['error']}"
-            )
-            
-    except Exception as e:
-        logger.error(f"Ошибка в confirm_unbind_callback: {e}")
-        await callback.answer("❌ Произошла ошибка", show_alert=True)
 
 
 @router.message(Command("binding_stats"))
+@_safe_handler("❌ Произошла ошибка при получении статистики. Попробуйте позже.")
 async def binding_stats_command(message: Message):
     """
     Команда для просмотра статистики привязок в чате
     Usage: /binding_stats
     """
-    try:
-        # Получаем статистику привязок
-        stats = await player_binding_service.get_binding_statistics(
-            chat_id=message.chat.id
+    # Статистика и проверка прав не зависят друг от друга - выполняем параллельно
+    stats, is_admin = await asyncio.gather(
+        _binding().get_binding_statistics(chat_id=message.chat.id),
+        _is_admin(message.from_user.id, message.chat.id)
+    )
+    
+    if not stats:
+        await message.reply(_MSG_STATS_EMPTY)
+        return
+    
+    # Форматируем сообщение со статистикой
+    total = stats['total_bindings']
+    verified = stats['verified_bindings']
+    unverified = total - verified
+    verification_rate = (verified / total * 100) if total > 0 else 0
+    
+    parts = [_TPL_BINDING_STATS.substitute(
+        total=total,
+        verified=verified,
+        rate=escape_markdown(f"{verification_rate:.1f}"),
+        unverified=unverified
+    )]
+    
+    # Добавляем распределение по кланам
+    if stats['clan_distribution']:
+        parts.append("🏰 *Распределение по кланам:*\n")
+        parts.extend(
+            f"   • {escape_markdown(clan_name)}: {count} игроков\n"
+            for clan_name, count in stats['clan_distribution'].items()
         )
-        
-        if not stats:
-            await message.reply(
-                "📊 **Статистика привязок не найдена**\n\n"
-                "В чате еще нет привязанных игроков."
+        parts.append("\n")
+    
+    # Добавляем последние привязки
+    if stats['recent_bindings']:
+        parts.append("🕒 *Последние привязки:*\n")
+        parts.extend([
+            _RECENT_BINDING_FMT.format(
+                emoji="✅" if info['is_verified'] else "⏳",
+                name=escape_markdown(info['player_name']),
+                date=escape_markdown(info['binding_date'].strftime('%d.%m.%Y'))
             )
-            return
-        
-        # Форматируем сообщение со статистикой
-        total = stats['total_bindings']
-        verified = stats['verified_bindings']
-        unverified = total - verified
-        verification_rate = (verified / total * 100) if total > 0 else 0
-        
-        stats_message = (
-            f"📊 **Статистика привязок игроков**\n\n"
-            f"👥 **Всего привязок:** {total}\n"
-            f"✅ **Верифицировано:** {verified} ({verification_rate:.1f}%)\n"
-            f"⏳ **Ожидает верификации:** {unverified}\n\n"
-        )
-        
-        # Добавляем распределение по кланам
-        if stats['clan_distribution']:
-            stats_message += "🏰 **Распределение по кланам:**\n"
-            for clan_name, count in stats['clan_distribution'].items():
-                stats_message += f"   • {clan_name}: {count} игроков\n"
-            stats_message += "\n"
-        
-        # Добавляем последние привязки
-        if stats['recent_bindings']:
-            stats_message += "🕒 **Последние привязки:**\n"
-            for binding_info in stats['recent_bindings'][:5]:
-                date_str = binding_info['binding_date'].strftime('%d.%m.%Y')
-                verified_emoji = "✅" if binding_info['is_verified'] else "⏳"
-                stats_message += f"   {verified_emoji} {binding_info['player_name']} - {date_str}\n"
-        
-        # Создаем клавиатуру для администраторов
-        keyboard = None
-        is_admin = await check_admin_permission(
-            user_id=message.from_user.id,
-            chat_id=message.chat.id
-        )
-        
-        if is_admin and unverified > 0:
-            keyboard = InlineKeyboardMarkup(inline_keyboard=[
-                [InlineKeyboardButton(
-                    text=f"⏳ Верифицировать привязки ({unverified})",
-                    callback_data=f"show_unverified_for_admin:{message.from_user.id}"
-                )]
-            ])
-        
-        await message.reply(
-            stats_message,
-            reply_markup=keyboard,
-            parse_mode="Markdown"
-        )
-        
-    except Exception as e:
-        logger.error(f"Ошибка в binding_stats_command: {e}")
-        await message.reply(
-            "❌ Произошла ошибка при получении статистики. Попробуйте позже."
-        )
+            for info in stats['recent_bindings'][:5]
+        ])
+    
+    stats_message = "".join(parts)
+    
+    # Создаем клавиатуру для администраторов
+    keyboard = None
+    if is_admin and unverified > 0:
+        keyboard = InlineKeyboardMarkup(inline_keyboard=[
+            [InlineKeyboardButton(
+                text=f"⏳ Верифицировать привязки ({unverified})",
+                callback_data=f"show_unverified_for_admin:{message.from_user.id}"
+            )]
+        ])
+    
+    await message.reply(
+        stats_message,
+        reply_markup=keyboard,
+        parse_mode="MarkdownV2"
+    )
 
 
 # Дополнительные callback handlers
-@router.callback_query(F.data.startswith("cancel_binding:"))
+@router.callback_query(F.data == "cancel_binding")
+@_safe_handler("❌ Произошла ошибка")
 async def cancel_binding_callback(callback: CallbackQuery):
     """Отмена привязки игрока"""
-    user_id = int(callback.data.split(":")[1])
-    
-    if callback.from_user.id != user_id:
-        await callback.answer("❌ Это не ваше меню!", show_alert=True)
-        return
-    
     await callback.message.edit_text(
         "❌ **Привязка игрока отменена**\n\n"
         "Используйте команду `/bind_player` для повторной попытки.",
@@ -779,162 +937,128 @@ async def cancel_binding_callback(callback: CallbackQuery):
     )
 
 
-@router.callback_query(F.data.startswith("back_to_binding_options:"))
+@router.callback_query(F.data == "back_to_binding_options")
+@_safe_handler("❌ Произошла ошибка")
 async def back_to_binding_options_callback(callback: CallbackQuery):
     """Возврат к опциям привязки"""
-    user_id = int(callback.data.split(":")[1])
+    await callback.message.edit_text(
+        _BINDING_MENU_TEXT,
+        reply_markup=_BINDING_MENU_KB,
+        parse_mode="Markdown"
+    )
+
+
+@functools.lru_cache(maxsize=10_000)
+def _h(text: str) -> str:
+    """Экранирование пользовательского текста для parse_mode=HTML (имена повторяются - кэшируем)"""
+    return html.escape(text, quote=False)
+
+
+def _render_binding_detail(player_info: Dict[str, Any], binding, passport) -> str:
+    """Карточка привязки с актуальными данными игрока из CoC API (HTML)"""
+    return (
+        f"🎮 <b>Детальная информация об игроке</b>\n\n"
+        f"👤 <b>Имя:</b> <code>{_h(player_info.get('name', binding.player_name))}</code>\n"
+        f"🏷️ <b>Тег:</b> <code>{_h(binding.player_tag)}</code>\n"
+        f"🏆 <b>Кубки:</b> {player_info.get('trophies', 0):,}\n"
+        f"💎 <b>Лучший результат:</b> {player_info.get('bestTrophies', 0):,}\n"
+        f"⭐ <b>Уровень:</b> {player_info.get('expLevel', 'N/A')}\n"
+        f"🏰 <b>Клан:</b> {_h(player_info.get('clan', {}).get('name', 'Не в клане'))}\n"
+        f"📅 <b>Дата привязки:</b> {binding.binding_date.strftime('%d.%m.%Y %H:%M')}\n"
+        f"✅ <b>Статус:</b> {'Верифицирован' if binding.is_verified else 'Ожидает верификации'}\n\n"
+        f"🔗 <b>Привязан к паспорту:</b> {_h(passport.display_name or '')}"
+    )
+
+
+def _render_binding_fallback(binding) -> str:
+    """Карточка привязки по данным из БД, когда CoC API недоступен (HTML)"""
+    return (
+        f"🎮 <b>Информация об игроке</b>\n\n"
+        f"👤 <b>Имя:</b> <code>{_h(binding.player_name)}</code>\n"
+        f"🏷️ <b>Тег:</b> <code>{_h(binding.player_tag)}</code>\n"
+        f"🏰 <b>Клан:</b> {_h(binding.player_clan_name or 'Не в клане')}\n"
+        f"💎 <b>Кубки:</b> {binding.player_trophies:,}\n"
+        f"📅 <b>Дата привязки:</b> {binding.binding_date.strftime('%d.%m.%Y %H:%M')}\n"
+        f"✅ <b>Статус:</b> {'Верифицирован' if binding.is_verified else 'Ожидает верификации'}\n\n"
+        f"⚠️ Актуальная информация временно недоступна"
+    )
+
+
+# Регистрируем все обработчики callback-запросов для существующих функций из паспортов
+# Открытие привязки запрашивает CoC API - нажатия на старые меню отсекаются фильтром
+@router.callback_query(F.data == "view_binding", FreshCallback())
+@_safe_handler("❌ Произошла ошибка")
+async def view_binding_callback(callback: CallbackQuery):
+    """Просмотр текущей привязки игрока"""
+    user_id = callback.from_user.id
     
-    if callback.from_user.id != user_id:
-        await callback.answer("❌ Это не ваше меню!", show_alert=True)
+    passport = await _passport().get_passport_by_user(
+        user_id=user_id,
+        chat_id=callback.message.chat.id
+    )
+    
+    if not passport or not passport.player_binding:
+        await callback.message.edit_text(
+            "❌ Привязанный игрок не найден!"
+        )
         return
     
-    # Показываем меню опций привязки заново
+    binding = passport.player_binding
+    
+    # Получаем дополнительную информацию об игроке из CoC API
+    try:
+        player_info = await fetch_player(binding.player_tag)
+        
+        if player_info:
+            detailed_info = _render_binding_detail(player_info, binding, passport)
+        else:
+            detailed_info = "❌ Не удалось получить информацию об игроке из CoC API"
+            
+    except (ApiError, asyncio.TimeoutError, asyncio.QueueFull, RuntimeError) as e:
+        # Ожидаемые сбои API (в т.ч. неинициализированный сервис CoC API):
+        # без трейсбека, показываем данные из БД
+        logger.warning("CoC fetch failed for %s: %r", binding.player_tag, e)
+        detailed_info = _render_binding_fallback(binding)
+    
     keyboard = InlineKeyboardMarkup(inline_keyboard=[
         [InlineKeyboardButton(
-            text="🏰 Выбрать из клана", 
-            callback_data=f"select_from_clan:{user_id}"
-        )],
-        [InlineKeyboardButton(
-            text="🔍 Найти по тегу", 
-            callback_data=f"search_by_tag:{user_id}"
+            text="🔄 Сменить игрока", 
+            callback_data="change_player"
         )],
         [InlineKeyboardButton(
-            text="📝 Ввести тег вручную", 
-            callback_data=f"manual_tag_input:{user_id}"
+            text="❌ Отвязать игрока", 
+            callback_data=f"unbind_player:{user_id}"
         )],
         [InlineKeyboardButton(
-            text="❌ Отмена", 
-            callback_data=f"cancel_binding:{user_id}"
+            text="👀 Просмотреть паспорт", 
+            callback_data=f"view_passport:{user_id}"
         )]
     ])
     
     await callback.message.edit_text(
-        "🎮 **Выберите способ привязки игрока:**\n\n"
-        "🏰 **Из клана** - выберите игрока из участников клана\n"
-        "🔍 **По тегу** - найдите игрока по его тегу\n"
-        "📝 **Вручную** - введите тег игрока самостоятельно\n\n"
-        "💡 Рекомендуется выбирать из клана для автоматической верификации",
+        detailed_info,
         reply_markup=keyboard,
-        parse_mode="Markdown"
+        parse_mode="HTML"
     )
 
 
-# Регистрируем все обработчики callback-запросов для существующих функций из паспортов
-@router.callback_query(F.data.startswith("view_binding:"))
-async def view_binding_callback(callback: CallbackQuery):
-    """Просмотр текущей привязки игрока"""
-    try:
-        user_id = int(callback.data.split(":")[1])
-        
-        if callback.from_user.id != user_id:
-            await callback.answer("❌ Это не ваше меню!", show_alert=True)
-            return
-        
-        passport = await passport_service.get_passport_by_user(
-            user_id=user_id,
-            chat_id=callback.message.chat.id
-        )
-        
-        if not passport or not passport.player_binding:
-            await callback.message.edit_text(
-                "❌ Привязанный игрок не найден!"
-            )
-            return
-        
-        binding = passport.player_binding
-        
-        # Получаем дополнительную информацию об игроке из CoC API
-        try:
-            player_info = await coc_api.get_player(binding.player_tag)
-            
-            if player_info:
-                detailed_info = (
-                    f"🎮 **Детальная информация об игроке**\n\n"
-                    f"👤 **Имя:** `{player_info.get('name', binding.player_name)}`\n"
-                    f"🏷️ **Тег:** `{binding.player_tag}`\n"
-                    f"🏆 **Кубки:** {player_info.get('trophies', 0):,}\n"
-                    f"💎 **Лучший результат:** {player_info.get('bestTrophies', 0):,}\n"
-                    f"⭐ **Уровень:** {player_info.get('expLevel', 'N/A')}\n"
-                    f"🏰 **Клан:** {player_info.get('clan', {}).get('name', 'Не в клане')}\n"
-                    f"📅 **Дата привязки:** {binding.binding_date.strftime('%d.%m.%Y %H:%M')}\n"
-                    f"✅ **Статус:** {'Верифицирован' if binding.is_verified else 'Ожидает верификации'}\n\n"
-                    f"🔗 **Привязан к паспорту:** {passport.display_name}"
-                )
-            else:
-                detailed_info = f"❌ Не удалось получить информацию об игроке из CoC API"
-                
-        except Exception as e:
-            logger.error(f"Ошибка получения информации об игроке: {e}")
-            detailed_info = (
-                f"🎮 **Информация об игроке**\n\n"
-                f"👤 **Имя:** `{binding.player_name}`\n"
-                f"🏷️ **Тег:** `{binding.player_tag}`\n"
-                f"🏰 **Клан:** {binding.player_clan_name or 'Не в клане'}\n"
-                f"💎 **Кубки:** {binding.player_trophies:,}\n"
-                f"📅 **Дата привязки:** {binding.binding_date.strftime('%d.%m.%Y %H:%M')}\n"
-                f"✅ **Статус:** {'Верифицирован' if binding.is_verified else 'Ожидает верификации'}\n\n"
-                f"⚠️ Актуальная информация временно недоступна"
-            )
-        
-        keyboard = InlineKeyboardMarkup(inline_keyboard=[
-            [InlineKeyboardButton(
-                text="🔄 Сменить игрока", 
-                callback_data=f"change_player:{user_id}"
-            )],
-            [InlineKeyboardButton(
-                text="❌ Отвязать игрока", 
-                callback_data=f"unbind_player:{user_id}"
-            )],
-            [InlineKeyboardButton(
-                text="👀 Просмотреть паспорт", 
-                callback_data=f"view_passport:{user_id}"
-            )]
-        ])
-        
-        await callback.message.edit_text(
-            detailed_info,
-            reply_markup=keyboard,
-            parse_mode="Markdown"
-        )
-        
-    except Exception as e:
-        logger.error(f"Ошибка в view_binding_callback: {e}")
-        await callback.answer("❌ Произошла ошибка", show_alert=True)
-
-
-@router.callback_query(F.data.startswith("change_player:"))
+@router.callback_query(F.data == "change_player")
+@_safe_handler("❌ Произошла ошибка")
 async def change_player_callback(callback: CallbackQuery):
     """Смена привязанного игрока"""
-    user_id = int(callback.data.split(":")[1])
-    
-    if callback.from_user.id != user_id:
-        await callback.answer("❌ Это не ваше меню!", show_alert=True)
-        return
-    
-    # Показываем опции привязки нового игрока
+    # Показываем опции привязки нового игрока (общие кнопки + возврат к привязке)
     keyboard = InlineKeyboardMarkup(inline_keyboard=[
-        [InlineKeyboardButton(
-            text="🏰 Выбрать из клана", 
-            callback_data=f"select_from_clan:{user_id}"
-        )],
-        [InlineKeyboardButton(
-            text="🔍 Найти по тегу", 
-            callback_data=f"search_by_tag:{user_id}"
-        )],
-        [InlineKeyboardButton(
-            text="📝 Ввести тег вручную", 
-            callback_data=f"manual_tag_input:{user_id}"
-        )],
+        *map(list, _BINDING_METHOD_ROWS),
         [InlineKeyboardButton(
             text="🔙 Назад", 
-            callback_data=f"view_binding:{user_id}"
+            callback_data="view_binding"
         )]
     ])
     
     await callback.message.edit_text(
-        "🔄 **Смена привязанного игрока**\n\n"
+        "🔄 <b>Смена привязанного игрока</b>\n\n"
         "Выберите способ привязки нового игрока:\n\n"
-        "⚠️ **Внимание:** Текущая привязка будет заменена на новую",
+        "⚠️ <b>Внимание:</b> Текущая привязка будет заменена на новую",
         reply_markup=keyboard,
-        parse_mode="Markdown"
+        parse_mode="HTML"
     )
\ No newline at end of file
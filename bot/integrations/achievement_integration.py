@@ -3,35 +3,97 @@
 Фаза 6: Связывание системы достижений со всеми функциями бота
 """
 
+import asyncio
+import functools
+import inspect
 import logging
+import re
+import time
 from datetime import datetime
-from typing import Dict, List, Optional, Any
+from typing import Dict, List, Optional, Any, Tuple
 
 from ..services.achievement_service import AchievementService
-from ..services.achievement_event_tracker import (
-    achievement_tracker,
-    track_message_sent,
-    track_passport_created,
-    track_player_bound,
-    track_player_verified,
-    track_clan_joined,
-    track_command_used
-)
+from ..services.achievement_event_tracker import achievement_tracker
 from ..services.user_context_service import UserContextService
 from ..middleware.contextual_middleware import ContextualMiddleware
 
 logger = logging.getLogger(__name__)
 
+# Методы трекера (глобальный экземпляр), привязанные один раз при импорте
+_track_bulk = achievement_tracker.track_events_bulk
+_sync = achievement_tracker.sync_user_stats
+_trigger = achievement_tracker.trigger_manual_check
+
+# Максимальный размер очереди событий; при переполнении новые события отбрасываются
+EVENT_QUEUE_SIZE = 10_000
+# Сколько ждать передачи оставшихся событий при остановке (секунды)
+SHUTDOWN_DRAIN_TIMEOUT = 5
+# Максимальное число событий, передаваемых в трекер одним вызовом
+EVENT_BATCH_SIZE = 50
+# Максимальное число запоминаемых последних статистик игроков
+LAST_STATS_MAX_SIZE = 50_000
+# Служебный тип события: синхронизация статистики пользователя
+_SYNC_USER_STATS = 'sync_user_stats'
+
+# Порядок ролей в клане (для определения повышения)
+_ROLE_ORDER = {
+    'member': 0,
+    'elder': 1,
+    'coLeader': 2,
+    'leader': 3
+}
+
+# Команды, использование которых дает особое событие поведения
+_SPECIAL_COMMANDS = {
+    '/achievements': 'achievement_explorer',
+    '/my_progress': 'progress_tracker',
+    '/smart': 'smart_user',
+    '/dashboard': 'power_user',
+    '/leaderboard': 'competitive_user'
+}
+
+# Ключевые слова типов сообщений: один проход регулярного выражения без
+# приведения текста к нижнему регистру
+_MESSAGE_KEYWORDS_RE = re.compile(
+    r'(?P<gratitude>спасибо|благодарю|thanks)|(?P<help_request>помощь|help|как)',
+    re.IGNORECASE
+)
+
+
+@functools.lru_cache(maxsize=8192)
+def _iso_to_epoch(value: str) -> int:
+    """Дата в ISO-формате -> Unix-время (секунды); строки дат повторяются, поэтому разбор кэшируется"""
+    return int(datetime.fromisoformat(value).timestamp())
+
 
 class AchievementIntegrationManager:
     """
     Менеджер интеграции системы достижений с существующими компонентами
     """
     
+    # Единственный экземпляр с фиксированным набором атрибутов
+    __slots__ = (
+        'achievement_service',
+        'context_service',
+        '_event_queue',
+        '_consumer',
+        '_last_stats',
+        '_initialized'
+    )
+    
     def __init__(self):
         self.achievement_service = AchievementService()
         self.context_service = UserContextService()
         
+        # События от обработчиков бота: обработчики только кладут событие
+        # в очередь, передачу в трекер выполняет фоновая задача
+        self._event_queue: asyncio.Queue = asyncio.Queue(maxsize=EVENT_QUEUE_SIZE)
+        self._consumer: Optional[asyncio.Task] = None
+        
+        # (chat_id, user_id, player_tag) -> последняя обработанная статистика
+        # (кубки, уровень, победы в атаках)
+        self._last_stats: Dict[Tuple[int, int, str], Tuple[Any, Any, Any]] = {}
+        
         # Флаг инициализации
         self._initialized = False
     
@@ -48,6 +110,9 @@ class AchievementIntegrationManager:
             # Запускаем трекер событий
             await achievement_tracker.start_processing()
             
+            # Запускаем передачу событий из очереди в трекер
+            self._consumer = asyncio.create_task(self._drain())
+            
             # Настраиваем хуки интеграции
             await self._setup_integration_hooks()
             
@@ -55,9 +120,96 @@ class AchievementIntegrationManager:
             logger.info("Интеграция системы достижений успешно инициализирована")
             
         except Exception as e:
-            logger.error(f"Ошибка инициализации интеграции достижений: {e}")
+            logger.exception("Ошибка инициализации интеграции достижений: %s", e)
             raise
     
+    async def shutdown(self):
+        """Остановка передачи событий: сначала передаются накопленные события"""
+        
+        if self._consumer is not None:
+            try:
+                await asyncio.wait_for(self._event_queue.join(), timeout=SHUTDOWN_DRAIN_TIMEOUT)
+            except asyncio.TimeoutError:
+                logger.warning(
+                    "Не все события достижений переданы при остановке: осталось %s",
+                    self._event_queue.qsize()
+                )
+            
+            self._consumer.cancel()
+            await asyncio.gather(self._consumer, return_exceptions=True)
+            self._consumer = None
+        
+        await achievement_tracker.stop_processing()
+        self._initialized = False
+    
+    def _enqueue(
+        self, 
+        user_id: int, 
+        chat_id: int, 
+        event_type: str, 
+        event_data: Optional[Dict[str, Any]] = None,
+        sub_events: Optional[List[Tuple[str, Dict[str, Any]]]] = None
+    ):
+        """
+        Постановка события в очередь без ожидания
+        
+        Args:
+            user_id: ID пользователя
+            chat_id: ID чата
+            event_type: Тип события
+            event_data: Данные события
+            sub_events: Сопутствующие события (тип, данные), обрабатываемые вместе с основным
+        """
+        try:
+            self._event_queue.put_nowait({
+                'user_id': user_id,
+                'chat_id': chat_id,
+                'event_type': event_type,
+                'event_data': event_data,
+                'sub_events': sub_events
+            })
+        except asyncio.QueueFull:
+            logger.warning(f"Очередь событий достижений переполнена, событие {event_type} отброшено")
+    
+    async def _drain(self):
+        """
+        Фоновая задача: передача событий из очереди в трекер пачками
+        
+        Ждет первое событие и забирает вместе с ним все, что уже накопилось
+        в очереди (до EVENT_BATCH_SIZE): при низкой нагрузке события уходят
+        сразу по одному, при всплеске - пачкой за один вызов трекера.
+        """
+        
+        while True:
+            batch = [await self._event_queue.get()]
+            while len(batch) < EVENT_BATCH_SIZE and not self._event_queue.empty():
+                batch.append(self._event_queue.get_nowait())
+            
+            try:
+                await self._process_batch(batch)
+            except Exception as e:
+                logger.exception("Ошибка передачи пачки из %s событий: %s", len(batch), e)
+            finally:
+                for _ in batch:
+                    self._event_queue.task_done()
+    
+    async def _process_batch(self, batch: List[Dict[str, Any]]):
+        """Передача пачки событий в трекер"""
+        
+        events = []
+        for event in batch:
+            if event['event_type'] == _SYNC_USER_STATS:
+                # Порядок событий сохраняется: накопленное уходит до синхронизации
+                if events:
+                    await _track_bulk(events)
+                    events = []
+                await _sync(event['user_id'], event['chat_id'])
+            else:
+                events.append(event)
+        
+        if events:
+            await _track_bulk(events)
+    
     async def _setup_integration_hooks(self):
         """Настройка хуков интеграции с существующими системами"""
         
@@ -76,15 +228,18 @@ class AchievementIntegrationManager:
         
         try:
             # Отслеживаем событие создания паспорта
-            await track_passport_created(user_id, chat_id, passport_data)
+            self._enqueue(user_id, chat_id, 'passport_created', {
+                'passport_created': True,
+                **passport_data
+            })
             
             # Синхронизируем статистику пользователя
-            await achievement_tracker.sync_user_stats(user_id, chat_id)
+            self._enqueue(user_id, chat_id, _SYNC_USER_STATS)
             
             logger.info(f"Обработано создание паспорта для пользователя {user_id}")
             
         except Exception as e:
-            logger.error(f"Ошибка обработки создания паспорта: {e}")
+            logger.exception("Ошибка обработки создания паспорта: %s", e)
     
     async def on_passport_updated(
         self, 
@@ -95,14 +250,13 @@ class AchievementIntegrationManager:
         """Обработка обновления паспорта"""
         
         try:
-            await achievement_tracker.track_event(user_id, chat_id, 'passport_updated', {
+            self._enqueue(user_id, chat_id, 'passport_updated', {
                 'passport_updated': True,
-                'update_fields': list(update_data.keys()),
-                'update_date': datetime.now().isoformat()
+                'update_fields': tuple(update_data)
             })
             
         except Exception as e:
-            logger.error(f"Ошибка обработки обновления паспорта: {e}")
+            logger.exception("Ошибка обработки обновления паспорта: %s", e)
     
     # Методы для интеграции с системой привязки игроков
     
@@ -117,21 +271,26 @@ class AchievementIntegrationManager:
         """Обработка привязки игрока"""
         
         try:
-            # Отслеживаем привязку
-            await track_player_bound(user_id, chat_id, player_tag, player_name)
-            
-            # Отслеживаем игровую статистику
+            # Игровая статистика отслеживается вместе с привязкой одним событием
+            sub_events = None
             if 'trophies' in player_data:
-                await achievement_tracker.track_event(user_id, chat_id, 'player_stats_updated', {
+                sub_events = [('player_stats_updated', {
                     'trophies': player_data['trophies'],
                     'level': player_data.get('expLevel', 1),
                     'player_tag': player_tag
-                })
+                })]
+            
+            # Отслеживаем привязку
+            self._enqueue(user_id, chat_id, 'player_bound', {
+                'player_bound': True,
+                'player_tag': player_tag,
+                'player_name': player_name
+            }, sub_events)
             
             logger.info(f"Обработана привязка игрока {player_name} для пользователя {user_id}")
             
         except Exception as e:
-            logger.error(f"Ошибка обработки привязки игрока: {e}")
+            logger.exception("Ошибка обработки привязки игрока: %s", e)
     
     async def on_player_verified(
         self, 
@@ -144,20 +303,22 @@ class AchievementIntegrationManager:
         
         try:
             # Отслеживаем верификацию
-            await track_player_verified(user_id, chat_id, player_tag)
+            self._enqueue(user_id, chat_id, 'player_verified', {
+                'player_verified': True,
+                'player_tag': player_tag
+            })
             
             # Дополнительные события верификации
-            await achievement_tracker.track_event(user_id, chat_id, 'verification_completed', {
+            self._enqueue(user_id, chat_id, 'verification_completed', {
                 'player_tag': player_tag,
                 'verification_method': verification_data.get('method', 'manual'),
-                'verifier_id': verification_data.get('verifier_id'),
-                'verification_date': datetime.now().isoformat()
+                'verifier_id': verification_data.get('verifier_id')
             })
             
             logger.info(f"Обработана верификация игрока {player_tag} для пользователя {user_id}")
             
         except Exception as e:
-            logger.error(f"Ошибка обработки верификации игрока: {e}")
+            logger.exception("Ошибка обработки верификации игрока: %s", e)
     
     async def on_player_stats_updated(
         self, 
@@ -170,8 +331,24 @@ class AchievementIntegrationManager:
         """Обработка обновления статистики игрока"""
         
         try:
-            # Сравниваем статистику и отслеживаем изменения
-            changes = {}
+            # Опрос CoC API повторно присылает ту же статистику - такие
+            # обновления не доходят до трекера
+            key = (chat_id, user_id, player_tag)
+            stats = (
+                new_stats.get('trophies', 0),
+                new_stats.get('expLevel', 1),
+                new_stats.get('attackWins', 0)
+            )
+            if self._last_stats.get(key) == stats:
+                return
+            
+            self._last_stats.pop(key, None)
+            if len(self._last_stats) >= LAST_STATS_MAX_SIZE:
+                self._last_stats.pop(next(iter(self._last_stats)))
+            self._last_stats[key] = stats
+            
+            # Сравниваем статистику; изменения пишутся сразу в данные события
+            changes = {'player_tag': player_tag}
             
             # Проверяем изменение кубков
             old_trophies = old_stats.get('trophies', 0)
@@ -197,16 +374,12 @@ class AchievementIntegrationManager:
             if new_attack_wins > old_attack_wins:
                 changes['attack_wins'] = new_attack_wins - old_attack_wins
             
-            # Отслеживаем изменения
-            if changes:
-                await achievement_tracker.track_event(user_id, chat_id, 'player_stats_updated', {
-                    'player_tag': player_tag,
-                    **changes,
-                    'update_date': datetime.now().isoformat()
-                })
+            # Отслеживаем изменения (кроме player_tag есть хотя бы одно)
+            if len(changes) > 1:
+                self._enqueue(user_id, chat_id, 'player_stats_updated', changes)
             
         except Exception as e:
-            logger.error(f"Ошибка обработки обновления статистики игрока: {e}")
+            logger.exception("Ошибка обработки обновления статистики игрока: %s", e)
     
     # Методы для интеграции с клановой системой
     
@@ -221,22 +394,22 @@ class AchievementIntegrationManager:
         """Обработка вступления в клан"""
         
         try:
-            # Отслеживаем вступление в клан
-            await track_clan_joined(user_id, chat_id, clan_tag, clan_name)
-            
-            # Дополнительная информация о членстве
+            # Отслеживаем вступление в клан вместе с информацией о членстве
             role = membership_data.get('role', 'member')
-            await achievement_tracker.track_event(user_id, chat_id, 'clan_role_assigned', {
+            self._enqueue(user_id, chat_id, 'clan_joined', {
+                'clan_membership': True,
+                'clan_tag': clan_tag,
+                'clan_name': clan_name
+            }, [('clan_role_assigned', {
                 'clan_tag': clan_tag,
                 'clan_name': clan_name,
-                'role': role,
-                'join_date': datetime.now().isoformat()
-            })
+                'role': role
+            })])
             
             logger.info(f"Обработано вступление в клан {clan_name} для пользователя {user_id}")
             
         except Exception as e:
-            logger.error(f"Ошибка обработки вступления в клан: {e}")
+            logger.exception("Ошибка обработки вступления в клан: %s", e)
     
     async def on_clan_left(
         self, 
@@ -249,29 +422,31 @@ class AchievementIntegrationManager:
         """Обработка выхода из клана"""
         
         try:
-            # Подсчитываем длительность членства
-            join_date = membership_data.get('join_date')
-            membership_duration = 0
-            
-            if join_date:
-                if isinstance(join_date, str):
-                    join_datetime = datetime.fromisoformat(join_date)
-                else:
-                    join_datetime = join_date
-                
-                membership_duration = (datetime.now() - join_datetime).days
-            
-            await achievement_tracker.track_event(user_id, chat_id, 'clan_left', {
+            # Подсчитываем длительность членства по Unix-времени вступления
+            # (join_date_epoch, если передано, иначе из join_date)
+            join_epoch = membership_data.get('join_date_epoch')
+            
+            if join_epoch is None:
+                join_date = membership_data.get('join_date')
+                if join_date:
+                    # Даты приходят строками ISO (разбор кэширован) или datetime
+                    join_epoch = (
+                        _iso_to_epoch(join_date) if type(join_date) is str
+                        else int(join_date.timestamp())
+                    )
+            
+            membership_duration = (int(time.time()) - join_epoch) // 86400 if join_epoch else 0
+            
+            self._enqueue(user_id, chat_id, 'clan_left', {
                 'clan_tag': clan_tag,
                 'clan_name': clan_name,
-                'membership_duration_days': membership_duration,
-                'leave_date': datetime.now().isoformat()
+                'membership_duration_days': membership_duration
             })
             
             logger.info(f"Обработан выход из клана {clan_name} для пользователя {user_id}")
             
         except Exception as e:
-            logger.error(f"Ошибка обработки выхода из клана: {e}")
+            logger.exception("Ошибка обработки выхода из клана: %s", e)
     
     async def on_clan_war_participation(
         self, 
@@ -286,17 +461,16 @@ class AchievementIntegrationManager:
             war_type = war_data.get('war_type', 'regular')  # regular, cwl, friendly
             
             # Отслеживаем начало участия в войне
-            await achievement_tracker.track_event(user_id, chat_id, 'clan_war_started', {
+            self._enqueue(user_id, chat_id, 'clan_war_started', {
                 'clan_tag': clan_tag,
                 'war_type': war_type,
-                'war_size': war_data.get('team_size', 0),
-                'participation_date': datetime.now().isoformat()
+                'war_size': war_data.get('team_size', 0)
             })
             
             logger.info(f"Обработано участие в войне для пользователя {user_id}")
             
         except Exception as e:
-            logger.error(f"Ошибка обработки участия в войне: {e}")
+            logger.exception("Ошибка обработки участия в войне: %s", e)
     
     async def on_clan_war_ended(
         self, 
@@ -315,19 +489,18 @@ class AchievementIntegrationManager:
             stars_earned = player_performance.get('stars_earned', 0)
             destruction_percentage = player_performance.get('destruction_avg', 0)
             
-            await achievement_tracker.track_event(user_id, chat_id, 'clan_war_ended', {
+            self._enqueue(user_id, chat_id, 'clan_war_ended', {
                 'clan_tag': war_data.get('clan_tag'),
                 'war_result': war_result,
                 'attacks_used': attacks_used,
                 'stars_earned': stars_earned,
-                'destruction_percentage': destruction_percentage,
-                'war_end_date': datetime.now().isoformat()
+                'destruction_percentage': destruction_percentage
             })
             
             logger.info(f"Обработано окончание войны для пользователя {user_id}")
             
         except Exception as e:
-            logger.error(f"Ошибка обработки окончания войны: {e}")
+            logger.exception("Ошибка обработки окончания войны: %s", e)
     
     async def on_clan_role_changed(
         self, 
@@ -343,26 +516,25 @@ class AchievementIntegrationManager:
             # Отслеживаем повышение/понижение
             is_promotion = self._is_role_promotion(old_role, new_role)
             
-            await achievement_tracker.track_event(user_id, chat_id, 'clan_role_changed', {
+            # Специальное событие для повышений обрабатывается вместе с основным
+            sub_events = None
+            if is_promotion and new_role in ['coLeader', 'leader']:
+                sub_events = [('user_promoted', {
+                    'clan_tag': clan_tag,
+                    'new_role': new_role
+                })]
+            
+            self._enqueue(user_id, chat_id, 'clan_role_changed', {
                 'clan_tag': clan_tag,
                 'old_role': old_role,
                 'new_role': new_role,
-                'is_promotion': is_promotion,
-                'change_date': datetime.now().isoformat()
-            })
-            
-            # Специальное событие для повышений
-            if is_promotion and new_role in ['coLeader', 'leader']:
-                await achievement_tracker.track_event(user_id, chat_id, 'user_promoted', {
-                    'clan_tag': clan_tag,
-                    'new_role': new_role,
-                    'promotion_date': datetime.now().isoformat()
-                })
+                'is_promotion': is_promotion
+            }, sub_events)
             
             logger.info(f"Обработано изменение роли с {old_role} на {new_role} для пользователя {user_id}")
             
         except Exception as e:
-            logger.error(f"Ошибка обработки изменения роли в клане: {e}")
+            logger.exception("Ошибка обработки изменения роли в клане: %s", e)
     
     # Методы для интеграции с контекстуальными командами
     
@@ -377,26 +549,21 @@ class AchievementIntegrationManager:
         
         try:
             # Отслеживаем использование команды
-            await track_command_used(user_id, chat_id, command)
+            self._enqueue(user_id, chat_id, 'special_command_used', {
+                'command': command
+            })
             
             # Специальные события для определенных команд
-            special_commands = {
-                '/achievements': 'achievement_explorer',
-                '/my_progress': 'progress_tracker',
-                '/smart': 'smart_user',
-                '/dashboard': 'power_user',
-                '/leaderboard': 'competitive_user'
-            }
-            
-            if command in special_commands:
-                await achievement_tracker.track_event(user_id, chat_id, 'special_behavior', {
-                    'behavior_type': special_commands[command],
-                    'command': command,
-                    'usage_date': datetime.now().isoformat()
+            behavior_type = _SPECIAL_COMMANDS.get(command)
+            
+            if behavior_type:
+                self._enqueue(user_id, chat_id, 'special_behavior', {
+                    'behavior_type': behavior_type,
+                    'command': command
                 })
             
         except Exception as e:
-            logger.error(f"Ошибка обработки использования команды {command}: {e}")
+            logger.exception("Ошибка обработки использования команды %s: %s", command, e)
     
     async def on_message_sent(
         self, 
@@ -410,20 +577,24 @@ class AchievementIntegrationManager:
             message_length = len(message_data.get('text', ''))
             
             # Отслеживаем сообщение
-            await track_message_sent(user_id, chat_id, message_length)
+            self._enqueue(user_id, chat_id, 'message_sent', {
+                'messages_count': 1,
+                'message_length': message_length,
+                'timestamp': datetime.now().isoformat()
+            })
             
             # Анализируем тип сообщения
             message_type = self._analyze_message_type(message_data)
             
             if message_type:
-                await achievement_tracker.track_event(user_id, chat_id, 'message_type_sent', {
+                self._enqueue(user_id, chat_id, 'message_type_sent', {
                     'message_type': message_type,
                     'message_length': message_length,
                     'send_date': datetime.now().isoformat()
                 })
             
         except Exception as e:
-            logger.error(f"Ошибка обработки отправленного сообщения: {e}")
+            logger.exception("Ошибка обработки отправленного сообщения: %s", e)
     
     # Методы для интеграции с контекстуальными системами
     
@@ -452,13 +623,12 @@ class AchievementIntegrationManager:
                         }
             
             if context_changes:
-                await achievement_tracker.track_event(user_id, chat_id, 'user_context_changed', {
-                    'changes': context_changes,
-                    'change_date': datetime.now().isoformat()
+                self._enqueue(user_id, chat_id, 'user_context_changed', {
+                    'changes': context_changes
                 })
             
         except Exception as e:
-            logger.error(f"Ошибка обработки изменения контекста: {e}")
+            logger.exception("Ошибка обработки изменения контекста: %s", e)
     
     # Методы для интеграции с middleware
     
@@ -470,37 +640,34 @@ class AchievementIntegrationManager:
             logger.info("Интеграция с middleware выполнена")
             
         except Exception as e:
-            logger.error(f"Ошибка интеграции с middleware: {e}")
+            logger.exception("Ошибка интеграции с middleware: %s", e)
     
     # Утилиты
     
-    def _is_role_promotion(self, old_role: str, new_role: str) -> bool:
+    @staticmethod
+    def _is_role_promotion(old_role: str, new_role: str) -> bool:
         """Проверка, является ли изменение роли повышением"""
         
-        role_hierarchy = {
-            'member': 0,
-            'elder': 1,
-            'coLeader': 2,
-            'leader': 3
-        }
-        
-        old_level = role_hierarchy.get(old_role, 0)
-        new_level = role_hierarchy.get(new_role, 0)
-        
-        return new_level > old_level
+        return _ROLE_ORDER.get(new_role, 0) > _ROLE_ORDER.get(old_role, 0)
     
     def _analyze_message_type(self, message_data: Dict[str, Any]) -> Optional[str]:
         """Анализ типа сообщения"""
         
-        text = message_data.get('text', '').lower()
+        text = message_data.get('text', '')
         
         if '?' in text:
             return 'question'
-        elif any(word in text for word in ['спасибо', 'благодарю', 'thanks']):
-            return 'gratitude'
-        elif any(word in text for word in ['помощь', 'help', 'как']):
-            return 'help_request'
-        elif len(text) > 200:
+        
+        # Благодарность важнее просьбы о помощи, где бы она ни стояла в тексте
+        message_type = None
+        for match in _MESSAGE_KEYWORDS_RE.finditer(text):
+            if match.lastgroup == 'gratitude':
+                return 'gratitude'
+            message_type = 'help_request'
+        
+        if message_type:
+            return message_type
+        if len(text) > 200:
             return 'long_message'
         
         return None
@@ -511,11 +678,11 @@ class AchievementIntegrationManager:
         """Принудительная проверка достижений пользователя"""
         
         try:
-            await achievement_tracker.trigger_manual_check(user_id, chat_id, "all")
+            await _trigger(user_id, chat_id, "all")
             logger.info(f"Выполнена принудительная проверка достижений для пользователя {user_id}")
             
         except Exception as e:
-            logger.error(f"Ошибка принудительной проверки достижений: {e}")
+            logger.exception("Ошибка принудительной проверки достижений: %s", e)
     
     async def sync_all_users(self):
         """Синхронизация достижений для всех пользователей"""
@@ -528,7 +695,7 @@ class AchievementIntegrationManager:
             logger.info("Начата синхронизация достижений для всех пользователей")
             
         except Exception as e:
-            logger.error(f"Ошибка массовой синхронизации: {e}")
+            logger.exception("Ошибка массовой синхронизации: %s", e)
 
 
 # Создаем глобальный экземпляр менеджера интеграции
@@ -537,36 +704,71 @@ achievement_integration = AchievementIntegrationManager()
 
 # Функции-декораторы для автоматической интеграции
 
+def _extract_ids(args: tuple, kwargs: Dict[str, Any]) -> tuple:
+    """user_id и chat_id из аргументов вызова: из kwargs или из первых двух позиционных"""
+    
+    user_id = kwargs.get('user_id')
+    chat_id = kwargs.get('chat_id')
+    
+    if not user_id and len(args) >= 2:
+        user_id, chat_id = args[0], args[1]
+    
+    return user_id, chat_id
+
+
+def _make_ids_extractor(func):
+    """
+    Извлечение user_id и chat_id, подготовленное по сигнатуре функции
+    
+    Позиции параметров user_id и chat_id определяются один раз при
+    декорировании; если в сигнатуре их нет, используется _extract_ids.
+    """
+    try:
+        params = list(inspect.signature(func).parameters)
+    except (TypeError, ValueError):
+        return _extract_ids
+    
+    if 'user_id' not in params or 'chat_id' not in params:
+        return _extract_ids
+    
+    user_idx = params.index('user_id')
+    chat_idx = params.index('chat_id')
+    
+    def extract(args: tuple, kwargs: Dict[str, Any]) -> tuple:
+        user_id = args[user_idx] if len(args) > user_idx else kwargs.get('user_id')
+        chat_id = args[chat_idx] if len(args) > chat_idx else kwargs.get('chat_id')
+        return user_id, chat_id
+    
+    return extract
+
+
 def track_achievement_event(event_type: str):
     """Декоратор для автоматического отслеживания событий достижений"""
     
     def decorator(func):
+        function_name = func.__name__
+        extract_ids = _make_ids_extractor(func)
+        
+        @functools.wraps(func)
         async def wrapper(*args, **kwargs):
+            # Ошибки самой функции пробрасываются как есть: функция
+            # выполняется ровно один раз
+            result = await func(*args, **kwargs)
+            
             try:
-                # Выполняем оригинальную функцию
-                result = await func(*args, **kwargs)
-                
-                # Пытаемся извлечь user_id и chat_id из аргументов
-                user_id = kwargs.get('user_id')
-                chat_id = kwargs.get('chat_id')
-                
-                # Если не найдены в kwargs, ищем в args
-                if not user_id and len(args) >= 2:
-                    user_id, chat_id = args[0], args[1]
+                user_id, chat_id = extract_ids(args, kwargs)
                 
                 if user_id and chat_id:
                     # Отслеживаем событие
-                    await achievement_tracker.track_event(user_id, chat_id, event_type, {
-                        'function_name': func.__name__,
+                    achievement_integration._enqueue(user_id, chat_id, event_type, {
+                        'function_name': function_name,
                         'timestamp': datetime.now().isoformat()
                     })
                 
-                return result
-                
             except Exception as e:
-                logger.error(f"Ошибка в декораторе отслеживания событий: {e}")
-                # Возвращаем результат оригинальной функции даже при ошибке трекинга
-                return await func(*args, **kwargs)
+                logger.exception("Ошибка в декораторе отслеживания событий: %s", e)
+            
+            return result
         
         return wrapper
     return decorator
\ No newline at end of file
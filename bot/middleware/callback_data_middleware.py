@@ -0,0 +1,33 @@
+"""
+Middleware для разбора callback_data
+"""
+
+from typing import Dict, Any, Callable, Awaitable
+
+from aiogram import BaseMiddleware
+from aiogram.types import CallbackQuery, TelegramObject
+
+
+class CallbackDataMiddleware(BaseMiddleware):
+    """
+    Разбирает callback_data вида "op:arg1:arg2" один раз на апдейт
+
+    Результат кладется в data["cb_op"] (строка до первого ":") и
+    data["cb_args"] (кортеж строк после него), откуда aiogram передает их
+    обработчикам, объявившим параметры cb_op / cb_args.
+    """
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any]
+    ) -> Any:
+        """Основная точка входа middleware"""
+
+        if isinstance(event, CallbackQuery) and event.data:
+            op, _, rest = event.data.partition(":")
+            data["cb_op"] = op
+            data["cb_args"] = tuple(rest.split(":")) if rest else ()
+
+        return await handler(event, data)
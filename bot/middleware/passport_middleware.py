@@ -0,0 +1,68 @@
+"""
+Middleware для загрузки паспорта автора callback'а
+"""
+
+from typing import Dict, Any, Callable, Awaitable
+import logging
+
+from aiogram import BaseMiddleware
+from aiogram.dispatcher.flags import get_flag
+from aiogram.types import CallbackQuery, TelegramObject
+
+from ..services.passport_database_service import get_passport_db_service
+
+logger = logging.getLogger(__name__)
+
+
+def requires_passport(handler):
+    """
+    Пометка обработчика, которому нужен паспорт пользователя.
+    Паспорт передается обработчику вторым аргументом.
+    """
+    handler.requires_passport = True
+    return handler
+
+
+class PassportMiddleware(BaseMiddleware):
+    """
+    Загружает паспорт пользователя один раз и кладет его в data["passport"]
+
+    Срабатывает для обработчиков с флагом requires_passport (через flags при
+    регистрации или через декоратор requires_passport на обработчике, выбранном
+    фильтром и переданном в data["passport_handler"]). Если паспорта нет,
+    отвечает на callback и не вызывает обработчик.
+    """
+
+    def __init__(self, not_found_text: str = "❌ Паспорт не найден"):
+        super().__init__()
+        self.not_found_text = not_found_text
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any]
+    ) -> Any:
+        """Основная точка входа middleware"""
+
+        if not isinstance(event, CallbackQuery) or not self._requires_passport(data):
+            return await handler(event, data)
+
+        passport = await get_passport_db_service().get_passport_by_user(
+            event.from_user.id, event.message.chat.id
+        )
+
+        if passport is None:
+            await event.answer(self.not_found_text)
+            return None
+
+        data["passport"] = passport
+        return await handler(event, data)
+
+    @staticmethod
+    def _requires_passport(data: Dict[str, Any]) -> bool:
+        """Нужен ли паспорт обработчику этого апдейта"""
+        target = data.get("passport_handler")
+        if getattr(target, "requires_passport", False):
+            return True
+        return bool(get_flag(data, "requires_passport"))
@@ -386,26 +386,30 @@ class ClanWarHistory:
 
 # Вспомогательные функции для работы с моделями
 
+# Таблицы эмодзи создаются один раз при импорте, а не при каждом вызове
+_WAR_STATE_EMOJI: Dict[WarState, str] = {
+    WarState.NOT_IN_WAR: "✅",
+    WarState.PREPARATION: "⏳",
+    WarState.IN_WAR: "⚔️",
+    WarState.WAR_ENDED: "🏆"
+}
+
+_ROLE_EMOJI: Dict[MemberRole, str] = {
+    MemberRole.LEADER: "👑",
+    MemberRole.CO_LEADER: "🔱",
+    MemberRole.ELDER: "⭐",
+    MemberRole.MEMBER: "👤"
+}
+
+
 def war_state_to_emoji(state: WarState) -> str:
     """Конвертировать состояние войны в эмодзи"""
-    mapping = {
-        WarState.NOT_IN_WAR: "✅",
-        WarState.PREPARATION: "⏳",
-        WarState.IN_WAR: "⚔️",
-        WarState.WAR_ENDED: "🏆"
-    }
-    return mapping.get(state, "❓")
+    return _WAR_STATE_EMOJI.get(state, "❓")
 
 
 def role_to_emoji(role: MemberRole) -> str:
     """Конвертировать роль в эмодзи"""
-    mapping = {
-        MemberRole.LEADER: "👑",
-        MemberRole.CO_LEADER: "🔱",
-        MemberRole.ELDER: "⭐",
-        MemberRole.MEMBER: "👤"
-    }
-    return mapping.get(role, "❓")
+    return _ROLE_EMOJI.get(role, "❓")
 
 
 def format_duration(seconds: int) -> str:
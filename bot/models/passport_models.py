@@ -3,6 +3,7 @@
 """
 import logging
 from dataclasses import dataclass, field
+from functools import cached_property
 from typing import Optional, Dict, Any, List
 from datetime import datetime
 from enum import Enum
@@ -177,6 +178,13 @@ class PassportInfo:
     # Дополнительные данные
     metadata: Dict[str, Any] = field(default_factory=dict)
     
+    @cached_property
+    def created_at_formatted(self) -> str:
+        """Дата создания для отображения (считается один раз на загруженный объект)"""
+        from ..utils.validators import format_date
+        
+        return format_date(self.created_at)
+    
     @classmethod
     def from_db_row(cls, row) -> 'PassportInfo':
         """Создание из строки БД"""
@@ -6,9 +6,16 @@
 import asyncio
 import logging
 from datetime import datetime
-from typing import Dict, List, Optional, Any, Callable
+from typing import Dict, List, Optional, Any, Callable, Tuple
 import json
 
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    orjson = None
+    ORJSON_AVAILABLE = False
+
 from ..services.achievement_service import AchievementService
 from ..services.user_context_service import UserContextService
 from ..services.passport_database_service import PassportDatabaseService
@@ -17,6 +24,20 @@ from ..services.clan_database_service import ClanDatabaseService
 logger = logging.getLogger(__name__)
 
 
+
+def _event_fingerprint(event_data: Dict[str, Any]):
+    """Каноническое представление данных события для поиска дублей (orjson, если установлен)"""
+    if ORJSON_AVAILABLE:
+        return orjson.dumps(event_data, option=orjson.OPT_SORT_KEYS | orjson.OPT_NON_STR_KEYS)
+    return json.dumps(event_data, sort_keys=True)
+
+
+# Максимум событий, обрабатываемых подряд до передачи управления циклу событий
+EVENT_DRAIN_BATCH = 256
+# Пауза при пустой очереди (секунды)
+EVENT_IDLE_SLEEP = 0.01
+
+
 class AchievementEventTracker:
     """
     Центральная система отслеживания событий для достижений
@@ -82,7 +103,8 @@ class AchievementEventTracker:
         user_id: int, 
         chat_id: int, 
         event_type: str, 
-        event_data: Dict[str, Any]
+        event_data: Dict[str, Any],
+        sub_events: Optional[List[Tuple[str, Dict[str, Any]]]] = None
     ):
         """
         Добавление события в очередь обработки
@@ -92,25 +114,62 @@ class AchievementEventTracker:
             chat_id: ID чата
             event_type: Тип события
             event_data: Данные события
+            sub_events: Сопутствующие события (тип, данные), которые
+                обрабатываются сразу после основного
+        """
+        
+        self._put_event(user_id, chat_id, event_type, event_data, datetime.now(), sub_events)
+    
+    async def track_events_bulk(self, events: List[Dict[str, Any]]):
+        """
+        Добавление пачки событий в очередь обработки
+        
+        Args:
+            events: События в виде словарей с ключами user_id, chat_id,
+                event_type, event_data и необязательным sub_events (аргументы track_event)
         """
         
+        now = datetime.now()
+        for event in events:
+            # Ошибка в одном событии (например, несериализуемые данные) не
+            # должна отбрасывать остальные события пачки
+            try:
+                self._put_event(
+                    event['user_id'], event['chat_id'], event['event_type'], event['event_data'], now,
+                    event.get('sub_events')
+                )
+            except Exception as e:
+                logger.error(f"Ошибка постановки события {event.get('event_type', 'unknown')} в очередь: {e}")
+    
+    def _put_event(
+        self, 
+        user_id: int, 
+        chat_id: int, 
+        event_type: str, 
+        event_data: Dict[str, Any],
+        now: datetime,
+        sub_events: Optional[List[Tuple[str, Dict[str, Any]]]] = None
+    ):
+        """Проверка дублирования и постановка события в очередь"""
+        
         # Проверяем дублирование событий
-        event_key = f"{user_id}_{chat_id}_{event_type}_{hash(json.dumps(event_data, sort_keys=True))}"
+        event_key = f"{user_id}_{chat_id}_{event_type}_{hash(_event_fingerprint(event_data))}"
         
         if event_key in self._recent_events:
-            time_diff = (datetime.now() - self._recent_events[event_key]).total_seconds()
+            time_diff = (now - self._recent_events[event_key]).total_seconds()
             if time_diff < 1:  # Игнорируем события чаще раза в секунду
                 return
         
-        self._recent_events[event_key] = datetime.now()
+        self._recent_events[event_key] = now
         
-        # Добавляем в очередь
-        await self._event_queue.put({
+        # Добавляем в очередь (очередь не ограничена, put_nowait не блокирует)
+        self._event_queue.put_nowait({
             'user_id': user_id,
             'chat_id': chat_id,
             'event_type': event_type,
             'event_data': event_data,
-            'timestamp': datetime.now()
+            'sub_events': sub_events,
+            'timestamp': now
         })
         
         logger.debug(f"Событие добавлено в очередь: {event_type} для пользователя {user_id}")
@@ -120,17 +179,27 @@ class AchievementEventTracker:
         
         while self._processing:
             try:
-                # Ждем события из очереди (с таймаутом)
-                try:
-                    event = await asyncio.wait_for(self._event_queue.get(), timeout=1.0)
-                except asyncio.TimeoutError:
+                # Очередь пуста - короткая пауза вместо wait_for с таймером на каждое событие
+                if self._event_queue.empty():
+                    await asyncio.sleep(EVENT_IDLE_SLEEP)
                     continue
                 
-                # Обрабатываем событие
-                await self._handle_event(event)
+                # Забираем накопившиеся события без ожидания
+                for _ in range(EVENT_DRAIN_BATCH):
+                    try:
+                        event = self._event_queue.get_nowait()
+                    except asyncio.QueueEmpty:
+                        break
+                    
+                    try:
+                        # Обрабатываем событие
+                        await self._handle_event(event)
+                    finally:
+                        # Отмечаем задачу как выполненную
+                        self._event_queue.task_done()
                 
-                # Отмечаем задачу как выполненную
-                self._event_queue.task_done()
+                # Даем поработать остальным задачам перед следующей пачкой
+                await asyncio.sleep(0)
                 
             except Exception as e:
                 logger.error(f"Ошибка обработки события: {e}")
@@ -160,6 +229,16 @@ class AchievementEventTracker:
             # Если есть завершенные достижения, уведомляем пользователя
             if completed_achievements:
                 await self._notify_achievements_completed(user_id, chat_id, completed_achievements)
+            
+            # Сопутствующие события обрабатываются сразу за основным
+            for sub_type, sub_data in event.get('sub_events') or ():
+                await self._handle_event({
+                    'user_id': user_id,
+                    'chat_id': chat_id,
+                    'event_type': sub_type,
+                    'event_data': sub_data,
+                    'timestamp': event['timestamp']
+                })
                 
         except Exception as e:
             logger.error(f"Ошибка обработки события {event.get('event_type', 'unknown')}: {e}")
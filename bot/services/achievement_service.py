@@ -10,6 +10,13 @@ from typing import Dict, List, Optional, Any, Set, Tuple
 import json
 import sqlite3
 
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    orjson = None
+    ORJSON_AVAILABLE = False
+
 from ..models.achievement_models import (
     Achievement, UserAchievementProgress, UserProfile, LeaderboardEntry,
     AchievementStatus, AchievementCategory, AchievementDifficulty,
@@ -22,6 +29,13 @@ from ..services.user_context_service import UserContextService
 logger = logging.getLogger(__name__)
 
 
+def _dumps_event(event_data: Dict[str, Any]) -> str:
+    """JSON данных события для таблицы achievement_events (orjson, если установлен)"""
+    if ORJSON_AVAILABLE:
+        return orjson.dumps(event_data, option=orjson.OPT_NON_STR_KEYS).decode()
+    return json.dumps(event_data)
+
+
 class AchievementService:
     """
     Центральный сервис для управления достижениями и прогрессом пользователей
@@ -675,7 +689,7 @@ class AchievementService:
                 cursor.execute("""
                     INSERT INTO achievement_events (user_id, chat_id, event_type, event_data)
                     VALUES (?, ?, ?, ?)
-                """, (user_id, chat_id, event_type, json.dumps(event_data)))
+                """, (user_id, chat_id, event_type, _dumps_event(event_data)))
                 
                 conn.commit()
                 
@@ -61,6 +61,7 @@ class BindingAdminService:
             
             # Фильтруем неверифицированные привязки
             unverified_queue = []
+            now = datetime.now()
             
             for passport in all_passports:
                 if passport.player_binding and not passport.player_binding.is_verified:
@@ -75,7 +76,7 @@ class BindingAdminService:
                         'player_clan_name': binding.player_clan_name,
                         'player_trophies': binding.player_trophies,
                         'binding_date': binding.binding_date,
-                        'days_waiting': (datetime.now() - binding.binding_date).days,
+                        'days_waiting': (now - binding.binding_date).days,
                         'is_clan_member': await self._check_is_registered_clan_member(
                             binding.player_tag, chat_id
                         ),
@@ -764,9 +765,10 @@ class BindingAdminService:
             recommendations.append(f"⏳ {len(unverified)} привязок ожидают верификации")
         
         # Анализ старых непроверенных привязок
+        now = datetime.now()
         old_unverified = [
             p for p in unverified 
-            if (datetime.now() - p.player_binding.binding_date).days > 7
+            if (now - p.player_binding.binding_date).days > 7
         ]
         if old_unverified:
             recommendations.append(f"🚨 {len(old_unverified)} привязок ожидают более недели")
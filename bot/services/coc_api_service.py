@@ -46,22 +46,40 @@ class CocApiService:
     
     BASE_URL = "https://api.clashofclans.com/v1"
     
-    def __init__(self, api_keys: List[str]):
+    def __init__(self, api_keys: List[str], max_concurrency: int = 64):
         if not api_keys:
             raise ValueError("At least one API key is required")
         
         self.api_keys = api_keys
         self.current_key_index = 0
         self.rate_limiter = AsyncRateLimiter(35, 1)  # 35 запросов в секунду
+        # Ограничение одновременных запросов: при всплеске запросы ждут в очереди,
+        # а не упираются в 429 и повторы
+        self._concurrency = asyncio.Semaphore(max_concurrency)
         self._session: Optional[aiohttp.ClientSession] = None
     
     async def __aenter__(self):
-        await self._ensure_session()
+        await self.open()
         return self
     
     async def __aexit__(self, exc_type, exc_val, exc_tb):
-        if self._session:
+        await self.close()
+    
+    async def open(self):
+        """
+        Открыть HTTP сессию
+        
+        Глобальный сервис разделяется обработчиками и воркерами, поэтому
+        сессию открывает и закрывает только main.py при старте и остановке
+        бота; вызывающий код не оборачивает запросы в async with.
+        """
+        await self._ensure_session()
+    
+    async def close(self):
+        """Закрыть HTTP сессию"""
+        if self._session and not self._session.closed:
             await self._session.close()
+        self._session = None
     
     async def _ensure_session(self):
         """Обеспечить наличие HTTP сессии"""
@@ -103,7 +121,7 @@ class CocApiService:
         
         for attempt in range(max_retries):
             try:
-                async with self.rate_limiter:
+                async with self._concurrency, self.rate_limiter:
                     async with self._session.get(url, headers=headers, params=params) as response:
                         if response.status == 200:
                             return await response.json()
@@ -113,11 +131,13 @@ class CocApiService:
                             logger.warning(f"Rate limited on key {self.current_key_index}")
                             await self._rotate_api_key()
                             headers["Authorization"] = f"Bearer {self._get_current_api_key()}"
-                            await asyncio.sleep(2)  # Небольшая пауза
-                            continue
+                            retry_after = self._retry_after(response)
                         else:
                             error_text = await response.text()
                             raise ApiError(f"API error {response.status}: {error_text}")
+                
+                # Пауза перед повтором - вне семафора, чтобы не занимать слот
+                await asyncio.sleep(retry_after)
             
             except aiohttp.ClientError as e:
                 if attempt == max_retries - 1:
@@ -126,6 +146,14 @@ class CocApiService:
         
         raise ApiError("All API keys exhausted")
     
+    @staticmethod
+    def _retry_after(response: aiohttp.ClientResponse, default: float = 2.0) -> float:
+        """Пауза перед повтором из заголовка Retry-After (секунды)"""
+        try:
+            return float(response.headers.get("Retry-After", default))
+        except ValueError:
+            return default
+    
     async def get_clan(self, clan_tag: str) -> ClanData:
         """
         Получить информацию о клане
@@ -185,6 +213,35 @@ class CocApiService:
             logger.error(f"Error getting clan members {clan_tag}: {e}")
             raise ApiError(f"Failed to get clan members: {e}")
     
+    async def get_player(self, player_tag: str) -> Optional[Dict[str, Any]]:
+        """
+        Получить информацию об игроке
+        
+        Args:
+            player_tag: Тег игрока (с # или без)
+        
+        Returns:
+            Optional[Dict]: Данные игрока из API или None, если игрок не найден
+        
+        Raises:
+            ApiError: Ошибка API
+        """
+        try:
+            endpoint = f"/players/{self._normalize_clan_tag(player_tag)}"
+            
+            logger.debug(f"Getting player info for {player_tag}")
+            
+            return await self._make_request(endpoint)
+            
+        except ClanNotFound:
+            logger.warning(f"Player {player_tag} not found")
+            return None
+        except ApiError:
+            raise
+        except Exception as e:
+            logger.error(f"Error getting player {player_tag}: {e}")
+            raise ApiError(f"Failed to get player info: {e}")
+    
     async def verify_clan_exists(self, clan_tag: str) -> bool:
         """
         Проверить существует ли клан (быстрая проверка)
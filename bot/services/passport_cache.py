@@ -0,0 +1,400 @@
+"""
+Кэш паспортов в Redis
+
+Хранит строки таблицы user_passports (в том же виде, в котором их возвращает
+SELECT p.*, c.clan_name), поэтому гидратация идет через PassportInfo.from_db_row.
+Перед Redis стоит небольшой кэш в памяти процесса с коротким TTL: повторные
+нажатия одного пользователя не ходят даже в Redis. Если REDIS_URL не задан
+или библиотека redis не установлена, работает только кэш в памяти.
+"""
+import json
+import logging
+import os
+import time
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+try:
+    from redis.asyncio import Redis
+    REDIS_AVAILABLE = True
+except ImportError:
+    Redis = None
+    REDIS_AVAILABLE = False
+
+try:
+    import msgpack
+    MSGPACK_AVAILABLE = True
+except ImportError:
+    msgpack = None
+    MSGPACK_AVAILABLE = False
+
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    orjson = None
+    ORJSON_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+# Время жизни записи в кэше (секунды)
+PASSPORT_CACHE_TTL = 60
+# Время жизни записей, загруженных при прогреве кэша на старте (секунды)
+WARM_CACHE_TTL = 3600
+# Кэш в памяти процесса: время жизни (секунды) и максимальный размер
+LOCAL_CACHE_TTL = 10
+LOCAL_CACHE_MAX_SIZE = 10_000
+# Время жизни хэша последнего текста сообщения (секунды)
+MESSAGE_HASH_TTL = 3600
+# Время жизни токена подтверждения удаления (секунды)
+DELETE_TOKEN_TTL = 600
+# Время жизни снимка списка неверифицированных привязок чата (секунды)
+UNVERIFIED_CACHE_TTL = 30
+
+
+def _pack(value: Any) -> bytes:
+    """Сериализация значения для Redis (msgpack, если установлен, иначе orjson или json)"""
+    if MSGPACK_AVAILABLE:
+        return msgpack.packb(value)
+    if ORJSON_AVAILABLE:
+        return orjson.dumps(value)
+    return json.dumps(value).encode()
+
+
+def _unpack(payload: bytes) -> Any:
+    """Десериализация значения из Redis"""
+    if MSGPACK_AVAILABLE:
+        return msgpack.unpackb(payload, raw=False)
+    if ORJSON_AVAILABLE:
+        return orjson.loads(payload)
+    return json.loads(payload)
+
+
+class PassportCache:
+    """Read-through кэш паспортов с ключами по (user_id, chat_id) и по ID"""
+
+    def __init__(self, redis_url: Optional[str] = None, ttl: int = PASSPORT_CACHE_TTL):
+        self.ttl = ttl
+        self._redis = None
+        # key -> (момент истечения, строка БД)
+        self._local: Dict[str, Tuple[float, List[Any]]] = {}
+        # chat_id -> версия паспортов чата; растет при каждой инвалидации
+        self._chat_versions: Dict[int, int] = {}
+
+        if redis_url and REDIS_AVAILABLE:
+            self._redis = Redis.from_url(redis_url)
+        elif redis_url:
+            logger.warning("redis is not installed, passport cache disabled")
+
+    @property
+    def enabled(self) -> bool:
+        """Включен ли кэш"""
+        return self._redis is not None
+
+    @staticmethod
+    def user_key(user_id: int, chat_id: int) -> str:
+        """Ключ паспорта по пользователю и чату"""
+        return f"passport:{user_id}:{chat_id}"
+
+    @staticmethod
+    def id_key(passport_id: int) -> str:
+        """Ключ паспорта по ID"""
+        return f"passport:id:{passport_id}"
+
+    @staticmethod
+    def message_key(chat_id: int, message_id: int) -> str:
+        """Ключ хэша текста сообщения"""
+        return f"msg_hash:{chat_id}:{message_id}"
+
+    @staticmethod
+    def delete_token_key(token: str) -> str:
+        """Ключ токена подтверждения удаления"""
+        return f"del_tok:{token}"
+
+    @staticmethod
+    def unverified_key(chat_id: int) -> str:
+        """Ключ снимка неверифицированных привязок чата"""
+        return f"unverified:{chat_id}"
+
+    async def get_row(self, key: str) -> Optional[List[Any]]:
+        """
+        Получение строки паспорта из кэша (сначала память процесса, затем Redis)
+
+        Args:
+            key: Ключ кэша
+
+        Returns:
+            Optional[List[Any]]: Строка БД или None при промахе
+        """
+        row = self._get_local(key)
+        if row is not None or self._redis is None:
+            return row
+
+        try:
+            payload = await self._redis.get(key)
+            row = _unpack(payload) if payload else None
+        except Exception as e:
+            logger.error(f"Error reading passport cache {key}: {e}")
+            return None
+
+        if row is not None:
+            self._set_local(key, row)
+        return row
+
+    async def set_row(self, row: Sequence[Any]):
+        """
+        Сохранение строки паспорта сразу под обоими ключами
+
+        Args:
+            row: Строка БД (id, user_id, chat_id, ...)
+        """
+        row = list(row)
+        self._set_local(self.user_key(row[1], row[2]), row)
+        self._set_local(self.id_key(row[0]), row)
+
+        if self._redis is None:
+            return
+
+        payload = _pack(row)
+        try:
+            async with self._redis.pipeline(transaction=False) as pipe:
+                pipe.set(self.user_key(row[1], row[2]), payload, ex=self.ttl)
+                pipe.set(self.id_key(row[0]), payload, ex=self.ttl)
+                await pipe.execute()
+        except Exception as e:
+            logger.error(f"Error writing passport cache for {row[0]}: {e}")
+
+    async def set_rows(self, rows: Sequence[Sequence[Any]], ttl: Optional[int] = None) -> int:
+        """
+        Массовая запись строк паспортов в Redis одним pipeline (прогрев кэша)
+
+        Args:
+            rows: Строки БД (id, user_id, chat_id, ...)
+            ttl: Время жизни записей (по умолчанию self.ttl)
+
+        Returns:
+            int: Количество записанных паспортов
+        """
+        if self._redis is None or not rows:
+            return 0
+
+        ex = ttl or self.ttl
+        try:
+            async with self._redis.pipeline(transaction=False) as pipe:
+                for row in rows:
+                    payload = _pack(list(row))
+                    pipe.set(self.user_key(row[1], row[2]), payload, ex=ex)
+                    pipe.set(self.id_key(row[0]), payload, ex=ex)
+                await pipe.execute()
+        except Exception as e:
+            logger.error(f"Error warming passport cache: {e}")
+            return 0
+
+        return len(rows)
+
+    def chat_version(self, chat_id: int) -> int:
+        """
+        Версия паспортов чата: меняется при любом изменении паспорта в чате
+
+        Args:
+            chat_id: ID чата
+
+        Returns:
+            int: Номер версии (0, если изменений еще не было)
+        """
+        return self._chat_versions.get(chat_id, 0)
+
+    async def invalidate(self, user_id: int, chat_id: int, passport_id: Optional[int] = None):
+        """
+        Удаление паспорта из кэша после изменения или удаления
+
+        Args:
+            user_id: ID пользователя
+            chat_id: ID чата
+            passport_id: ID паспорта
+        """
+        keys = [self.user_key(user_id, chat_id)]
+        if passport_id is not None:
+            keys.append(self.id_key(passport_id))
+        # Изменение паспорта может изменить список неверифицированных привязок чата
+        keys.append(self.unverified_key(chat_id))
+        self._chat_versions[chat_id] = self._chat_versions.get(chat_id, 0) + 1
+
+        for key in keys:
+            self._local.pop(key, None)
+
+        if self._redis is None:
+            return
+
+        try:
+            # Один UNLINK на все ключи - один round-trip, память освобождается в фоне
+            await self._redis.unlink(*keys)
+        except Exception as e:
+            logger.error(f"Error invalidating passport cache for user {user_id}: {e}")
+
+    def _get_local(self, key: str) -> Optional[List[Any]]:
+        """Чтение из кэша в памяти с проверкой срока жизни"""
+        entry = self._local.get(key)
+        if entry is None:
+            return None
+        if entry[0] < time.monotonic():
+            self._local.pop(key, None)
+            return None
+        return entry[1]
+
+    def _set_local(self, key: str, row: List[Any]):
+        """Запись в кэш в памяти; при переполнении вытесняется самая старая запись"""
+        self._local.pop(key, None)
+        if len(self._local) >= LOCAL_CACHE_MAX_SIZE:
+            self._local.pop(next(iter(self._local)))
+        self._local[key] = (time.monotonic() + LOCAL_CACHE_TTL, row)
+
+    async def get_unverified(self, chat_id: int) -> Optional[Tuple[List[List[Any]], int]]:
+        """
+        Получение снимка неверифицированных привязок чата
+
+        Args:
+            chat_id: ID чата
+
+        Returns:
+            Optional[Tuple[List[List[Any]], int]]: Строки БД и общее количество или None при промахе
+        """
+        if self._redis is None:
+            return None
+
+        try:
+            payload = await self._redis.get(self.unverified_key(chat_id))
+            if not payload:
+                return None
+            snapshot = _unpack(payload)
+        except Exception as e:
+            logger.error(f"Error reading unverified snapshot for chat {chat_id}: {e}")
+            return None
+
+        return snapshot["rows"], snapshot["total"]
+
+    async def set_unverified(self, chat_id: int, rows: Sequence[Sequence[Any]], total: int):
+        """
+        Сохранение снимка неверифицированных привязок чата на UNVERIFIED_CACHE_TTL секунд
+
+        Args:
+            chat_id: ID чата
+            rows: Строки БД
+            total: Общее количество неверифицированных привязок
+        """
+        if self._redis is None:
+            return
+
+        payload = _pack({"rows": [list(row) for row in rows], "total": total})
+        try:
+            await self._redis.set(self.unverified_key(chat_id), payload, ex=UNVERIFIED_CACHE_TTL)
+        except Exception as e:
+            logger.error(f"Error writing unverified snapshot for chat {chat_id}: {e}")
+
+    async def swap_message_hash(self, chat_id: int, message_id: int, digest: str) -> Optional[str]:
+        """
+        Сохранение хэша нового текста сообщения с возвратом предыдущего
+
+        Args:
+            chat_id: ID чата
+            message_id: ID сообщения
+            digest: Хэш нового текста
+
+        Returns:
+            Optional[str]: Хэш, сохраненный ранее, или None
+        """
+        if self._redis is None:
+            return None
+
+        try:
+            previous = await self._redis.set(
+                self.message_key(chat_id, message_id), digest, ex=MESSAGE_HASH_TTL, get=True
+            )
+        except Exception as e:
+            logger.error(f"Error swapping message hash for {chat_id}:{message_id}: {e}")
+            return None
+
+        return previous.decode() if previous else None
+
+    async def forget_message_hash(self, chat_id: int, message_id: int):
+        """Сброс хэша сообщения (например, если редактирование не удалось)"""
+        if self._redis is None:
+            return
+
+        try:
+            await self._redis.delete(self.message_key(chat_id, message_id))
+        except Exception as e:
+            logger.error(f"Error deleting message hash for {chat_id}:{message_id}: {e}")
+
+    async def put_delete_token(self, token: str, user_id: int, passport_id: int,
+                               display_name: Optional[str]) -> bool:
+        """
+        Сохранение данных для подтверждения удаления паспорта
+
+        Args:
+            token: Случайный токен из callback_data
+            user_id: ID владельца паспорта
+            passport_id: ID паспорта
+            display_name: Имя в паспорте (для сообщения об удалении)
+
+        Returns:
+            bool: True если токен сохранен
+        """
+        if self._redis is None:
+            return False
+
+        payload = _pack({"uid": user_id, "pid": passport_id, "name": display_name})
+        try:
+            await self._redis.set(self.delete_token_key(token), payload, ex=DELETE_TOKEN_TTL)
+        except Exception as e:
+            logger.error(f"Error saving delete token for user {user_id}: {e}")
+            return False
+        return True
+
+    async def pop_delete_token(self, token: str, user_id: int) -> Optional[Dict[str, Any]]:
+        """
+        Получение данных подтверждения; токен удаляется только при нажатии владельцем
+
+        Нажатие другого участника чата не расходует одноразовый токен: данные
+        возвращаются без удаления, и вызывающий код отклоняет нажатие по uid.
+
+        Args:
+            token: Токен из callback_data
+            user_id: ID нажавшего пользователя
+
+        Returns:
+            Optional[Dict[str, Any]]: {"uid", "pid", "name"} или None
+        """
+        if self._redis is None:
+            return None
+
+        key = self.delete_token_key(token)
+        try:
+            payload = await self._redis.get(key)
+            if not payload:
+                return None
+            entry = _unpack(payload)
+            if entry["uid"] != user_id:
+                return entry
+
+            # GETDEL: из двух одновременных нажатий владельца сработает одно
+            payload = await self._redis.getdel(key)
+            return _unpack(payload) if payload else None
+        except Exception as e:
+            logger.error(f"Error reading delete token: {e}")
+            return None
+
+    async def close(self):
+        """Закрытие соединения с Redis"""
+        if self._redis is not None:
+            await self._redis.close()
+
+
+# Глобальные функции
+_passport_cache = None
+
+def get_passport_cache() -> PassportCache:
+    """Получение экземпляра кэша паспортов"""
+    global _passport_cache
+    if _passport_cache is None:
+        _passport_cache = PassportCache(os.getenv('REDIS_URL'))
+    return _passport_cache
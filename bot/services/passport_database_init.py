@@ -101,6 +101,8 @@ class PassportDatabaseInitializer:
             "CREATE INDEX IF NOT EXISTS idx_passports_chat ON user_passports(chat_id)",
             "CREATE INDEX IF NOT EXISTS idx_passports_clan ON user_passports(preferred_clan_id)",
             "CREATE INDEX IF NOT EXISTS idx_passports_status ON user_passports(status)",
+            "CREATE INDEX IF NOT EXISTS idx_passports_chat_bound ON user_passports(chat_id) "
+            "WHERE player_binding IS NOT NULL",
             "CREATE INDEX IF NOT EXISTS idx_passport_logs_passport ON passport_operation_logs(passport_id)",
             "CREATE INDEX IF NOT EXISTS idx_passport_logs_user ON passport_operation_logs(user_id)",
             "CREATE INDEX IF NOT EXISTS idx_passport_logs_type ON passport_operation_logs(operation_type)",
@@ -1,10 +1,12 @@
 """
 Сервис для работы с паспортами игроков
 """
+import asyncio
 import logging
 import aiosqlite
 import json
-from typing import List, Optional, Dict, Any, Tuple
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, List, Optional, Dict, Any, Set, Tuple
 from datetime import datetime
 
 from ..models.passport_models import (
@@ -12,15 +14,81 @@ from ..models.passport_models import (
     PassportStats, PlayerBinding, PassportNotFound, PassportAlreadyExists,
     PassportValidationError, PassportAccessDenied
 )
+from .passport_cache import WARM_CACHE_TTL, get_passport_cache
 
 logger = logging.getLogger(__name__)
 
 
+class _ConnectionPool:
+    """
+    Пул соединений aiosqlite
+    
+    Каждое aiosqlite.connect() поднимает отдельный поток и заново открывает файл БД.
+    Пул держит до max_size открытых соединений и раздает их конкурентным корутинам.
+    """
+    
+    def __init__(self, db_path: str, max_size: int = 5):
+        self.db_path = db_path
+        self.max_size = max_size
+        self._idle: asyncio.Queue = asyncio.Queue()
+        self._size = 0
+        # Все открытые соединения пула, включая выданные корутинам
+        self._connections: Set[aiosqlite.Connection] = set()
+        self._closed = False
+    
+    @asynccontextmanager
+    async def acquire(self) -> AsyncIterator[aiosqlite.Connection]:
+        """Получение соединения из пула"""
+        try:
+            db = self._idle.get_nowait()
+        except asyncio.QueueEmpty:
+            if self._size < self.max_size:
+                self._size += 1
+                try:
+                    db = await aiosqlite.connect(self.db_path)
+                except Exception:
+                    self._size -= 1
+                    raise
+                self._connections.add(db)
+            else:
+                db = await self._idle.get()
+        
+        try:
+            yield db
+        except Exception:
+            # Не возвращаем в пул соединение с незавершенной транзакцией
+            await db.rollback()
+            raise
+        finally:
+            # После close() соединение уже закрыто и в пул не возвращается
+            if not self._closed and db in self._connections:
+                self._idle.put_nowait(db)
+    
+    async def close(self):
+        """Закрытие всех соединений пула, в том числе выданных в данный момент"""
+        self._closed = True
+        while not self._idle.empty():
+            self._idle.get_nowait()
+        
+        connections, self._connections = self._connections, set()
+        self._size = 0
+        for db in connections:
+            try:
+                await db.close()
+            except Exception as e:
+                logger.error(f"Error closing passport DB connection: {e}")
+
+
 class PassportDatabaseService:
     """Сервис для работы с базой данных паспортов"""
     
-    def __init__(self, db_path: str = "data/passports.db"):
+    def __init__(self, db_path: str = "data/passports.db", pool_size: int = 5):
         self.db_path = db_path
+        self._pool = _ConnectionPool(db_path, pool_size)
+    
+    async def close(self):
+        """Закрытие пула соединений"""
+        await self._pool.close()
     
     async def create_passport(self, user_id: int, chat_id: int, username: Optional[str] = None,
                              display_name: Optional[str] = None, preferred_clan_id: Optional[int] = None) -> PassportInfo:
@@ -54,7 +122,7 @@ class PassportDatabaseService:
                 updated_at=datetime.now()
             )
             
-            async with aiosqlite.connect(self.db_path) as db:
+            async with self._pool.acquire() as db:
                 # Если указан клан, получаем его данные
                 if preferred_clan_id:
                     clan_data = await self._get_clan_data_by_id(db, preferred_clan_id)
@@ -95,13 +163,87 @@ class PassportDatabaseService:
             Optional[PassportInfo]: Паспорт или None
         """
         try:
-            async with aiosqlite.connect(self.db_path) as db:
+            cache = get_passport_cache()
+            row = await cache.get_row(cache.user_key(user_id, chat_id))
+            
+            if row is None:
+                async with self._pool.acquire() as db:
+                    async with db.execute("""
+                        SELECT p.*, c.clan_name 
+                        FROM user_passports p
+                        LEFT JOIN registered_clans c ON p.preferred_clan_id = c.id
+                        WHERE p.user_id = ? AND p.chat_id = ?
+                    """, (user_id, chat_id)) as cursor:
+                        row = await cursor.fetchone()
+                
+                if row:
+                    await cache.set_row(row)
+                    
+            if row:
+                return PassportInfo.from_db_row(row)
+            return None
+            
+        except Exception as e:
+            logger.error(f"Error getting passport for user {user_id}: {e}")
+            return None
+    
+    async def warm_cache(self) -> int:
+        """
+        Загрузка всех активных паспортов в Redis при старте бота,
+        чтобы первые обращения к паспортам не шли в БД.
+        Все изменения паспортов идут через этот сервис и сбрасывают кэш.
+        
+        Returns:
+            int: Количество загруженных паспортов
+        """
+        cache = get_passport_cache()
+        if not cache.enabled:
+            return 0
+        
+        try:
+            async with self._pool.acquire() as db:
+                async with db.execute("""
+                    SELECT p.*, c.clan_name 
+                    FROM user_passports p
+                    LEFT JOIN registered_clans c ON p.preferred_clan_id = c.id
+                    WHERE p.status = 'active'
+                """) as cursor:
+                    rows = await cursor.fetchall()
+            
+            warmed = await cache.set_rows(rows, ttl=WARM_CACHE_TTL)
+            logger.info(f"Warmed passport cache with {warmed} passports")
+            return warmed
+            
+        except Exception as e:
+            logger.error(f"Error warming passport cache: {e}")
+            return 0
+    
+    async def get_visible_passport_by_user(self, user_id: int, chat_id: int,
+                                           viewer_user_id: int) -> Optional[PassportInfo]:
+        """
+        Получение паспорта с учетом приватности
+        
+        Приватные паспорта (уровень 3) отсекаются в SQL, поэтому для чужого
+        скрытого паспорта строка не возвращается и объект не создается.
+        
+        Args:
+            user_id: ID владельца паспорта
+            chat_id: ID чата
+            viewer_user_id: ID просматривающего пользователя
+            
+        Returns:
+            Optional[PassportInfo]: Паспорт или None, если его нет или он скрыт
+        """
+        try:
+            async with self._pool.acquire() as db:
                 async with db.execute("""
                     SELECT p.*, c.clan_name 
                     FROM user_passports p
                     LEFT JOIN registered_clans c ON p.preferred_clan_id = c.id
                     WHERE p.user_id = ? AND p.chat_id = ?
-                """, (user_id, chat_id)) as cursor:
+                      AND (p.user_id = ?
+                           OR COALESCE(json_extract(p.settings, '$.privacy_level'), 1) < 3)
+                """, (user_id, chat_id, viewer_user_id)) as cursor:
                     row = await cursor.fetchone()
                     
             if row:
@@ -109,7 +251,7 @@ class PassportDatabaseService:
             return None
             
         except Exception as e:
-            logger.error(f"Error getting passport for user {user_id}: {e}")
+            logger.error(f"Error getting visible passport for user {user_id}: {e}")
             return None
     
     async def get_passport_by_id(self, passport_id: int) -> Optional[PassportInfo]:
@@ -123,14 +265,21 @@ class PassportDatabaseService:
             Optional[PassportInfo]: Паспорт или None
         """
         try:
-            async with aiosqlite.connect(self.db_path) as db:
-                async with db.execute("""
-                    SELECT p.*, c.clan_name 
-                    FROM user_passports p
-                    LEFT JOIN registered_clans c ON p.preferred_clan_id = c.id
-                    WHERE p.id = ?
-                """, (passport_id,)) as cursor:
-                    row = await cursor.fetchone()
+            cache = get_passport_cache()
+            row = await cache.get_row(cache.id_key(passport_id))
+            
+            if row is None:
+                async with self._pool.acquire() as db:
+                    async with db.execute("""
+                        SELECT p.*, c.clan_name 
+                        FROM user_passports p
+                        LEFT JOIN registered_clans c ON p.preferred_clan_id = c.id
+                        WHERE p.id = ?
+                    """, (passport_id,)) as cursor:
+                        row = await cursor.fetchone()
+                
+                if row:
+                    await cache.set_row(row)
                     
             if row:
                 return PassportInfo.from_db_row(row)
@@ -166,7 +315,7 @@ class PassportDatabaseService:
             
             query += " ORDER BY p.created_at DESC"
             
-            async with aiosqlite.connect(self.db_path) as db:
+            async with self._pool.acquire() as db:
                 async with db.execute(query, params) as cursor:
                     rows = await cursor.fetchall()
                     
@@ -176,6 +325,50 @@ class PassportDatabaseService:
             logger.error(f"Error getting chat passports for {chat_id}: {e}")
             return []
     
+    async def get_unverified_bindings(self, chat_id: int, limit: int = 10) -> Tuple[List[PassportInfo], int]:
+        """
+        Получение паспортов чата с неверифицированной привязкой игрока
+        
+        Фильтрация и подсчет выполняются в SQL, поэтому из БД читаются только
+        строки, которые будут показаны.
+        
+        Args:
+            chat_id: ID чата
+            limit: Максимальное количество паспортов
+            
+        Returns:
+            Tuple[List[PassportInfo], int]: Паспорта (новые первыми) и их общее количество
+        """
+        cache = get_passport_cache()
+        try:
+            # Снимок списка живет UNVERIFIED_CACHE_TTL секунд и сбрасывается при
+            # любом изменении паспорта чата, поэтому "🔄 Обновить" не ходит в БД
+            snapshot = await cache.get_unverified(chat_id)
+            if snapshot is not None:
+                rows, total = snapshot
+                return [PassportInfo.from_db_row(row) for row in rows[:limit]], total
+            
+            async with self._pool.acquire() as db:
+                async with db.execute("""
+                    SELECT p.*, c.clan_name, COUNT(*) OVER () AS total
+                    FROM user_passports p
+                    LEFT JOIN registered_clans c ON p.preferred_clan_id = c.id
+                    WHERE p.chat_id = ?
+                      AND p.player_binding IS NOT NULL
+                      AND COALESCE(json_extract(p.player_binding, '$.verified'), 0) = 0
+                    ORDER BY p.created_at DESC
+                    LIMIT ?
+                """, (chat_id, limit)) as cursor:
+                    rows = await cursor.fetchall()
+            
+            total = rows[0][-1] if rows else 0
+            await cache.set_unverified(chat_id, rows, total)
+            return [PassportInfo.from_db_row(row) for row in rows], total
+            
+        except Exception as e:
+            logger.error(f"Error getting unverified bindings for chat {chat_id}: {e}")
+            return [], 0
+    
     async def update_passport(self, passport_id: int, **kwargs) -> bool:
         """
         Обновление паспорта
@@ -240,7 +433,7 @@ class PassportDatabaseService:
                 
                 # Получаем данные клана
                 if kwargs['preferred_clan_id']:
-                    async with aiosqlite.connect(self.db_path) as db:
+                    async with self._pool.acquire() as db:
                         clan_data = await self._get_clan_data_by_id(db, kwargs['preferred_clan_id'])
                         if clan_data:
                             update_fields.extend(["preferred_clan_tag = ?", "preferred_clan_name = ?"])
@@ -260,9 +453,11 @@ class PassportDatabaseService:
             query = f"UPDATE user_passports SET {', '.join(update_fields)} WHERE id = ?"
             params.append(passport_id)
             
-            async with aiosqlite.connect(self.db_path) as db:
+            async with self._pool.acquire() as db:
                 await db.execute(query, params)
                 await db.commit()
+            
+            await get_passport_cache().invalidate(passport.user_id, passport.chat_id, passport_id)
                 
             logger.info(f"Updated passport {passport_id}")
             return True
@@ -271,6 +466,82 @@ class PassportDatabaseService:
             logger.error(f"Error updating passport {passport_id}: {e}")
             return False
     
+    async def toggle_setting(self, passport_id: int, key: str) -> Optional[bool]:
+        """
+        Атомарное переключение булевой настройки одним UPDATE (без чтения паспорта)
+        
+        Args:
+            passport_id: ID паспорта
+            key: Имя настройки в JSON settings (отсутствующая считается включенной)
+            
+        Returns:
+            Optional[bool]: Новое значение или None, если паспорт не найден / ошибка
+        """
+        path = f"$.{key}"
+        try:
+            async with self._pool.acquire() as db:
+                async with db.execute(
+                    """
+                    UPDATE user_passports
+                    SET settings = json_set(
+                            settings, ?,
+                            json(CASE WHEN COALESCE(json_extract(settings, ?), 1) THEN 'false' ELSE 'true' END)
+                        ),
+                        updated_at = ?
+                    WHERE id = ?
+                    RETURNING user_id, chat_id, json_extract(settings, ?)
+                    """,
+                    (path, path, datetime.now().isoformat(), passport_id, path)
+                ) as cursor:
+                    row = await cursor.fetchone()
+                await db.commit()
+            
+            if not row:
+                return None
+            
+            await get_passport_cache().invalidate(row[0], row[1], passport_id)
+            return bool(row[2])
+            
+        except Exception as e:
+            logger.error(f"Error toggling setting {key} for passport {passport_id}: {e}")
+            return None
+    
+    async def set_setting(self, passport_id: int, key: str, value: Any) -> bool:
+        """
+        Запись одной настройки в JSON settings без перезаписи остальных
+        
+        Args:
+            passport_id: ID паспорта
+            key: Имя настройки
+            value: Новое значение (сериализуемое в JSON)
+            
+        Returns:
+            bool: True если паспорт найден и обновлен
+        """
+        try:
+            async with self._pool.acquire() as db:
+                async with db.execute(
+                    """
+                    UPDATE user_passports
+                    SET settings = json_set(settings, ?, json(?)), updated_at = ?
+                    WHERE id = ?
+                    RETURNING user_id, chat_id
+                    """,
+                    (f"$.{key}", json.dumps(value), datetime.now().isoformat(), passport_id)
+                ) as cursor:
+                    row = await cursor.fetchone()
+                await db.commit()
+            
+            if not row:
+                return False
+            
+            await get_passport_cache().invalidate(row[0], row[1], passport_id)
+            return True
+            
+        except Exception as e:
+            logger.error(f"Error setting {key} for passport {passport_id}: {e}")
+            return False
+    
     async def delete_passport(self, passport_id: int) -> bool:
         """
         Удаление паспорта
@@ -281,8 +552,36 @@ class PassportDatabaseService:
         Returns:
             bool: True если удаление успешно
         """
+        return await self._delete_passport(passport_id)
+    
+    async def delete_passport_with_log(self, passport_id: int, log_entry: PassportOperationLog) -> bool:
+        """
+        Запись операции в лог и удаление паспорта в одной транзакции
+        
+        Args:
+            passport_id: ID паспорта
+            log_entry: Запись лога об удалении
+            
+        Returns:
+            bool: True если удаление успешно
+        """
+        return await self._delete_passport(passport_id, log_entry)
+    
+    async def _delete_passport(self, passport_id: int,
+                               log_entry: Optional[PassportOperationLog] = None) -> bool:
+        """Удаление паспорта и его логов (с необязательной записью лога) одним коммитом"""
         try:
-            async with aiosqlite.connect(self.db_path) as db:
+            async with self._pool.acquire() as db:
+                # Владелец нужен для сброса кэша
+                async with db.execute(
+                    "SELECT user_id, chat_id FROM user_passports WHERE id = ?",
+                    (passport_id,)
+                ) as cursor:
+                    owner = await cursor.fetchone()
+                
+                if log_entry is not None:
+                    await db.execute(self._INSERT_LOG_SQL, self._log_values(log_entry))
+                
                 # Сначала удаляем логи
                 await db.execute(
                     "DELETE FROM passport_operation_logs WHERE passport_id = ?",
@@ -297,6 +596,9 @@ class PassportDatabaseService:
                 
                 await db.commit()
                 
+                if owner:
+                    await get_passport_cache().invalidate(owner[0], owner[1], passport_id)
+                
                 if cursor.rowcount > 0:
                     logger.info(f"Deleted passport {passport_id}")
                     return True
@@ -307,6 +609,27 @@ class PassportDatabaseService:
             logger.error(f"Error deleting passport {passport_id}: {e}")
             return False
     
+    _INSERT_LOG_SQL = """
+        INSERT INTO passport_operation_logs
+        (passport_id, operation_type, user_id, username, operation_details, 
+         timestamp, result, error_message)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+    """
+    
+    @staticmethod
+    def _log_values(log_entry: PassportOperationLog) -> tuple:
+        """Параметры INSERT для записи лога"""
+        return (
+            log_entry.passport_id,
+            log_entry.operation_type,
+            log_entry.user_id,
+            log_entry.username,
+            json.dumps(log_entry.operation_details),
+            log_entry.timestamp.isoformat() if log_entry.timestamp else datetime.now().isoformat(),
+            log_entry.result,
+            log_entry.error_message
+        )
+    
     async def log_operation(self, log_entry: PassportOperationLog) -> bool:
         """
         Запись операции в лог
@@ -318,23 +641,8 @@ class PassportDatabaseService:
             bool: True если запись успешна
         """
         try:
-            async with aiosqlite.connect(self.db_path) as db:
-                await db.execute("""
-                    INSERT INTO passport_operation_logs
-                    (passport_id, operation_type, user_id, username, operation_details, 
-                     timestamp, result, error_message)
-                    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-                """, (
-                    log_entry.passport_id,
-                    log_entry.operation_type,
-                    log_entry.user_id,
-                    log_entry.username,
-                    json.dumps(log_entry.operation_details),
-                    log_entry.timestamp.isoformat() if log_entry.timestamp else datetime.now().isoformat(),
-                    log_entry.result,
-                    log_entry.error_message
-                ))
-                
+            async with self._pool.acquire() as db:
+                await db.execute(self._INSERT_LOG_SQL, self._log_values(log_entry))
                 await db.commit()
                 
             return True
@@ -354,7 +662,7 @@ class PassportDatabaseService:
             Dict[str, Any]: Сводная статистика
         """
         try:
-            async with aiosqlite.connect(self.db_path) as db:
+            async with self._pool.acquire() as db:
                 # Общее количество паспортов
                 async with db.execute(
                     "SELECT COUNT(*) FROM user_passports WHERE chat_id = ?",
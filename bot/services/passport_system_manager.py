@@ -144,8 +144,7 @@ class PassportSystemManager:
                 }
             
             # 2. Получаем данные игрока из CoC API
-            async with self.coc_api_service:
-                player_data = await self.coc_api_service.get_player(player_tag)
+            player_data = await self.coc_api_service.get_player(player_tag)
             
             if not player_data:
                 return {
@@ -279,11 +278,10 @@ class PassportSystemManager:
             # Получаем данные игрока если есть привязка
             if passport.player_binding:
                 try:
-                    async with self.coc_api_service:
-                        player_data = await self.coc_api_service.get_player(
-                            passport.player_binding.player_tag
-                        )
-                        result['player_data'] = player_data
+                    player_data = await self.coc_api_service.get_player(
+                        passport.player_binding.player_tag
+                    )
+                    result['player_data'] = player_data
                 except Exception as e:
                     logger.warning(f"Failed to fetch player data: {e}")
             
@@ -2,7 +2,8 @@
 Сервис для проверки прав доступа и разрешений
 """
 import logging
-from typing import Optional
+import time
+from typing import Dict, FrozenSet, Optional, Tuple
 from aiogram import Bot
 from aiogram.types import ChatMember
 from aiogram.exceptions import TelegramBadRequest
@@ -12,6 +13,12 @@ from .clan_database_service import get_clan_db_service
 
 logger = logging.getLogger(__name__)
 
+# Кэш статуса администратора: время жизни (секунды) и максимальный размер
+ADMIN_CACHE_TTL = 30
+ADMIN_CACHE_MAX_SIZE = 10_000
+# Кэш списка администраторов чата (getChatAdministrators), секунды
+ADMIN_SET_TTL = 300
+
 
 class PermissionService:
     """Сервис для проверки прав доступа"""
@@ -19,11 +26,22 @@ class PermissionService:
     def __init__(self, bot: Bot):
         self.bot = bot
         self.db_service = get_clan_db_service()
+        # (chat_id, user_id) -> (момент истечения, является ли администратором)
+        self._admin_cache: Dict[Tuple[int, int], Tuple[float, bool]] = {}
+        # chat_id -> (момент истечения, ID всех администраторов чата или None,
+        # если список получить не удалось)
+        self._admin_sets: Dict[int, Tuple[float, Optional[FrozenSet[int]]]] = {}
     
     async def is_chat_admin(self, user_id: int, chat_id: int) -> bool:
         """
         Проверить является ли пользователь администратором чата
         
+        Один запрос getChatAdministrators возвращает всех администраторов
+        чата; их набор кэшируется на ADMIN_SET_TTL секунд, и проверки любых
+        пользователей этого чата выполняются локально. Если список получить
+        нельзя (например, в личном чате), используется getChatMember с кэшем
+        на ADMIN_CACHE_TTL секунд.
+        
         Args:
             user_id: ID пользователя
             chat_id: ID чата
@@ -31,11 +49,25 @@ class PermissionService:
         Returns:
             bool: True если администратор
         """
+        admin_ids = await self._get_admin_ids(chat_id)
+        if admin_ids is not None:
+            return user_id in admin_ids
+        
+        key = (chat_id, user_id)
+        now = time.monotonic()
+        cached = self._admin_cache.get(key)
+        if cached and cached[0] > now:
+            return cached[1]
+        
         try:
             member = await self.bot.get_chat_member(chat_id, user_id)
             is_admin = member.status in ['creator', 'administrator']
             
             logger.debug(f"User {user_id} admin status in chat {chat_id}: {is_admin}")
+            
+            if key not in self._admin_cache and len(self._admin_cache) >= ADMIN_CACHE_MAX_SIZE:
+                self._admin_cache.pop(next(iter(self._admin_cache)))
+            self._admin_cache[key] = (now + ADMIN_CACHE_TTL, is_admin)
             return is_admin
             
         except TelegramBadRequest as e:
@@ -45,6 +77,38 @@ class PermissionService:
             logger.error(f"Unexpected error checking admin status: {e}")
             return False
     
+    async def _get_admin_ids(self, chat_id: int) -> Optional[FrozenSet[int]]:
+        """
+        ID администраторов чата из кэша или одним запросом getChatAdministrators
+        
+        Неудачный запрос тоже кэшируется на ADMIN_SET_TTL секунд, чтобы
+        чаты без доступного списка не запрашивали его при каждой проверке.
+        
+        Args:
+            chat_id: ID чата
+            
+        Returns:
+            Optional[FrozenSet[int]]: ID администраторов или None, если список недоступен
+        """
+        now = time.monotonic()
+        cached = self._admin_sets.get(chat_id)
+        if cached and cached[0] > now:
+            return cached[1]
+        
+        admin_ids: Optional[FrozenSet[int]] = None
+        try:
+            admins = await self.bot.get_chat_administrators(chat_id)
+            admin_ids = frozenset(member.user.id for member in admins)
+        except TelegramBadRequest as e:
+            logger.debug(f"Admin list unavailable for chat {chat_id}: {e}")
+        except Exception as e:
+            logger.error(f"Unexpected error getting admins of chat {chat_id}: {e}")
+        
+        if chat_id not in self._admin_sets and len(self._admin_sets) >= ADMIN_CACHE_MAX_SIZE:
+            self._admin_sets.pop(next(iter(self._admin_sets)))
+        self._admin_sets[chat_id] = (now + ADMIN_SET_TTL, admin_ids)
+        return admin_ids
+    
     async def is_chat_creator(self, user_id: int, chat_id: int) -> bool:
         """Проверить является ли пользователь создателем чата"""
         try:
@@ -2,7 +2,8 @@
 Система привязки игроков CoC к паспортам
 """
 import logging
-from typing import List, Dict, Any, Optional
+import time
+from typing import List, Dict, Any, Optional, Tuple
 from datetime import datetime
 
 from ..models.passport_models import PlayerBinding, PassportOperationLog
@@ -14,6 +15,12 @@ from ..utils.validators import ClanTagValidator, format_number
 
 logger = logging.getLogger(__name__)
 
+# Кэш составов кланов для выбора игрока: clan_tag -> (момент истечения, результат).
+# Общий для всех экземпляров сервиса (get_player_binding_service создает новый)
+_ROSTER_CACHE_TTL = 45
+_ROSTER_CACHE_MAX_SIZE = 256
+_roster_cache: Dict[str, Tuple[float, Dict[str, Any]]] = {}
+
 
 class PlayerBindingService:
     """Сервис для привязки игроков CoC к паспортам"""
@@ -68,8 +75,7 @@ class PlayerBindingService:
                 }
             
             # Получаем данные игрока из CoC API
-            async with self.coc_api_service:
-                player_data = await self.coc_api_service.get_player(normalized_tag)
+            player_data = await self.coc_api_service.get_player(normalized_tag)
             
             if not player_data:
                 return {
@@ -126,6 +132,10 @@ class PlayerBindingService:
             )
             await self.passport_service.log_operation(log_entry)
             
+            # Состав клана игрока мог измениться - следующее открытие списка перечитает его
+            if clan_tag:
+                _roster_cache.pop(ClanTagValidator.normalize_clan_tag(clan_tag), None)
+            
             return {
                 'success': True,
                 'player_binding': player_binding,
@@ -347,9 +357,13 @@ class PlayerBindingService:
                     'error_code': 'INVALID_TAG'
                 }
             
+            # Состав клана меняется редко - повторные открытия списка берем из кэша
+            cached = _roster_cache.get(normalized_tag)
+            if cached and cached[0] > time.monotonic():
+                return cached[1]
+            
             # Получаем участников из CoC API
-            async with self.coc_api_service:
-                members = await self.coc_api_service.get_clan_members(normalized_tag)
+            members = await self.coc_api_service.get_clan_members(normalized_tag)
             
             if not members:
                 return {
@@ -372,18 +386,25 @@ class PlayerBindingService:
                     'tag': member.get('tag', ''),
                     'name': member.get('name', 'Unknown'),
                     'role': member.get('role', 'member'),
+                    'trophies': member.get('trophies', 0),
                     'level': member.get('expLevel', 0),
                     'donations': member.get('donations', 0),
                     'received': member.get('donationsReceived', 0)
                 })
             
-            return {
+            result = {
                 'success': True,
                 'members': formatted_members,
                 'clan_tag': normalized_tag,
                 'total_members': len(formatted_members)
             }
             
+            if normalized_tag not in _roster_cache and len(_roster_cache) >= _ROSTER_CACHE_MAX_SIZE:
+                _roster_cache.pop(next(iter(_roster_cache)))
+            _roster_cache[normalized_tag] = (time.monotonic() + _ROSTER_CACHE_TTL, result)
+            
+            return result
+            
         except ClanNotFound:
             return {
                 'success': False,
@@ -41,13 +41,13 @@ class PlayerBindingUI:
             builder.row(
                 InlineKeyboardButton(
                     text="👀 Просмотреть привязку",
-                    callback_data=f"view_binding:{user_id}"
+                    callback_data="view_binding"
                 )
             )
             builder.row(
                 InlineKeyboardButton(
                     text="🔄 Сменить игрока",
-                    callback_data=f"change_player:{user_id}"
+                    callback_data="change_player"
                 )
             )
             builder.row(
@@ -134,7 +134,7 @@ class PlayerBindingUI:
             builder.row(
                 InlineKeyboardButton(
                     text=button_text,
-                    callback_data=f"bind_clan_member:{user_id}:{member['player_tag']}"
+                    callback_data=f"bind_clan_member:{member['player_tag']}"
                 )
             )
         
@@ -0,0 +1,155 @@
+"""
+Кэш ответов CoC API для обработчиков
+
+Данные игроков меняются медленно, поэтому повторные открытия одной и той же
+привязки в течение PLAYER_CACHE_TTL секунд отдаются из памяти. Одновременные
+промахи по одному тегу сводятся к одному запросу к API. Обработчики получают
+данные через ограниченный пул воркеров (fetch_player).
+"""
+import asyncio
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+from ..services.coc_api_service import get_coc_api_service
+
+# Время жизни данных игрока (секунды) и максимальный размер кэша
+PLAYER_CACHE_TTL = 60
+PLAYER_CACHE_MAX_SIZE = 10_000
+
+# tag -> (момент истечения, данные игрока)
+_player_cache: Dict[str, Tuple[float, Dict[str, Any]]] = {}
+# Запросы к API, которые сейчас выполняются: остальные вызовы по тому же тегу
+# ждут этот future, а не отправляют свой запрос
+_inflight: Dict[str, asyncio.Future] = {}
+
+
+def _get_cached(tag: str) -> Optional[Dict[str, Any]]:
+    """Данные игрока из кэша, если они еще не устарели"""
+    entry = _player_cache.get(tag)
+    if entry is None:
+        return None
+    if entry[0] < time.monotonic():
+        _player_cache.pop(tag, None)
+        return None
+    return entry[1]
+
+
+def _set_cached(tag: str, player: Dict[str, Any]):
+    """Запись в кэш; при переполнении вытесняется самая старая запись"""
+    _player_cache.pop(tag, None)
+    if len(_player_cache) >= PLAYER_CACHE_MAX_SIZE:
+        _player_cache.pop(next(iter(_player_cache)))
+    _player_cache[tag] = (time.monotonic() + PLAYER_CACHE_TTL, player)
+
+
+async def get_player_cached(tag: str) -> Optional[Dict[str, Any]]:
+    """
+    Данные игрока из CoC API с кэшированием на PLAYER_CACHE_TTL секунд
+
+    Args:
+        tag: Тег игрока
+
+    Returns:
+        Optional[Dict[str, Any]]: Данные игрока или None, если игрок не найден
+    """
+    player = _get_cached(tag)
+    if player is not None:
+        return player
+
+    pending = _inflight.get(tag)
+    if pending is not None:
+        # shield: отмена одного ожидающего не должна отменять общий запрос
+        return await asyncio.shield(pending)
+
+    future = asyncio.get_running_loop().create_future()
+    _inflight[tag] = future
+    try:
+        player = await get_coc_api_service().get_player(tag)
+        if player:
+            _set_cached(tag, player)
+        future.set_result(player)
+        return player
+    except asyncio.CancelledError:
+        future.cancel()
+        raise
+    except Exception as e:
+        future.set_exception(e)
+        # Помечаем ошибку полученной: ее уже пробрасывает этот вызов, и asyncio
+        # не должен предупреждать, если больше никто не ждал future
+        future.exception()
+        raise
+    finally:
+        _inflight.pop(tag, None)
+
+
+# Пул воркеров для запросов данных игроков из обработчиков: медленный CoC API
+# не держит обработчик дольше PLAYER_FETCH_TIMEOUT, а число одновременных
+# запросов ограничено числом воркеров
+PLAYER_WORKERS = 8
+PLAYER_QUEUE_SIZE = 64
+PLAYER_FETCH_TIMEOUT = 1.5
+
+_player_queue: Optional[asyncio.Queue] = None
+_player_workers: List[asyncio.Task] = []
+
+
+async def _player_worker():
+    """Воркер: берет (tag, future) из очереди и заполняет future данными игрока"""
+    while True:
+        tag, future = await _player_queue.get()
+        try:
+            # Вызвавший обработчик мог уже перестать ждать (таймаут)
+            if future.done():
+                continue
+            try:
+                player = await get_player_cached(tag)
+            except Exception as e:
+                if not future.done():
+                    future.set_exception(e)
+            else:
+                if not future.done():
+                    future.set_result(player)
+        finally:
+            _player_queue.task_done()
+
+
+def start_player_workers(count: int = PLAYER_WORKERS):
+    """Запуск воркеров (повторный вызов ничего не делает)"""
+    global _player_queue
+    if _player_workers:
+        return
+    _player_queue = asyncio.Queue(maxsize=PLAYER_QUEUE_SIZE)
+    _player_workers.extend(asyncio.create_task(_player_worker()) for _ in range(count))
+
+
+async def stop_player_workers():
+    """Остановка воркеров при завершении работы бота"""
+    for task in _player_workers:
+        task.cancel()
+    await asyncio.gather(*_player_workers, return_exceptions=True)
+    _player_workers.clear()
+
+
+async def fetch_player(tag: str, timeout: float = PLAYER_FETCH_TIMEOUT) -> Optional[Dict[str, Any]]:
+    """
+    Данные игрока через пул воркеров с ограничением времени ожидания
+
+    Args:
+        tag: Тег игрока
+        timeout: Сколько ждать ответа (секунды)
+
+    Returns:
+        Optional[Dict[str, Any]]: Данные игрока или None, если игрок не найден
+
+    Raises:
+        asyncio.QueueFull: Очередь переполнена - показывать данные из БД
+        asyncio.TimeoutError: API не ответил за timeout секунд
+    """
+    player = _get_cached(tag)
+    if player is not None:
+        return player
+
+    start_player_workers()
+    future = asyncio.get_running_loop().create_future()
+    _player_queue.put_nowait((tag, future))
+    return await asyncio.wait_for(future, timeout)
@@ -80,24 +80,16 @@ def format_duration(seconds: int) -> str:
     if seconds < 60:
         return f"{seconds}с"
     
-    minutes = seconds // 60
-    if minutes < 60:
-        return f"{minutes}м"
-    
-    hours = minutes // 60
-    remaining_minutes = minutes % 60
-    
-    if hours < 24:
-        if remaining_minutes > 0:
-            return f"{hours}ч {remaining_minutes}м"
-        return f"{hours}ч"
-    
-    days = hours // 24
-    remaining_hours = hours % 24
-    
-    if remaining_hours > 0:
-        return f"{days}д {remaining_hours}ч"
-    return f"{days}д"
+    # Один проход divmod вместо повторных // и % в каждой ветке
+    days, rest = divmod(seconds, 86400)
+    hours, rest = divmod(rest, 3600)
+    minutes = rest // 60
+    
+    if days:
+        return f"{days}д {hours}ч" if hours else f"{days}д"
+    if hours:
+        return f"{hours}ч {minutes}м" if minutes else f"{hours}ч"
+    return f"{minutes}м"
 
 
 def format_trophy_range(min_trophies: int, max_trophies: int) -> str:
@@ -247,8 +239,9 @@ def escape_markdown(text: str) -> str:
     if not text:
         return ""
     
-    # Символы, которые нужно экранировать в Markdown
-    special_chars = ['*', '_', '`', '[', ']', '(', ')', '~', '>', '#', '+', '-', '=', '|', '{', '}', '.', '!']
+    # Символы, которые нужно экранировать в Markdown; обратная косая черта
+    # идёт первой, чтобы не экранировать добавленные ниже символы повторно
+    special_chars = ['\\', '*', '_', '`', '[', ']', '(', ')', '~', '>', '#', '+', '-', '=', '|', '{', '}', '.', '!']
     
     for char in special_chars:
         text = text.replace(char, f'\\{char}')
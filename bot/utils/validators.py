@@ -10,6 +10,8 @@ class ClanTagValidator:
     
     # Регулярное выражение для валидного тега клана
     CLAN_TAG_PATTERN = re.compile(r'^#?[0289PYLQGRJCUV]{3,10}$')
+    # Алфавит тегов CoC (теги игроков используют тот же набор символов)
+    TAG_CHARS = frozenset('0289PYLQGRJCUV')
     
     @classmethod
     def validate_clan_tag(cls, clan_tag: str) -> Tuple[bool, Optional[str]]:
@@ -64,6 +66,20 @@ class ClanTagValidator:
         
         return clan_tag
     
+    @classmethod
+    def is_valid_player_tag(cls, player_tag: str) -> bool:
+        """
+        Проверка формата тега игрока (ожидается уже нормализованный тег)
+        
+        Args:
+            player_tag: Тег для проверки
+            
+        Returns:
+            bool: True если тег валидный
+        """
+        body = player_tag[1:] if player_tag.startswith('#') else player_tag
+        return 3 <= len(body) <= 12 and cls.TAG_CHARS.issuperset(body)
+    
     @classmethod
     def is_valid_clan_tag(cls, clan_tag: str) -> bool:
         """
@@ -259,6 +275,10 @@ def normalize_clan_tag(clan_tag: str) -> str:
     """Нормализация тега клана"""
     return ClanTagValidator.normalize_clan_tag(clan_tag)
 
+def validate_player_tag(player_tag: str) -> bool:
+    """Проверка формата тега игрока"""
+    return ClanTagValidator.is_valid_player_tag(player_tag)
+
 def format_number(number: int) -> str:
     """Форматирование числа"""
     return TextFormatter.format_number(number)
@@ -317,23 +337,26 @@ def format_percentage(value: float, total: float) -> str:
     return f"{percentage:.1f}%"
 
 
+_ROLE_EMOJIS = {
+    'leader': '👑',
+    'coLeader': '🌟',
+    'admin': '⭐',
+    'member': '👤'
+}
+
+_ROLE_NAMES = {
+    'leader': 'Лидер',
+    'coLeader': 'Со-лидер',
+    'admin': 'Старейшина',
+    'member': 'Участник'
+}
+
+
 def format_role_emoji(role: str) -> str:
     """Возвращает эмодзи для роли"""
-    role_emojis = {
-        'leader': '👑',
-        'coLeader': '🌟',
-        'admin': '⭐',
-        'member': '👤'
-    }
-    return role_emojis.get(role, '👤')
+    return _ROLE_EMOJIS.get(role, '👤')
 
 
 def format_role_name(role: str) -> str:
     """Возвращает русское название роли"""
-    role_names = {
-        'leader': 'Лидер',
-        'coLeader': 'Со-лидер',
-        'admin': 'Старейшина',
-        'member': 'Участник'
-    }
-    return role_names.get(role, 'Участник')
\ No newline at end of file
+    return _ROLE_NAMES.get(role, 'Участник')
\ No newline at end of file
@@ -116,6 +116,10 @@ class NewPyBot:
                 db_path=self.database_path
             )
             
+            # Общая HTTP сессия CoC API живёт всё время работы бота
+            from bot.services.coc_api_service import get_coc_api_service
+            await get_coc_api_service().open()
+            
             # 4. Инициализируем систему приветствий
             logger.info("🤝 Initializing greeting system...")
             await initialize_greeting_system(self.bot)
@@ -136,6 +140,10 @@ class NewPyBot:
             if PASSPORT_AVAILABLE:
                 logger.info("📋 Registering passport system...")
                 self.dp.include_router(passport_router)
+                
+                # Прогреваем кэш паспортов (только если настроен Redis)
+                from bot.services.passport_database_service import get_passport_db_service
+                await get_passport_db_service().warm_cache()
                 logger.info("✅ Passport system registered")
             
             # 8. Устанавливаем команды бота
@@ -265,6 +273,30 @@ class NewPyBot:
                 except Exception as e:
                     logger.error(f"❌ Error shutting down achievement system: {e}")
             
+            # Закрываем соединения системы паспортов
+            if PASSPORT_AVAILABLE:
+                try:
+                    from bot.services.passport_database_service import get_passport_db_service
+                    await get_passport_db_service().close()
+                    logger.info("✅ Passport database pool closed")
+                except Exception as e:
+                    logger.error(f"❌ Error closing passport database pool: {e}")
+            
+            # Останавливаем воркеры запросов данных игроков
+            try:
+                from bot.utils.coc_cache import stop_player_workers
+                await stop_player_workers()
+            except Exception as e:
+                logger.error(f"❌ Error stopping player fetch workers: {e}")
+            
+            # Закрываем общую сессию CoC API (после остановки воркеров)
+            try:
+                from bot.services.coc_api_service import get_coc_api_service
+                await get_coc_api_service().close()
+                logger.info("✅ CoC API session closed")
+            except Exception as e:
+                logger.error(f"❌ Error closing CoC API session: {e}")
+            
             # Закрываем сессию бота
             if self.bot:
                 await self.bot.session.close()
@@ -322,6 +354,14 @@ async def main():
 
 def run_bot():
     """Функция для запуска бота"""
+    # uvloop ускоряет event loop (разбор апдейтов, сетевые вызовы), если установлен
+    try:
+        import uvloop
+        asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
+        logger.info("⚡ Using uvloop event loop")
+    except ImportError:
+        pass
+    
     try:
         asyncio.run(main())
     except KeyboardInterrupt:
@@ -0,0 +1,65 @@
+"""
+Тесты пула соединений сервиса паспортов
+"""
+import asyncio
+import os
+import tempfile
+
+import pytest
+
+# Тесты будут работать когда установлены зависимости
+try:
+    from bot.services.passport_database_service import _ConnectionPool
+    DEPENDENCIES_AVAILABLE = True
+except ImportError:
+    DEPENDENCIES_AVAILABLE = False
+
+# Пропускаем тесты если зависимости не установлены
+pytestmark = pytest.mark.skipif(
+    not DEPENDENCIES_AVAILABLE,
+    reason="Dependencies not installed"
+)
+
+
+@pytest.fixture
+def db_path():
+    """Временный файл БД"""
+    with tempfile.NamedTemporaryFile(suffix='.db', delete=False) as tmp_file:
+        path = tmp_file.name
+    yield path
+    if os.path.exists(path):
+        os.unlink(path)
+
+
+class TestConnectionPool:
+    """Тесты _ConnectionPool"""
+
+    def test_acquire_opens_and_reuses_connection(self, db_path):
+        """Первое получение открывает соединение, повторное - переиспользует его"""
+
+        async def run():
+            pool = _ConnectionPool(db_path, max_size=2)
+            try:
+                async with pool.acquire() as db:
+                    cursor = await db.execute("SELECT 1")
+                    assert await cursor.fetchone() == (1,)
+                    first = db
+
+                async with pool.acquire() as db:
+                    assert db is first
+            finally:
+                await pool.close()
+
+        asyncio.run(run())
+
+    def test_close_handles_checked_out_connections(self, db_path):
+        """close() закрывает и выданные соединения, в пул они не возвращаются"""
+
+        async def run():
+            pool = _ConnectionPool(db_path, max_size=2)
+            async with pool.acquire():
+                await pool.close()
+            assert pool._idle.empty()
+            assert not pool._connections
+
+        asyncio.run(run())